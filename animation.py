@@ -0,0 +1,121 @@
+"""Background removal for animated images and frame sequences
+
+Frames are decoded, processed and encoded one at a time, so a long animation
+only ever holds the current frame, the last mask and the encoded output.
+Inference is skipped for frames nearly identical to the last inferred one,
+which reuse its mask instead.
+"""
+import asyncio
+import time
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from encoders import OutputFormat, animation_encoder
+
+# Frame duration in ms when the source has none (10 fps)
+DEFAULT_FRAME_DURATION = 100
+# Grayscale thumbnail compared between frames to decide on mask reuse
+SIGNATURE_SIZE = (64, 64)
+
+# An RGB frame and how long it is shown in ms
+Frame = Tuple[Image.Image, float]
+
+
+def frame_count(image: Image.Image) -> int:
+    return getattr(image, "n_frames", 1)
+
+
+def is_animated(image: Image.Image) -> bool:
+    return frame_count(image) > 1
+
+
+def iter_frames(image: Image.Image) -> Iterator[Frame]:
+    """Decode an animated image one frame at a time"""
+    for frame in ImageSequence.Iterator(image):
+        yield frame.convert("RGB"), frame.info.get("duration") or DEFAULT_FRAME_DURATION
+
+
+def frame_signature(frame: Image.Image) -> np.ndarray:
+    """Small grayscale thumbnail of a frame for cheap comparisons"""
+    thumbnail = frame.resize(SIGNATURE_SIZE, Image.Resampling.BOX).convert("L")
+    return np.asarray(thumbnail, dtype=np.float32)
+
+
+def frame_difference(signature: np.ndarray, other: np.ndarray) -> float:
+    """Mean absolute difference of two frame signatures, from 0 (identical) to 1"""
+    return float(np.abs(signature - other).mean() / 255)
+
+
+def _next_frame(frames: Iterator[Frame]) -> Optional[Tuple[Image.Image, float, np.ndarray]]:
+    """Decode the next frame with its duration and signature, or None at the end"""
+    frame = next(frames, None)
+    if frame is None:
+        return None
+    image, duration = frame
+    return image, duration, frame_signature(image)
+
+
+def _apply_mask(image: Image.Image, mask: Image.Image) -> Image.Image:
+    result = image.convert("RGBA")
+    result.putalpha(mask)
+    return result
+
+
+async def remove_animation_background(
+    remover,
+    frames: Iterator[Frame],
+    fmt: OutputFormat,
+    quality: int,
+    timings: dict,
+    deadline: Optional[float] = None,
+    model: Optional[str] = None,
+    reuse_threshold: float = 0.01,
+    loop: int = 0
+) -> Tuple[bytes, dict]:
+    """Remove the background of every frame and encode the result as an animation
+
+    A frame whose ``frame_difference`` from the last inferred frame is below
+    ``reuse_threshold`` gets that frame's mask without running inference;
+    comparing against the inferred frame rather than the previous one keeps
+    slow drift from accumulating. Inferred frames bypass the remover's
+    near-duplicate mask index, so the counts reflect real inferences and
+    keyframes do not crowd other images out of the index. ``deadline``
+    bounds the wait for the first inference only. Returns the encoded bytes
+    and frame counts.
+    """
+    event_loop = asyncio.get_running_loop()
+    encoder = animation_encoder(fmt, quality, loop)
+    stats = {"frames": 0, "inferred": 0, "reused": 0}
+    keyframe = mask = None
+
+    while True:
+        stage_start = time.perf_counter()
+        frame = await event_loop.run_in_executor(None, _next_frame, frames)
+        if frame is None:
+            break
+        image, duration, signature = frame
+        timings["decode"] = timings.get("decode", 0.0) + (time.perf_counter() - stage_start)
+
+        if mask is not None and mask.size == image.size and frame_difference(signature, keyframe) < reuse_threshold:
+            result = await event_loop.run_in_executor(None, _apply_mask, image, mask)
+            stats["reused"] += 1
+        else:
+            result = await remover.remove_background(
+                image, timings=timings, deadline=deadline, model=model, reuse_masks=False
+            )
+            mask = await event_loop.run_in_executor(None, result.getchannel, "A")
+            keyframe = signature
+            deadline = None
+            stats["inferred"] += 1
+        stats["frames"] += 1
+
+        stage_start = time.perf_counter()
+        await event_loop.run_in_executor(None, encoder.add, result, duration)
+        timings["encode"] = timings.get("encode", 0.0) + (time.perf_counter() - stage_start)
+
+    stage_start = time.perf_counter()
+    result_bytes = await event_loop.run_in_executor(None, encoder.finish)
+    timings["encode"] = timings.get("encode", 0.0) + (time.perf_counter() - stage_start)
+    return result_bytes, stats
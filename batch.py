@@ -0,0 +1,85 @@
+import zipfile
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import Callable, List, Optional
+
+
+class ZipStream:
+    """Write-only, non-seekable sink for ZipFile that hands out written bytes
+
+    ZipFile falls back to data descriptors when it cannot seek, so entries can
+    be streamed to the client as soon as they are written.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        """Return and forget everything written since the last drain"""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+@dataclass
+class BatchItem:
+    """One image of a batch request, read lazily to bound memory"""
+    name: str
+    read: Optional[Callable[[], bytes]] = None
+    error: Optional[str] = None
+
+
+def is_zip_upload(filename: str, content_type: Optional[str]) -> bool:
+    return filename.lower().endswith(".zip") or content_type in ("application/zip", "application/x-zip-compressed")
+
+
+def iter_zip_items(file_obj, max_file_size: int) -> List[BatchItem]:
+    """List the images inside a ZIP archive without decompressing them"""
+    archive = zipfile.ZipFile(file_obj)
+    items = []
+    for info in archive.infolist():
+        path = PurePosixPath(info.filename)
+        if info.is_dir() or path.name.startswith(".") or "__MACOSX" in path.parts:
+            continue
+
+        # Declared sizes come from the archive; the read is capped again below
+        if info.file_size > max_file_size:
+            items.append(BatchItem(name=path.name, error="File too large"))
+            continue
+
+        items.append(BatchItem(name=path.name, read=_zip_reader(archive, info, max_file_size)))
+    return items
+
+
+def _zip_reader(archive: zipfile.ZipFile, info: zipfile.ZipInfo, max_file_size: int) -> Callable[[], bytes]:
+    def read() -> bytes:
+        with archive.open(info) as member:
+            data = member.read(max_file_size + 1)
+        if len(data) > max_file_size:
+            raise ValueError("File too large")
+        return data
+    return read
+
+
+def unique_name(name: str, used: set) -> str:
+    """Make an archive entry name unique within a batch"""
+    candidate = name
+    stem, _, suffix = name.rpartition(".")
+    counter = 1
+    while candidate in used:
+        candidate = f"{stem}_{counter}.{suffix}"
+        counter += 1
+    used.add(candidate)
+    return candidate
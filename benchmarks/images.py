@@ -0,0 +1,38 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+FORMATS = {"jpeg": "JPEG", "png": "PNG", "webp": "WEBP"}
+
+
+def synthetic_image(long_side: int, seed: int = 0) -> Image.Image:
+    """Deterministic 3:2 photo-like image: gradient background, noise and a subject"""
+    width, height = long_side, max(1, long_side * 2 // 3)
+    rng = np.random.default_rng(seed)
+
+    y, x = np.ogrid[0:height, 0:width]
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    pixels[..., 0] = (x * 200 // width + 30).astype(np.uint8)
+    pixels[..., 1] = (y * 180 // height + 40).astype(np.uint8)
+    pixels[..., 2] = 160
+
+    # A darker ellipse as the foreground subject
+    subject = ((x - width / 2) / (width * 0.3)) ** 2 + ((y - height / 2) / (height * 0.4)) ** 2 <= 1
+    pixels[subject] //= 3
+
+    # Sensor-like noise keeps encoders and compressors honest
+    noise_rows = min(height, 256)
+    noise = rng.integers(0, 12, (noise_rows, width, 3), dtype=np.uint8)
+    for top in range(0, height, noise_rows):
+        bottom = min(top + noise_rows, height)
+        pixels[top:bottom] += noise[:bottom - top]
+    return Image.fromarray(pixels, "RGB")
+
+
+def encode_synthetic(long_side: int, fmt: str, seed: int = 0) -> bytes:
+    """Encode a synthetic image as an upload in the given format"""
+    buffer = io.BytesIO()
+    options = {"quality": 90} if fmt in ("jpeg", "webp") else {"compress_level": 1}
+    synthetic_image(long_side, seed).save(buffer, format=FORMATS[fmt], **options)
+    return buffer.getvalue()
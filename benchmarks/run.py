@@ -0,0 +1,340 @@
+"""Benchmark the background removal pipeline and the HTTP API
+
+Examples::
+
+    python -m benchmarks.run --stub --output results.json
+    python -m benchmarks.run --stub --http --sizes 512,2048 --concurrency 1,4
+    python -m benchmarks.run --http --url http://localhost:8000
+
+Results are written as JSON so runs can be diffed between commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aiohttp
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.images import encode_synthetic  # noqa: E402
+from benchmarks.stub import STUB_LATENCY_ENV, stub_session_factory  # noqa: E402
+from metrics import process_rss_bytes  # noqa: E402
+
+
+def summarize(values: List[float]) -> dict:
+    """Mean, median, p95 and max in milliseconds"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def summarize_stages(timings: List[dict]) -> dict:
+    stages: Dict[str, List[float]] = {}
+    for entry in timings:
+        for stage, duration in entry.items():
+            stages.setdefault(stage, []).append(duration)
+    return {stage: summarize(durations) for stage, durations in stages.items()}
+
+
+@contextmanager
+def rss_sampler(interval: float = 0.005):
+    """Track the peak resident set size of this process while the block runs"""
+    result = {"baseline_bytes": process_rss_bytes(), "peak_bytes": 0}
+    result["peak_bytes"] = result["baseline_bytes"]
+    stop = threading.Event()
+
+    def sample():
+        while not stop.is_set():
+            result["peak_bytes"] = max(result["peak_bytes"], process_rss_bytes())
+            stop.wait(interval)
+
+    thread = threading.Thread(target=sample, daemon=True)
+    thread.start()
+    try:
+        yield result
+    finally:
+        stop.set()
+        thread.join()
+        result["peak_delta_bytes"] = result["peak_bytes"] - result["baseline_bytes"]
+
+
+async def run_concurrently(request, iterations: int, concurrency: int) -> tuple[List[dict], float]:
+    """Run ``request()`` ``iterations`` times with at most ``concurrency`` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed():
+        async with semaphore:
+            start = time.perf_counter()
+            outcome = await request()
+            outcome["latency"] = time.perf_counter() - start
+            return outcome
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(timed() for _ in range(iterations)))
+    return outcomes, time.perf_counter() - start
+
+
+def case_result(size: int, fmt: str, content: bytes, concurrency: int, outcomes: List[dict], wall_time: float) -> dict:
+    succeeded = [outcome for outcome in outcomes if outcome.get("error") is None]
+    return {
+        "size": size,
+        "format": fmt,
+        "input_bytes": len(content),
+        "concurrency": concurrency,
+        "iterations": len(outcomes),
+        "succeeded": len(succeeded),
+        "errors": sorted({outcome["error"] for outcome in outcomes if outcome.get("error")}),
+        "wall_time_s": round(wall_time, 4),
+        "throughput_ips": round(len(succeeded) / wall_time, 3) if wall_time else 0.0,
+        "latency": summarize([outcome["latency"] for outcome in succeeded]),
+        "stages": summarize_stages([outcome["timings"] for outcome in succeeded]),
+    }
+
+
+async def bench_remover(args, inputs: Dict[tuple, bytes]) -> List[dict]:
+    """Benchmark BackgroundRemover.remove_background in-process"""
+    from bg_remover import BackgroundRemover
+
+    remover = BackgroundRemover(
+        batch_size=args.batch_size,
+        concurrency=args.inference_concurrency,
+        max_queue_depth=max(args.concurrency) * args.iterations,
+        model_name=args.model,
+        large_image_mode=args.large_image_mode,
+        session_factory=stub_session_factory if args.stub else None
+    )
+    await remover.initialize()
+
+    results = []
+    try:
+        for (size, fmt), content in inputs.items():
+            async def request():
+                timings = {}
+                try:
+                    await remover.remove_background(content, timings=timings)
+                    return {"timings": timings}
+                except Exception as e:
+                    return {"timings": timings, "error": type(e).__name__}
+
+            await request()  # Warm up caches and lazily created schedulers
+            for concurrency in args.concurrency:
+                with rss_sampler() as memory:
+                    outcomes, wall_time = await run_concurrently(request, args.iterations, concurrency)
+                result = case_result(size, fmt, content, concurrency, outcomes, wall_time)
+                result["memory"] = memory
+                results.append(result)
+                log(f"remover {size}px {fmt} x{concurrency}: {result['throughput_ips']} img/s")
+    finally:
+        await remover.cleanup()
+    return results
+
+
+def parse_server_timing(header: str) -> dict:
+    timings = {}
+    for part in filter(None, (item.strip() for item in header.split(","))):
+        name, _, params = part.partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                timings[name] = float(value) / 1000
+    return timings
+
+
+async def bench_http(args, inputs: Dict[tuple, bytes], url: str) -> List[dict]:
+    """Benchmark POST /remove-bg against a running server"""
+    results = []
+    connector = aiohttp.TCPConnector(limit=max(args.concurrency))
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=600)) as session:
+        for (size, fmt), content in inputs.items():
+            async def request(cacheable: bool = False):
+                # Trailing random bytes defeat the result cache unless asked for,
+                # including entries a server kept from an earlier run
+                body = content if cacheable else content + os.urandom(8)
+                form = aiohttp.FormData()
+                form.add_field("file", body, filename=f"bench.{fmt}", content_type=f"image/{fmt}")
+                if not cacheable:
+                    # The pixels are unchanged, so the mask index would otherwise skip inference
+                    form.add_field("exact", "true")
+                async with session.post(f"{url}/remove-bg", data=form) as response:
+                    await response.read()
+                    outcome = {"timings": parse_server_timing(response.headers.get("Server-Timing", ""))}
+                    if response.status != 200:
+                        outcome["error"] = f"HTTP {response.status}"
+                    return outcome
+
+            await request()
+            for concurrency in args.concurrency:
+                outcomes, wall_time = await run_concurrently(request, args.iterations, concurrency)
+                result = case_result(size, fmt, content, concurrency, outcomes, wall_time)
+                results.append(result)
+                log(f"http {size}px {fmt} x{concurrency}: {result['throughput_ips']} img/s")
+
+            cached, wall_time = await run_concurrently(lambda: request(cacheable=True), args.iterations, 1)
+            results.append({**case_result(size, fmt, content, 1, cached, wall_time), "cached": True})
+    return results
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError("Benchmark server exited during startup")
+            try:
+                async with session.get(f"{url}/ready") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Benchmark server did not become ready")
+
+
+def start_server(args, temp_dir: str) -> tuple[subprocess.Popen, str]:
+    """Start the API on a free port, with the stub model when requested
+
+    The server keeps its temp files and disk result cache in ``temp_dir`` so
+    results from earlier runs are never served; the model cache is shared.
+    """
+    port = free_port()
+    env = {
+        **os.environ,
+        STUB_LATENCY_ENV: str(args.stub_latency_ms),
+        "LARGE_IMAGE_MODE": args.large_image_mode,
+        "TEMP_DIR": temp_dir,
+        # Keep using the optimized and quantized models saved under the usual TEMP_DIR
+        "MODEL_CACHE_DIR": os.getenv("MODEL_CACHE_DIR", os.path.join(os.getenv("TEMP_DIR", "/tmp/clearcut"), "models")),
+    }
+    if args.stub:
+        command = [sys.executable, "-m", "benchmarks.stub", "--port", str(port)]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(command, cwd=ROOT, env=env), f"http://127.0.0.1:{port}"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def log(message: str):
+    print(message, file=sys.stderr)
+
+
+async def run(args) -> dict:
+    os.environ[STUB_LATENCY_ENV] = str(args.stub_latency_ms)
+    inputs = {(size, fmt): encode_synthetic(size, fmt) for size in args.sizes for fmt in args.formats}
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "stub": args.stub,
+            "stub_latency_ms": args.stub_latency_ms if args.stub else None,
+            "model": args.model,
+            "large_image_mode": args.large_image_mode,
+            "sizes": args.sizes,
+            "formats": args.formats,
+            "concurrency": args.concurrency,
+            "iterations": args.iterations,
+        },
+        "remover": [],
+        "http": [],
+    }
+
+    if not args.http_only:
+        report["remover"] = await bench_remover(args, inputs)
+
+    if args.http or args.http_only:
+        server = temp_dir = None
+        url = args.url
+        if not url:
+            temp_dir = tempfile.mkdtemp(prefix="clearcut-bench-")
+            server, url = start_server(args, temp_dir)
+        try:
+            if server:
+                await wait_until_ready(url, server)
+            report["http"] = await bench_http(args, inputs, url.rstrip("/"))
+        finally:
+            if server:
+                server.terminate()
+                server.wait(timeout=30)
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+    return report
+
+
+def parse_args(argv=None):
+    def int_list(value):
+        return [int(item) for item in value.split(",") if item]
+
+    def str_list(value):
+        return [item for item in value.split(",") if item]
+
+    parser = argparse.ArgumentParser(description="Benchmark the ClearCut pipeline and API")
+    parser.add_argument("--sizes", type=int_list, default=[512, 2048, 4096, 8000], help="Long-side sizes in pixels")
+    parser.add_argument("--formats", type=str_list, default=["jpeg", "png"], help="Input formats: jpeg, png, webp")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 2, 4], help="Concurrent requests per case")
+    parser.add_argument("--iterations", type=int, default=8, help="Requests per case")
+    parser.add_argument("--model", default="u2net")
+    parser.add_argument("--large-image-mode", default=os.getenv("LARGE_IMAGE_MODE", "resize"), help="resize or tiled")
+    parser.add_argument("--inference-concurrency", type=int, default=int(os.getenv("INFERENCE_CONCURRENCY", 2)))
+    parser.add_argument("--batch-size", type=int, help="Defaults to INFERENCE_BATCH_SIZE or the inference concurrency")
+    parser.add_argument("--stub", action="store_true", help="Use a stub ONNX session instead of the real model")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Simulated inference time per image")
+    parser.add_argument("--http", action="store_true", help="Also benchmark POST /remove-bg")
+    parser.add_argument("--http-only", action="store_true", help="Only benchmark POST /remove-bg")
+    parser.add_argument("--url", help="Benchmark an already running server instead of starting one")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+    if args.batch_size is None:
+        args.batch_size = int(os.getenv("INFERENCE_BATCH_SIZE", args.inference_concurrency))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+        log(f"Wrote {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Stub ONNX session so the pipeline can be benchmarked without model downloads
+
+Run ``python -m benchmarks.stub --port 8123`` to serve the API with the stub.
+"""
+import argparse
+import functools
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+# Simulated forward-pass time per image, read in worker processes too
+STUB_LATENCY_ENV = "BENCHMARK_STUB_LATENCY_MS"
+
+
+class StubInnerSession:
+    """Stand-in for an ONNX Runtime session predicting a soft centred ellipse"""
+
+    def __init__(self, size: int = 320, latency_ms: float = 0.0):
+        self.size = size
+        self.latency = latency_ms / 1000.0
+        y, x = np.ogrid[-1:1:size * 1j, -1:1:size * 1j]
+        distance = np.sqrt((x / 0.6) ** 2 + (y / 0.8) ** 2)
+        self.mask = np.clip((1.1 - distance) * 5, 0, 1).astype(np.float32)
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input.1", shape=["batch_size", 3, self.size, self.size])]
+
+    def run(self, output_names, feed):
+        batch = next(iter(feed.values()))
+        if self.latency:
+            # Sleeping releases the GIL like a real ONNX Runtime run does
+            time.sleep(self.latency * batch.shape[0])
+        return [np.broadcast_to(self.mask, (batch.shape[0], 1, self.size, self.size))]
+
+
+def stub_session_factory(model_name: str, intra_op_threads=None):
+    """Session factory matching ``bg_remover.create_session``"""
+    size = 1024 if model_name.startswith("isnet") else 320
+    latency_ms = float(os.getenv(STUB_LATENCY_ENV, 0))
+    return SimpleNamespace(inner_session=StubInnerSession(size, latency_ms))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the ClearCut API with a stub model")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8123)
+    args = parser.parse_args()
+
+    import uvicorn
+    import main as app_module
+    from bg_remover import BackgroundRemover
+
+    # Swap the real ONNX sessions for the stub before the lifespan creates the remover
+    app_module.BackgroundRemover = functools.partial(BackgroundRemover, session_factory=stub_session_factory)
+    uvicorn.run(app_module.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,244 @@
 import asyncio
+import functools
 import io
 import logging
-from typing import Union
+import os
+import time
+from typing import Callable, List, Optional, Tuple, Union
 import numpy as np
 from PIL import Image
-import cv2
-from rembg import new_session, remove
-import onnxruntime as ort
+
+from inference import (
+    MODEL_INPUT_SPECS,
+    BatchScheduler,
+    DeadlineExceededError,
+    InferenceExecutor,
+    predict_mask,
+)
+from mask_index import MaskIndex, dhash, downscale_mask
+from mask_ops import REFINE_MARGIN, REFINE_MODES, TiledMask, guided_upsample_mask, plan_tiles, refine_alpha
+from models import AVAILABLE_MODELS, SessionRegistry
+from worker_pool import InferenceWorkerPool, auto_size_pool, available_cpus
 
 logger = logging.getLogger(__name__)
 
+# How a mask predicted on a downscaled image is brought back to full size
+UPSAMPLE_MODES = ("guided", "lanczos")
+# Images above the processing size are either downscaled for inference, or
+# inferred coarsely and then refined tile by tile at full resolution
+LARGE_IMAGE_MODES = ("resize", "tiled")
+# ONNX Runtime session tuning
+GRAPH_OPTIMIZATION_LEVELS = ("disable", "basic", "extended", "all")
+EXECUTION_MODES = ("sequential", "parallel")
+PRECISIONS = ("fp32", "int8")
+# Rows of the result refined at a time during post-processing
+POST_PROCESS_ROWS = 512
+
+def _record_stage(timings: dict, stage: str, start: float) -> float:
+    """Add the time since ``start`` to a stage and return the new start"""
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + (now - start)
+    return now
+
+def _model_file_session(session_class, model_path: str):
+    """A rembg session class that loads ``model_path`` instead of its downloaded model"""
+    return type(session_class.__name__, (session_class,), {
+        "download_models": classmethod(lambda cls, *args, **kwargs: model_path)
+    })
+
+def quantized_model_path(model_dir: str, model_name: str) -> str:
+    """Where ``python -m quantize`` writes the INT8 variant of a model"""
+    return os.path.join(model_dir, f"{model_name}-int8.onnx")
+
+def create_session(
+    model_name: str,
+    intra_op_threads: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    graph_optimization: str = "all",
+    execution_mode: str = "sequential",
+    precision: str = "fp32"
+):
+    """Create a rembg session with explicit ONNX Runtime session options
+
+    With ``cache_dir`` the graph ONNX Runtime optimized is saved there on
+    first load and read back on later boots, skipping graph optimization.
+    ``precision="int8"`` loads the quantized model from ``cache_dir``,
+    falling back to FP32 for models that have not been quantized.
+    """
+    # Imported here: rembg pulls in numba and pymatting, which an API process
+    # dispatching to inference workers never needs
+    import onnxruntime as ort
+    from rembg.sessions import sessions_class
+
+    ort.set_default_logger_severity(3)  # Suppress warnings
+
+    session_class = next((sc for sc in sessions_class if sc.name() == model_name), None)
+    if session_class is None:
+        raise ValueError(f"Unknown model: {model_name}")
+
+    variant = "fp32"
+    if precision == "int8":
+        quantized_path = quantized_model_path(cache_dir, model_name) if cache_dir else None
+        if quantized_path and os.path.exists(quantized_path):
+            session_class = _model_file_session(session_class, quantized_path)
+            variant = "int8"
+        else:
+            logger.warning(f"No INT8 {model_name} model in {cache_dir}, using FP32 (see python -m quantize)")
+
+    levels = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+
+    def session_options(level: str = graph_optimization):
+        sess_opts = ort.SessionOptions()
+        if intra_op_threads:
+            sess_opts.intra_op_num_threads = intra_op_threads
+        sess_opts.graph_optimization_level = levels[level]
+        if execution_mode == "parallel":
+            # Independent branches of the graph run side by side on inter-op threads
+            sess_opts.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        else:
+            sess_opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            sess_opts.inter_op_num_threads = 1
+        return sess_opts
+
+    providers = ['CPUExecutionProvider']
+    if not cache_dir or graph_optimization == "disable":
+        return session_class(model_name, session_options(), providers=providers)
+
+    # Saved at most at the extended level: layout optimizations are hardware
+    # specific and are applied again, cheaply, when the file is loaded
+    saved_level = "extended" if graph_optimization == "all" else graph_optimization
+    cached_path = os.path.join(cache_dir, f"{model_name}-{variant}-{saved_level}-ort{ort.__version__}.onnx")
+    if not os.path.exists(cached_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        partial_path = f"{cached_path}.{os.getpid()}.tmp"
+        sess_opts = session_options(saved_level)
+        sess_opts.optimized_model_filepath = partial_path
+        session = session_class(model_name, sess_opts, providers=providers)
+        try:
+            os.replace(partial_path, cached_path)
+            logger.info(f"Saved optimized {model_name} model to {cached_path}")
+        except OSError as e:
+            logger.warning(f"Could not save optimized {model_name} model: {e}")
+            return session
+
+    try:
+        return _model_file_session(session_class, cached_path)(model_name, session_options(), providers=providers)
+    except Exception as e:
+        logger.warning(f"Discarding unreadable optimized {model_name} model: {e}")
+        try:
+            os.remove(cached_path)
+        except OSError:
+            pass
+        return session_class(model_name, session_options(), providers=providers)
+
 class BackgroundRemover:
-    def __init__(self):
-        self.session = None
-        self.model_name = "u2net"  # High quality model
-        
+    def __init__(
+        self,
+        batch_size: int = 1,
+        batch_wait_ms: float = 5.0,
+        concurrency: int = 2,
+        max_queue_depth: int = 8,
+        inference_mode: str = "thread",
+        workers: int = 0,
+        threads_per_worker: int = 0,
+        model_name: str = "u2net",
+        model_memory_budget_mb: int = 600,
+        session_factory: Callable = None,
+        upsample_mode: str = "guided",
+        refine_mode: str = "smooth",
+        max_processing_size: int = 2048,
+        large_image_mode: str = "resize",
+        tile_size: int = 1024,
+        tile_memory_mb: int = 256,
+        model_cache_dir: Optional[str] = None,
+        graph_optimization: str = "all",
+        execution_mode: str = "sequential",
+        precision: str = "fp32",
+        mask_index_bytes: int = 0,
+        mask_reuse_distance: int = 8
+    ):
+        if model_name not in AVAILABLE_MODELS:
+            raise ValueError(f"Unknown model: {model_name}")
+        if upsample_mode not in UPSAMPLE_MODES:
+            raise ValueError(f"Unknown upsample mode: {upsample_mode}")
+        if refine_mode not in REFINE_MODES:
+            raise ValueError(f"Unknown refinement mode: {refine_mode}")
+        if large_image_mode not in LARGE_IMAGE_MODES:
+            raise ValueError(f"Unknown large image mode: {large_image_mode}")
+        if graph_optimization not in GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(f"Unknown graph optimization level: {graph_optimization}")
+        if execution_mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {execution_mode}")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision}")
+
+        self.model_name = model_name  # Default model, u2net for high quality
+        self.batch_size = batch_size
+        self.batch_wait_ms = batch_wait_ms
+        self.upsample_mode = upsample_mode
+        self.refine_mode = refine_mode
+        self.max_processing_size = max_processing_size
+        self.large_image_mode = large_image_mode
+        self.tile_size = tile_size
+        self.tile_memory_bytes = tile_memory_mb * 1024 * 1024
+        self.graph_optimization = graph_optimization
+        self.execution_mode = execution_mode
+        self.precision = precision
+        self.schedulers = {}
+        self.session_factory = session_factory or functools.partial(
+            create_session,
+            cache_dir=model_cache_dir,
+            graph_optimization=graph_optimization,
+            execution_mode=execution_mode,
+            precision=precision
+        )
+        # In thread mode up to ``concurrency`` sessions run at once and share the
+        # container's CPU quota, not the host's cores
+        _, self.intra_op_threads = auto_size_pool(available_cpus(), concurrency, threads_per_worker)
+        self.registry = SessionRegistry(
+            self.session_factory, model_memory_budget_mb, intra_op_threads=self.intra_op_threads
+        )
+
+        # In process mode the API process only dispatches; workers hold the sessions
+        self.worker_pool = None
+        if inference_mode == "process":
+            self.worker_pool = InferenceWorkerPool(
+                self.model_name,
+                self.session_factory,
+                workers=workers,
+                threads_per_worker=threads_per_worker,
+                model_memory_budget_mb=model_memory_budget_mb
+            )
+            concurrency = max(concurrency, self.worker_pool.workers)
+        elif inference_mode != "thread":
+            raise ValueError(f"Unknown inference mode: {inference_mode}")
+
+        self.executor = InferenceExecutor(concurrency=concurrency, max_queue_depth=max_queue_depth)
+
+        # Only requests holding an inference slot reach the batcher, so a batch
+        # never holds more images than there are slots
+        self.effective_batch_size = min(batch_size, concurrency)
+        if batch_size > concurrency:
+            logger.warning(
+                f"Batch size {batch_size} exceeds inference concurrency {concurrency}; "
+                f"batches will hold at most {concurrency} images"
+            )
+
+        # Masks of recent inputs, reused for re-encoded or resized copies of them
+        self.mask_index = MaskIndex(mask_index_bytes, mask_reuse_distance) if mask_index_bytes > 0 else None
+
     async def initialize(self):
-        """Initialize the background removal model"""
+        """Initialize the default background removal model; others load on first use"""
         try:
-            logger.info(f"Loading {self.model_name} model...")
-            
-            # Configure ONNX Runtime for CPU optimization
-            ort.set_default_logger_severity(3)  # Suppress warnings
-            
-            # Initialize rembg session with optimized settings
-            self.session = new_session(
-                model_name=self.model_name,
-                providers=['CPUExecutionProvider'],
-                provider_options=[{
-                    'intra_op_num_threads': 2,  # Optimize for 2 core VPS
-                    'inter_op_num_threads': 1,
-                    'enable_mem_pattern': True,
-                    'enable_mem_reuse': True,
-                }]
-            )
+            if self.worker_pool:
+                await self.worker_pool.start()
+            else:
+                await self.executor.run(self.registry.get, self.model_name)
             
             logger.info("Background remover initialized successfully")
             
@@ -41,144 +246,347 @@ class BackgroundRemover:
             logger.error(f"Failed to initialize background remover: {e}")
             raise
 
-    async def remove_background(self, image_data: Union[bytes, Image.Image]) -> Image.Image:
-        """Remove background from image"""
+    async def warmup(self):
+        """Run the pipeline once per inference worker on a small image
+
+        The first run of a session allocates ONNX Runtime's memory arenas
+        and the first pass through the pipeline loads lazily initialized
+        code, so doing it before taking traffic keeps it off user requests.
+        """
+        image = Image.linear_gradient("L").convert("RGB")
+        runs = self.worker_pool.workers if self.worker_pool else 1
+        await asyncio.gather(*(self.remove_background(image) for _ in range(runs)))
+        logger.info(f"Warmed up {self.model_name} with {runs} run(s)")
+
+    async def _get_scheduler(self, model_name: str) -> Optional[BatchScheduler]:
+        """Get the micro-batching scheduler for a model, if batching applies"""
+        if self.effective_batch_size <= 1 or model_name not in MODEL_INPUT_SPECS:
+            return None
+
+        scheduler = self.schedulers.get(model_name)
+        if scheduler is None:
+            # Micro-batch concurrent requests into shared forward passes
+            scheduler = BatchScheduler(
+                lambda: self.registry.get(model_name),
+                model_name,
+                max_batch_size=self.effective_batch_size,
+                max_wait_ms=self.batch_wait_ms,
+                executor=self.executor.executor
+            )
+            self.schedulers[model_name] = scheduler
+            await scheduler.start()
+        return scheduler
+
+    async def remove_background(
+        self,
+        image_data: Union[bytes, Image.Image],
+        timings: Optional[dict] = None,
+        deadline: Optional[float] = None,
+        model: Optional[str] = None,
+        fit_size: Optional[Tuple[int, int]] = None,
+        reuse_masks: bool = True,
+        mask_match: Optional[dict] = None
+    ) -> Image.Image:
+        """Remove background from image
+
+        ``model`` selects a registered model (default model when omitted).
+        With ``fit_size`` the image is decoded and processed at no more than
+        that size, for previews that would otherwise discard most of the work.
+        Unless ``reuse_masks`` is false, a near-duplicate of a recent input
+        reuses its mask from the mask index instead of running inference, and
+        the hash distance of the match is stored in ``mask_match["distance"]``.
+        Per-stage durations in seconds are added to ``timings`` when given.
+        Raises ``QueueFullError`` when the inference queue is full and
+        ``DeadlineExceededError`` when the ``time.monotonic()`` deadline
+        passes before inference starts.
+        """
+        if timings is None:
+            timings = {}
+        model = model or self.model_name
+        if model not in AVAILABLE_MODELS:
+            raise ValueError(f"Unknown model: {model}")
+
+        queue_start = time.perf_counter()
+        async with self.executor.slot(deadline):
+            _record_stage(timings, "queue", queue_start)
+            return await self._remove_background(
+                image_data, timings, deadline, model, fit_size, reuse_masks, mask_match
+            )
+
+    async def _remove_background(
+        self,
+        image_data: Union[bytes, Image.Image],
+        timings: dict,
+        deadline: Optional[float],
+        model: str,
+        fit_size: Optional[Tuple[int, int]] = None,
+        reuse_masks: bool = True,
+        mask_match: Optional[dict] = None
+    ) -> Image.Image:
         try:
-            # Convert input to PIL Image if needed
-            if isinstance(image_data, bytes):
-                original_image = Image.open(io.BytesIO(image_data))
-            else:
-                original_image = image_data
-            
-            # Ensure image is in RGB mode
-            if original_image.mode != 'RGB':
-                original_image = original_image.convert('RGB')
+            stage_start = time.perf_counter()
+            # CPU-bound stages run on the inference threads to keep the event loop free
+            original_image = await self.executor.run(self._decode_image, image_data, fit_size)
+            stage_start = _record_stage(timings, "decode", stage_start)
             
             # Get original size
             original_size = original_image.size
             
             # Resize for processing if too large (memory optimization)
-            max_size = 2048
+            max_size = self.max_processing_size
             if max(original_size) > max_size:
                 ratio = max_size / max(original_size)
                 new_size = tuple(int(dim * ratio) for dim in original_size)
-                processing_image = original_image.resize(new_size, Image.Resampling.LANCZOS)
+                processing_image = await self.executor.run(original_image.resize, new_size, Image.Resampling.LANCZOS)
             else:
                 processing_image = original_image
+            stage_start = _record_stage(timings, "resize", stage_start)
+
+            # Drop expired work before paying for inference
+            if deadline is not None and time.monotonic() > deadline:
+                self.executor.expired += 1
+                raise DeadlineExceededError(self.executor.retry_after())
             
-            # Convert to bytes for rembg
-            img_byte_arr = io.BytesIO()
-            processing_image.save(img_byte_arr, format='PNG')
-            img_bytes = img_byte_arr.getvalue()
-            
-            # Run background removal in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            result_bytes = await loop.run_in_executor(
-                None, 
-                self._remove_bg_sync, 
-                img_bytes
-            )
-            
-            # Convert back to PIL Image
-            result_image = Image.open(io.BytesIO(result_bytes))
-            
-            # Resize back to original size if it was resized
-            if max(original_size) > max_size:
-                result_image = result_image.resize(original_size, Image.Resampling.LANCZOS)
-            
+            mask, distance = await self._coarse_mask(processing_image, model, reuse_masks and self.mask_index is not None)
+            if distance is None:
+                stage_start = _record_stage(timings, "inference", stage_start)
+            else:
+                if mask_match is not None:
+                    mask_match["distance"] = distance
+                stage_start = _record_stage(timings, "mask_reuse", stage_start)
+
+            if processing_image is not original_image and self.large_image_mode == "tiled":
+                # Work on the RGBA result from here so a decoded RGB copy can be freed
+                result_image = await self.executor.run(original_image.convert, "RGBA")
+                original_image = None
+                stage_start = _record_stage(timings, "composite", stage_start)
+                stage_start = await self._refine_tiled(result_image, processing_image, mask, model, timings, stage_start)
+            elif processing_image is not original_image and self.upsample_mode == "lanczos":
+                # Composite at processing size and resize the whole RGBA result
+                await self.executor.run(processing_image.putalpha, mask)
+                stage_start = _record_stage(timings, "composite", stage_start)
+                result_image = await self.executor.run(processing_image.resize, original_size, Image.Resampling.LANCZOS)
+                stage_start = _record_stage(timings, "upscale", stage_start)
+            else:
+                if processing_image is not original_image:
+                    # Upsample only the mask, edge-aware against the full-resolution original
+                    mask = await self.executor.run(
+                        guided_upsample_mask, mask, processing_image, original_image
+                    )
+                    stage_start = _record_stage(timings, "upscale", stage_start)
+
+                # Attach the mask as alpha without going through encoded buffers
+                if original_image is image_data:
+                    original_image = await self.executor.run(original_image.copy)
+                await self.executor.run(original_image.putalpha, mask)
+                result_image = original_image
+                stage_start = _record_stage(timings, "composite", stage_start)
+
             # Post-process to improve quality
-            result_image = self._post_process_image(result_image)
+            result_image = await self.executor.run(self._post_process_image, result_image)
+            _record_stage(timings, "post_process", stage_start)
             
             return result_image
-            
+
+        except DeadlineExceededError:
+            raise
         except Exception as e:
             logger.error(f"Background removal failed: {e}")
             raise
 
-    def _remove_bg_sync(self, image_bytes: bytes) -> bytes:
-        """Synchronous background removal"""
-        return remove(image_bytes, session=self.session)
+    async def _coarse_mask(self, image: Image.Image, model: str, reuse: bool) -> Tuple[Image.Image, Optional[int]]:
+        """Predict a mask, or reuse the indexed mask of a near-duplicate image
+
+        Returns the mask and the hash distance of the reused one, or None
+        when inference ran.
+        """
+        if not reuse:
+            return await self._predict_mask(image, model), None
+
+        signature = await self.executor.run(dhash, image)
+        match = self.mask_index.lookup(model, signature, image.size)
+        if match is None:
+            mask = await self._predict_mask(image, model)
+            small = await self.executor.run(downscale_mask, mask, MODEL_INPUT_SPECS[model][2])
+            self.mask_index.add(model, signature, image.size, small)
+            return mask, None
+
+        cached, distance = match
+        if cached.width >= image.width:
+            return await self.executor.run(cached.resize, image.size, Image.Resampling.BILINEAR), distance
+        # Snap the stored low-resolution mask to this image's own edges
+        guide_small = await self.executor.run(image.resize, cached.size, Image.Resampling.BOX)
+        return await self.executor.run(guided_upsample_mask, cached, guide_small, image), distance
+
+    async def _predict_mask(self, image: Image.Image, model: str) -> Image.Image:
+        """Predict an L mask for an RGB image with the given model"""
+        if self.worker_pool:
+            # Dispatched to an inference worker process
+            return await self.worker_pool.predict(image, model)
+
+        scheduler = await self._get_scheduler(model)
+        if scheduler:
+            # Batched with other in-flight requests
+            return await scheduler.predict(image)
+
+        # Run inference on the dedicated pool to avoid blocking
+        return await self.executor.run(self._predict_mask_sync, image, model)
+
+    async def _refine_tiled(
+        self,
+        image: Image.Image,
+        processing_image: Image.Image,
+        coarse_mask: Image.Image,
+        model: str,
+        timings: dict,
+        stage_start: float
+    ) -> float:
+        """Write a full-resolution alpha into an RGBA image, one row of tiles at a time
+
+        Tiles near edges of the coarse mask get their own mask from a
+        full-resolution crop; output rows are assembled in chunks once the
+        tile rows covering them are known, so memory beyond the image itself
+        stays within the tile memory budget.
+        """
+        tile, chunk_rows = plan_tiles(image.width, self.tile_size, self.tile_memory_bytes)
+        tiled = await self.executor.run(
+            TiledMask, coarse_mask, processing_image, image.size, tile, tile // 8
+        )
+        stage_start = _record_stage(timings, "upscale", stage_start)
+
+        previous = []
+        for index in range(len(tiled.tops)):
+            boxes = tiled.tile_boxes(index)
+            crops = await self.executor.run(self._crop_tiles, image, boxes)
+            masks = await asyncio.gather(*(self._predict_mask(crop, model) for crop in crops))
+            current = [(box, np.asarray(mask)) for box, mask in zip(boxes, masks)]
+            stage_start = _record_stage(timings, "inference", stage_start)
+
+            top, bottom = tiled.row_range(index)
+            await self.executor.run(self._write_alpha_rows, image, tiled, top, bottom, previous + current, chunk_rows)
+            stage_start = _record_stage(timings, "upscale", stage_start)
+            previous = current
+        return stage_start
+
+    @staticmethod
+    def _crop_tiles(image: Image.Image, boxes: list) -> List[Image.Image]:
+        return [image.crop(box).convert("RGB") for box in boxes]
+
+    @staticmethod
+    def _write_alpha_rows(image: Image.Image, tiled: TiledMask, top: int, bottom: int, tiles: list, chunk_rows: int):
+        for chunk_top in range(top, bottom, chunk_rows):
+            box = (0, chunk_top, image.width, min(chunk_top + chunk_rows, bottom))
+            region = image.crop(box)
+            alpha = tiled.alpha_rows(box[1], box[3], np.asarray(region.convert("L")), tiles)
+            region.putalpha(Image.fromarray(alpha, "L"))
+            image.paste(region, box)
+
+    @staticmethod
+    def _decode_image(image_data: Union[bytes, Image.Image], fit_size: Optional[Tuple[int, int]]) -> Image.Image:
+        """Decode an input into an RGB image, fitted within ``fit_size`` when given"""
+        # Convert input to PIL Image if needed
+        if isinstance(image_data, bytes):
+            image = Image.open(io.BytesIO(image_data))
+        else:
+            image = image_data
+
+        if fit_size:
+            # JPEGs not yet decoded load straight at a reduced DCT scale; a no-op otherwise
+            image.draft("RGB", fit_size)
+
+        # Ensure image is in RGB mode
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        else:
+            image.load()
+
+        if fit_size:
+            scale = min(fit_size[0] / image.width, fit_size[1] / image.height)
+            if scale < 1:
+                fitted_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+                image = image.resize(fitted_size, Image.Resampling.LANCZOS)
+        return image
+
+    def _predict_mask_sync(self, image: Image.Image, model: str) -> Image.Image:
+        """Synchronous mask prediction straight from a PIL image"""
+        return predict_mask(self.registry.get(model), model, image)
 
     def _post_process_image(self, image: Image.Image) -> Image.Image:
-        """Post-process the image to improve quality"""
+        """Post-process the image to improve quality
+
+        Refines the alpha channel in place around its edges, in the
+        configured refinement mode; solid regions are left untouched.
+        The alpha plane is read in bands of ``POST_PROCESS_ROWS`` rows plus
+        the filter margin, so large results are never copied whole.
+        """
         try:
-            # Convert to numpy array
-            img_array = np.array(image)
-            
-            # Apply alpha matting refinement
-            if img_array.shape[2] == 4:  # RGBA
-                # Get alpha channel
-                alpha = img_array[:, :, 3]
-                
-                # Apply morphological operations to clean up edges
-                kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
-                alpha_cleaned = cv2.morphologyEx(alpha, cv2.MORPH_CLOSE, kernel)
-                alpha_cleaned = cv2.morphologyEx(alpha_cleaned, cv2.MORPH_OPEN, kernel)
-                
-                # Apply Gaussian blur to soften harsh edges
-                alpha_smooth = cv2.GaussianBlur(alpha_cleaned, (3, 3), 0.5)
-                
-                # Update alpha channel
-                img_array[:, :, 3] = alpha_smooth
-                
-                # Convert back to PIL Image
-                result_image = Image.fromarray(img_array, 'RGBA')
-                
-                return result_image
-            
+            if image.mode != "RGBA" or self.refine_mode == "none":
+                return image
+
+            width, height = image.size
+            pending = []
+            for top in range(0, height, POST_PROCESS_ROWS):
+                bottom = min(top + POST_PROCESS_ROWS, height)
+                outer_top, outer_bottom = max(top - REFINE_MARGIN, 0), min(bottom + REFINE_MARGIN, height)
+                alpha = np.asarray(image.crop((0, outer_top, width, outer_bottom)).getchannel("A"))
+
+                patches = []
+                for (left, patch_top, right, patch_bottom), patch in refine_alpha(alpha, self.refine_mode):
+                    # Margin rows belong to the neighbouring bands
+                    start, end = max(patch_top + outer_top, top), min(patch_bottom + outer_top, bottom)
+                    if start < end:
+                        offset = outer_top + patch_top
+                        patches.append(((left, start, right, end), patch[start - offset:end - offset]))
+
+                # The previous band is written only now that this one has read its unrefined margin
+                self._paste_alpha(image, pending)
+                pending = patches
+            self._paste_alpha(image, pending)
             return image
-            
+
         except Exception as e:
             logger.warning(f"Post-processing failed, returning original: {e}")
             return image
 
-    def _enhance_edges(self, image: Image.Image) -> Image.Image:
-        """Enhance edges using machine learning techniques"""
-        try:
-            # Convert to numpy array
-            img_array = np.array(image)
-            
-            if img_array.shape[2] == 4:  # RGBA
-                # Get alpha channel
-                alpha = img_array[:, :, 3].astype(np.float32) / 255.0
-                
-                # Create distance transform for better edge detection
-                alpha_binary = (alpha > 0.5).astype(np.uint8) * 255
-                dist_transform = cv2.distanceTransform(alpha_binary, cv2.DIST_L2, 5)
-                
-                # Normalize and apply sigmoid for smooth falloff
-                dist_normalized = dist_transform / np.max(dist_transform) if np.max(dist_transform) > 0 else dist_transform
-                alpha_enhanced = 1 / (1 + np.exp(-10 * (dist_normalized - 0.1)))
-                
-                # Combine with original alpha
-                alpha_final = np.maximum(alpha, alpha_enhanced * 0.3)
-                alpha_final = np.clip(alpha_final * 255, 0, 255).astype(np.uint8)
-                
-                # Update alpha channel
-                img_array[:, :, 3] = alpha_final
-                
-                return Image.fromarray(img_array, 'RGBA')
-            
-            return image
-            
-        except Exception as e:
-            logger.warning(f"Edge enhancement failed: {e}")
-            return image
+    @staticmethod
+    def _paste_alpha(image: Image.Image, patches: list):
+        for box, patch in patches:
+            region = image.crop(box)
+            region.putalpha(Image.fromarray(patch, "L"))
+            image.paste(region, box)
 
     async def cleanup(self):
         """Cleanup resources"""
         try:
-            if self.session:
-                # rembg sessions don't need explicit cleanup
-                self.session = None
+            for scheduler in self.schedulers.values():
+                await scheduler.stop()
+            self.schedulers = {}
+            if self.worker_pool:
+                await self.worker_pool.stop()
+            self.executor.shutdown()
+            # rembg sessions don't need explicit cleanup
+            self.registry.clear()
             logger.info("Background remover cleanup completed")
         except Exception as e:
             logger.error(f"Cleanup error: {e}")
 
     def get_model_info(self) -> dict:
-        """Get information about the loaded model"""
+        """Get information about the default model and the registry"""
+        loaded = self.worker_pool is not None or self.registry.is_loaded(self.model_name)
         return {
             "model_name": self.model_name,
-            "status": "loaded" if self.session else "not_loaded",
-            "description": "U²-Net model for high-quality background removal"
+            "status": "loaded" if loaded else "not_loaded",
+            "description": AVAILABLE_MODELS[self.model_name]["description"],
+            "available_models": {name: info["description"] for name, info in AVAILABLE_MODELS.items()},
+            "registry": self.registry.get_stats() if not self.worker_pool else None,
+            "batching": {name: scheduler.get_stats() for name, scheduler in self.schedulers.items()} or None,
+            "queue": self.executor.get_stats(),
+            "workers": self.worker_pool.get_stats() if self.worker_pool else None,
+            "mask_index": self.mask_index.get_stats() if self.mask_index else None,
+            "runtime": {
+                "intra_op_threads": self.worker_pool.threads_per_worker if self.worker_pool else self.intra_op_threads,
+                "graph_optimization": self.graph_optimization,
+                "execution_mode": self.execution_mode,
+                "precision": self.precision,
+            }
         }
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Two-tier cache of encoded results: in-memory LRU backed by a disk tier"""
+
+    def __init__(self, memory_bytes: int, disk_dir: Optional[str] = None, disk_bytes: int = 0):
+        self.memory_limit = memory_bytes
+        self.disk_limit = disk_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir and disk_bytes > 0 else None
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+        self._disk_ready = False
+        # Keys being written to disk; a concurrent put of the same key skips the write
+        self._disk_pending: set[str] = set()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def initialize(self):
+        """Create the disk tier and index any entries left from a previous run"""
+        if not self.disk_dir:
+            return
+
+        try:
+            loop = asyncio.get_event_loop()
+            entries = await loop.run_in_executor(None, self._scan_disk)
+            for key, size in entries:
+                self._disk[key] = size
+                self._disk_size += size
+            self._disk_ready = True
+            self._evict_disk()
+            logger.info(f"Result cache loaded {len(self._disk)} entries from disk")
+        except Exception as e:
+            logger.error(f"Failed to initialize disk cache, using memory only: {e}")
+
+    def _scan_disk(self) -> list[tuple[str, int]]:
+        self.disk_dir.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for file_path in self.disk_dir.glob("*.bin"):
+            stat = file_path.stat()
+            entries.append((stat.st_mtime, file_path.stem, stat.st_size))
+        # Oldest first so the index starts in LRU order
+        entries.sort()
+        return [(key, size) for _, key, size in entries]
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.bin"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Look up a result, promoting disk hits into memory"""
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return data
+
+        if self._disk_ready and key in self._disk:
+            loop = asyncio.get_event_loop()
+            try:
+                data = await loop.run_in_executor(None, self._read_disk, key)
+            except OSError:
+                # Removed behind our back (e.g. temp dir cleanup)
+                self._drop_disk(key)
+                data = None
+
+            if data is not None:
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                self.disk_hits += 1
+                self._put_memory(key, data)
+                return data
+
+        self.misses += 1
+        return None
+
+    def _read_disk(self, key: str) -> bytes:
+        path = self._disk_path(key)
+        data = path.read_bytes()
+        # Refresh mtime so LRU order survives restarts
+        os.utime(path)
+        return data
+
+    async def put(self, key: str, data: bytes):
+        """Store a result in both tiers"""
+        self._put_memory(key, data)
+
+        if (not self._disk_ready or len(data) > self.disk_limit
+                or key in self._disk or key in self._disk_pending):
+            return
+
+        self._disk_pending.add(key)
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(None, self._write_disk, key, data)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry: {e}")
+            return
+        finally:
+            self._disk_pending.discard(key)
+
+        self._disk[key] = len(data)
+        self._disk_size += len(data)
+        self._evict_disk()
+
+    def _write_disk(self, key: str, data: bytes):
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def _put_memory(self, key: str, data: bytes):
+        if len(data) > self.memory_limit:
+            return
+
+        if key in self._memory:
+            self._memory_size -= len(self._memory.pop(key))
+
+        self._memory[key] = data
+        self._memory_size += len(data)
+
+        while self._memory_size > self.memory_limit:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.evictions += 1
+
+    def _drop_disk(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_size -= size
+
+    def _evict_disk(self):
+        while self._disk_size > self.disk_limit and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            self.evictions += 1
+            try:
+                self._disk_path(key).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to evict cache entry {key}: {e}")
+
+    def get_stats(self) -> dict:
+        """Get cache statistics"""
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_size,
+            "memory_limit": self.memory_limit,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_size,
+            "disk_limit": self.disk_limit if self._disk_ready else 0,
+        }
@@ -0,0 +1,202 @@
+import io
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image, features
+
+
+@dataclass(frozen=True)
+class OutputFormat:
+    """An output encoding with its response metadata and speed-tuned default quality"""
+    name: str
+    media_type: str
+    extension: str
+    default_quality: int
+
+
+# For lossless formats ``quality`` is compression effort: higher is smaller but slower
+OUTPUT_FORMATS = {
+    "png": OutputFormat("png", "image/png", "png", 10),
+    "webp": OutputFormat("webp", "image/webp", "webp", 90),
+    "webp-lossless": OutputFormat("webp-lossless", "image/webp", "webp", 25),
+    "mask": OutputFormat("mask", "image/png", "png", 10),
+}
+
+
+def resolve_output(output_format: Optional[str], quality: Optional[int], default_format: str = "png") -> tuple[OutputFormat, int]:
+    """Resolve a requested format and quality, raising ValueError for bad values"""
+    name = (output_format or default_format).lower()
+    if name not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown format '{name}'. Available: {', '.join(OUTPUT_FORMATS)}")
+
+    fmt = OUTPUT_FORMATS[name]
+    if quality is None:
+        return fmt, fmt.default_quality
+    if not 0 <= quality <= 100:
+        raise ValueError("Quality must be between 0 and 100")
+    return fmt, quality
+
+
+def encode_image(image: Image.Image, fmt: OutputFormat, quality: int) -> bytes:
+    """Encode an RGBA result in the given output format"""
+    buffer = io.BytesIO()
+    if fmt.name == "png":
+        image.save(buffer, format="PNG", compress_level=_png_compress_level(quality))
+    elif fmt.name == "mask":
+        image.getchannel("A").save(buffer, format="PNG", compress_level=_png_compress_level(quality))
+    elif fmt.name == "webp":
+        # method=0 is the fastest encoder setting; quality drives size
+        image.save(buffer, format="WEBP", quality=quality, method=0)
+    elif fmt.name == "webp-lossless":
+        image.save(buffer, format="WEBP", lossless=True, quality=quality, method=0)
+    else:
+        raise ValueError(f"Unknown format '{fmt.name}'")
+    return buffer.getvalue()
+
+
+def _png_compress_level(quality: int) -> int:
+    # Map 0-100 effort onto zlib levels 0-9
+    return round(quality * 9 / 100)
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# APNG frame delays are 16-bit fractions of a second
+MAX_FRAME_DELAY_MS = 65535
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def _png_chunks(data: bytes):
+    """Yield (type, payload) for each chunk of an encoded PNG"""
+    position = len(PNG_SIGNATURE)
+    while position < len(data):
+        length, chunk_type = struct.unpack(">I4s", data[position:position + 8])
+        yield chunk_type, data[position + 8:position + 8 + length]
+        position += length + 12
+
+
+class APNGEncoder:
+    """Animated PNG written one frame at a time
+
+    Pillow's APNG writer holds every frame until the end; here each frame is
+    compressed as it is added and only the encoded output is kept.
+    """
+
+    def __init__(self, compress_level: int, loop: int = 0, mask: bool = False):
+        self.compress_level = compress_level
+        self.loop = loop
+        self.mask = mask
+        self.frames = 0
+        self._size = None
+        self._sequence = 0
+        self._actl_offset = 0
+        self._buffer = io.BytesIO()
+
+    def add(self, image: Image.Image, duration_ms: float):
+        """Append an RGBA frame shown for ``duration_ms``"""
+        if self._size is None:
+            self._size = image.size
+        elif image.size != self._size:
+            raise ValueError("All frames must have the same size")
+        if self.mask:
+            image = image.getchannel("A")
+
+        frame = io.BytesIO()
+        image.save(frame, format="PNG", compress_level=self.compress_level)
+        chunks = list(_png_chunks(frame.getvalue()))
+        data = b"".join(payload for chunk_type, payload in chunks if chunk_type == b"IDAT")
+
+        if not self.frames:
+            header = next(payload for chunk_type, payload in chunks if chunk_type == b"IHDR")
+            self._buffer.write(PNG_SIGNATURE + _png_chunk(b"IHDR", header))
+            # The frame count is only known at the end; finish() patches it in
+            self._actl_offset = self._buffer.tell()
+            self._buffer.write(self._animation_control())
+
+        delay = min(max(round(duration_ms), 0), MAX_FRAME_DELAY_MS)
+        # Full-canvas frames replace the previous one, transparent pixels included
+        control = struct.pack(">IIIIIHHBB", self._next_sequence(), *self._size, 0, 0, delay, 1000, 0, 0)
+        self._buffer.write(_png_chunk(b"fcTL", control))
+        if not self.frames:
+            # The first frame doubles as the still image for non-animated viewers
+            self._buffer.write(_png_chunk(b"IDAT", data))
+        else:
+            self._buffer.write(_png_chunk(b"fdAT", struct.pack(">I", self._next_sequence()) + data))
+        self.frames += 1
+
+    def finish(self) -> bytes:
+        """Return the encoded animation"""
+        if not self.frames:
+            raise ValueError("Animation has no frames")
+        self._buffer.write(_png_chunk(b"IEND", b""))
+        control = self._animation_control()
+        with self._buffer.getbuffer() as view:
+            view[self._actl_offset:self._actl_offset + len(control)] = control
+        return self._buffer.getvalue()
+
+    def _animation_control(self) -> bytes:
+        return _png_chunk(b"acTL", struct.pack(">II", self.frames, self.loop))
+
+    def _next_sequence(self) -> int:
+        self._sequence += 1
+        return self._sequence - 1
+
+
+def webp_animation_supported() -> bool:
+    """Whether this Pillow build can write animated WebP"""
+    if not features.check_module("webp"):
+        return False
+    # Pillow 11 dropped the separate flag; animation ships with every WebP build
+    return "webp_anim" not in features.features or features.check_feature("webp_anim")
+
+
+class WebPAnimationEncoder:
+    """Animated WebP fed one frame at a time
+
+    Pillow only writes animated WebP from a complete frame sequence, so
+    frames are first compressed into an intermediate APNG. ``finish`` hands
+    that to ``save_all``, which decodes it one frame at a time.
+    """
+
+    def __init__(self, lossless: bool, quality: int, loop: int = 0):
+        if not webp_animation_supported():
+            raise ValueError("Animated WebP output is not supported by this Pillow build")
+        self.lossless = lossless
+        self.quality = quality
+        self.loop = loop
+        # Level 1 keeps the intermediate cheap; it is decoded again right away
+        self._frames = APNGEncoder(compress_level=1, loop=loop)
+        self._durations = []
+
+    @property
+    def frames(self) -> int:
+        return self._frames.frames
+
+    def add(self, image: Image.Image, duration_ms: float):
+        """Append an RGBA frame shown for ``duration_ms``"""
+        self._frames.add(image, duration_ms)
+        self._durations.append(round(duration_ms))
+
+    def finish(self) -> bytes:
+        """Return the encoded animation"""
+        animation = Image.open(io.BytesIO(self._frames.finish()))
+        buffer = io.BytesIO()
+        # method=0 is the fastest encoder setting, as for still images
+        animation.save(
+            buffer, format="WEBP", save_all=True, duration=self._durations, loop=self.loop,
+            lossless=self.lossless, quality=self.quality, method=0
+        )
+        return buffer.getvalue()
+
+
+def animation_encoder(fmt: OutputFormat, quality: int, loop: int = 0):
+    """Streaming encoder for an animated result: APNG for png and mask, animated WebP otherwise"""
+    if fmt.name in ("png", "mask"):
+        return APNGEncoder(_png_compress_level(quality), loop, mask=fmt.name == "mask")
+    if fmt.name in ("webp", "webp-lossless"):
+        return WebPAnimationEncoder(fmt.name == "webp-lossless", quality, loop)
+    raise ValueError(f"Unknown format '{fmt.name}'")
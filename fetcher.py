@@ -0,0 +1,157 @@
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ContentTooLargeError(ValueError):
+    """Download exceeds the size limit"""
+
+
+@dataclass
+class _CachedDownload:
+    content: bytes
+    filename: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+class URLFetcher:
+    """Shared, connection-pooled image downloader with a revalidating cache
+
+    Bodies are streamed and abandoned as soon as they exceed ``max_size``.
+    Responses carrying ``ETag`` or ``Last-Modified`` are kept within
+    ``cache_bytes`` and revalidated with conditional requests, so an
+    unchanged asset costs one round trip and yields identical bytes (which
+    then hit the result cache).
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        timeout: float = 30,
+        limit: int = 32,
+        limit_per_host: int = 4,
+        cache_bytes: int = 32 * 1024 * 1024
+    ):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.cache_bytes = cache_bytes
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._cache: "OrderedDict[str, _CachedDownload]" = OrderedDict()
+        self._cache_size = 0
+
+        self.downloads = 0
+        self.revalidated = 0
+        self.too_large = 0
+
+    async def start(self):
+        """Open the pooled client session"""
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=300
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+
+    async def stop(self):
+        """Close the client session and its pooled connections"""
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def fetch(self, url: str) -> tuple[bytes, str]:
+        """Download an image, returning its bytes and a filename"""
+        if self._session is None:
+            raise RuntimeError("URL fetcher not started")
+
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.netloc:
+            raise ValueError("Invalid URL")
+
+        cached = self._cache.get(url)
+        headers = {}
+        if cached:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        async with self._session.get(url, headers=headers) as response:
+            if response.status == 304 and cached:
+                self.revalidated += 1
+                self._cache.move_to_end(url)
+                return cached.content, cached.filename
+
+            if response.status != 200:
+                raise ValueError(f"Failed to download: HTTP {response.status}")
+
+            content = await self._read_capped(response)
+            self.downloads += 1
+
+            # Get filename from URL or use default
+            filename = parsed.path.split('/')[-1] or 'image.jpg'
+            if '.' not in filename:
+                filename += '.jpg'
+
+            self._store(url, response, content, filename)
+            return content, filename
+
+    async def _read_capped(self, response: aiohttp.ClientResponse) -> bytes:
+        if response.content_length is not None and response.content_length > self.max_size:
+            self.too_large += 1
+            raise ContentTooLargeError(f"File too large (max {self.max_size} bytes)")
+
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            size += len(chunk)
+            if size > self.max_size:
+                self.too_large += 1
+                raise ContentTooLargeError(f"File too large (max {self.max_size} bytes)")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _store(self, url: str, response: aiohttp.ClientResponse, content: bytes, filename: str):
+        self._discard(url)
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        if not (etag or last_modified) or "no-store" in cache_control or len(content) > self.cache_bytes:
+            return
+
+        self._cache[url] = _CachedDownload(content, filename, etag, last_modified)
+        self._cache_size += len(content)
+        while self._cache_size > self.cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_size -= len(evicted.content)
+
+    def _discard(self, url: str):
+        cached = self._cache.pop(url, None)
+        if cached:
+            self._cache_size -= len(cached.content)
+
+    def get_stats(self) -> dict:
+        """Get download and cache statistics"""
+        return {
+            "downloads": self.downloads,
+            "revalidated": self.revalidated,
+            "too_large": self.too_large,
+            "cached_urls": len(self._cache),
+            "cache_bytes": self._cache_size,
+            "limit_per_host": self.limit_per_host,
+        }
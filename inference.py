@@ -0,0 +1,293 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Normalization mean, std and input resolution used by rembg for each model
+MODEL_INPUT_SPECS = {
+    "u2net": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    "u2netp": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    "u2net_human_seg": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    "silueta": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    "isnet-general-use": ((0.5, 0.5, 0.5), (1.0, 1.0, 1.0), (1024, 1024)),
+}
+
+
+def preprocess(image: Image.Image, model_name: str) -> np.ndarray:
+    """Resize and normalize an image into a CHW float32 model input"""
+    mean, std, size = MODEL_INPUT_SPECS[model_name]
+    resized = np.asarray(image.convert("RGB").resize(size, Image.Resampling.LANCZOS), dtype=np.float32)
+    resized /= max(float(resized.max()), 1e-6)
+    resized -= np.array(mean, dtype=np.float32)
+    resized /= np.array(std, dtype=np.float32)
+    return resized.transpose((2, 0, 1))
+
+
+def postprocess(prediction: np.ndarray, size: tuple[int, int]) -> Image.Image:
+    """Convert a raw model prediction into an L mask of the given size"""
+    mi = float(prediction.min())
+    ma = float(prediction.max())
+    pred = (prediction - mi) / max(ma - mi, 1e-6)
+    mask = Image.fromarray((np.clip(pred, 0, 1) * 255).astype(np.uint8), mode="L")
+    return mask.resize(size, Image.Resampling.LANCZOS)
+
+
+def run_session(session, model_name: str, images: List[Image.Image]) -> List[Image.Image]:
+    """Run one forward pass for a list of images and return their masks"""
+    inputs = np.stack([preprocess(image, model_name) for image in images])
+    model_input = session.inner_session.get_inputs()[0]
+
+    # Models exported with a fixed batch dimension can only take one image per run
+    if isinstance(model_input.shape[0], int) and model_input.shape[0] != len(images):
+        outputs = np.concatenate([
+            session.inner_session.run(None, {model_input.name: inputs[i:i + 1]})[0]
+            for i in range(len(images))
+        ])
+    else:
+        outputs = session.inner_session.run(None, {model_input.name: inputs})[0]
+
+    return [postprocess(outputs[i, 0], image.size) for i, image in enumerate(images)]
+
+
+def predict_mask(session, model_name: str, image: Image.Image) -> Image.Image:
+    """Predict one mask, using the vectorized path for models with known specs"""
+    if model_name in MODEL_INPUT_SPECS:
+        return run_session(session, model_name, [image])[0]
+    return session.predict(image)[0]
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue cannot take more work"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a request's deadline passes before inference starts"""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Request deadline exceeded before processing started")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """Dedicated inference thread pool with admission control
+
+    At most ``concurrency`` requests are processed at once and at most
+    ``max_queue_depth`` more may wait for a slot; anything beyond that is
+    rejected immediately instead of piling up decoded images in memory.
+    """
+
+    def __init__(self, concurrency: int = 2, max_queue_depth: int = 8):
+        self.concurrency = concurrency
+        self.max_queue_depth = max_queue_depth
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="inference")
+
+        self._slots = asyncio.Semaphore(concurrency)
+        self.queued = 0
+        self.running = 0
+
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_service = 0.0
+
+    def retry_after(self) -> int:
+        """Estimate seconds until a slot frees up"""
+        if not self.completed:
+            return 1
+        avg_service = self._total_service / self.completed
+        backlog = (self.queued + self.running) / self.concurrency
+        return max(1, int(round(avg_service * backlog)))
+
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[float] = None):
+        """Wait for a processing slot, rejecting when the queue is full
+
+        ``deadline`` is a ``time.monotonic()`` timestamp; work still queued
+        when it passes is dropped before inference starts.
+        """
+        if self.queued >= self.max_queue_depth and self._slots.locked():
+            self.rejected += 1
+            raise QueueFullError(self.retry_after())
+
+        self.queued += 1
+        enqueued = time.monotonic()
+        try:
+            timeout = None if deadline is None else deadline - enqueued
+            if timeout is not None and timeout <= 0:
+                raise asyncio.TimeoutError()
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.expired += 1
+            raise DeadlineExceededError(self.retry_after())
+        finally:
+            self.queued -= 1
+
+        started = time.monotonic()
+        wait = started - enqueued
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._total_service += time.monotonic() - started
+            self._slots.release()
+
+    async def run(self, func, *args):
+        """Run a blocking function on the inference threads"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> dict:
+        """Get queue statistics"""
+        return {
+            "concurrency": self.concurrency,
+            "max_queue_depth": self.max_queue_depth,
+            "queue_depth": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "avg_wait_ms": round(self._total_wait / self.completed * 1000, 2) if self.completed else 0.0,
+            "max_wait_ms": round(self._max_wait * 1000, 2),
+        }
+
+
+@dataclass
+class _PendingPrediction:
+    image: Image.Image
+    future: asyncio.Future
+
+
+class BatchScheduler:
+    """Collects concurrent mask predictions into batched session runs"""
+
+    def __init__(
+        self,
+        get_session: Callable,
+        model_name: str,
+        max_batch_size: int = 4,
+        max_wait_ms: float = 5.0,
+        executor: Optional[Executor] = None
+    ):
+        """``get_session()`` is called on the executor for every batch so a
+        session evicted from the registry is reloaded on demand."""
+        self.get_session = get_session
+        self.model_name = model_name
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.images = 0
+
+    async def start(self):
+        """Start the batching loop"""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop and fail any waiting predictions"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        while self._queue and not self._queue.empty():
+            self._fail([self._queue.get_nowait()], RuntimeError("Inference scheduler stopped"))
+
+    async def predict(self, image: Image.Image) -> Image.Image:
+        """Queue an image for the next batch and wait for its mask"""
+        if self._task is None:
+            raise RuntimeError("Inference scheduler not started")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingPrediction(image, future))
+        return await future
+
+    async def _collect(self) -> List[_PendingPrediction]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Skip callers that gave up while waiting
+        return [pending for pending in batch if not pending.future.done()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+
+            try:
+                masks = await loop.run_in_executor(
+                    self.executor,
+                    self._run_batch,
+                    [pending.image for pending in batch]
+                )
+            except asyncio.CancelledError:
+                self._fail(batch, RuntimeError("Inference scheduler stopped"))
+                raise
+            except Exception as e:
+                logger.error(f"Batched inference failed: {e}")
+                self._fail(batch, e)
+                continue
+
+            self.batches += 1
+            self.images += len(batch)
+            for pending, mask in zip(batch, masks):
+                if not pending.future.done():
+                    pending.future.set_result(mask)
+
+    def _run_batch(self, images: List[Image.Image]) -> List[Image.Image]:
+        return run_session(self.get_session(), self.model_name, images)
+
+    @staticmethod
+    def _fail(batch: List[_PendingPrediction], error: Exception):
+        for pending in batch:
+            if not pending.future.done():
+                pending.future.set_exception(error)
+
+    def get_stats(self) -> dict:
+        """Get batching statistics"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "images": self.images,
+            "avg_batch_size": round(self.images / self.batches, 2) if self.batches else 0.0,
+        }
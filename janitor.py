@@ -0,0 +1,161 @@
+import asyncio
+import heapq
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TempJanitor:
+    """Background cleanup of the files in a temp directory
+
+    Files are indexed once at startup and registered with ``track`` as they
+    are written. A heap ordered by modification time tells each sweep which
+    files to remove without scanning the directory: those older than ``ttl``,
+    then the oldest ones until the total fits ``quota_bytes`` (0 disables the
+    quota). Only top-level files are managed; subdirectories such as the
+    result cache and model cache look after themselves.
+    """
+
+    def __init__(self, directory: str, ttl: float, quota_bytes: int = 0, interval: float = 60):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.quota_bytes = quota_bytes
+        self.interval = interval
+
+        # path -> (mtime, size); heap entries whose mtime no longer matches are stale
+        self._files: Dict[str, Tuple[float, int]] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._size = 0
+        self._task: Optional[asyncio.Task] = None
+        self._quota_sweep: Optional[asyncio.Task] = None
+
+        self.sweeps = 0
+        self.removed = {"expired": 0, "quota": 0}
+        self.removed_bytes = 0
+
+    async def start(self):
+        """Index the files already in the directory and start sweeping"""
+        loop = asyncio.get_event_loop()
+        try:
+            entries = await loop.run_in_executor(None, self._scan)
+        except OSError as e:
+            logger.error(f"Failed to index {self.directory}: {e}")
+            entries = []
+        for path, mtime, size in entries:
+            self._add(path, mtime, size)
+        logger.info(f"Janitor indexed {len(self._files)} files ({self._size} bytes) in {self.directory}")
+        await self.sweep()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop sweeping"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    @property
+    def tracked_files(self) -> int:
+        return len(self._files)
+
+    @property
+    def tracked_bytes(self) -> int:
+        return self._size
+
+    def track(self, path, size: Optional[int] = None):
+        """Register a file just written to the directory"""
+        if size is None:
+            size = os.path.getsize(path)
+        self._add(str(path), time.time(), size)
+        if self._task and self.quota_bytes and self._size > self.quota_bytes:
+            # Enforce the quota now rather than at the next interval
+            self._quota_sweep = asyncio.create_task(self.sweep())
+
+    def _scan(self) -> List[Tuple[str, float, int]]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    entries.append((entry.path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _add(self, path: str, mtime: float, size: int):
+        previous = self._files.get(path)
+        if previous:
+            self._size -= previous[1]
+        self._files[path] = (mtime, size)
+        self._size += size
+        heapq.heappush(self._heap, (mtime, path))
+
+    def _due(self, now: float) -> List[Tuple[str, str]]:
+        """Pop the files to remove, with the reason for each"""
+        due = []
+        while self._heap:
+            mtime, path = self._heap[0]
+            entry = self._files.get(path)
+            if entry is None or entry[0] != mtime:
+                heapq.heappop(self._heap)
+                continue
+            if now - mtime > self.ttl:
+                reason = "expired"
+            elif self.quota_bytes and self._size > self.quota_bytes:
+                reason = "quota"
+            else:
+                break
+            heapq.heappop(self._heap)
+            del self._files[path]
+            self._size -= entry[1]
+            due.append((path, reason))
+        return due
+
+    async def sweep(self):
+        """Remove expired files, then the oldest ones while over the quota"""
+        due = self._due(time.time())
+        self.sweeps += 1
+        if not due:
+            return
+        loop = asyncio.get_event_loop()
+        removed_bytes = await loop.run_in_executor(None, self._remove, [path for path, _ in due])
+        for _, reason in due:
+            self.removed[reason] += 1
+        self.removed_bytes += removed_bytes
+        logger.debug(f"Janitor removed {len(due)} files ({removed_bytes} bytes)")
+
+    @staticmethod
+    def _remove(paths: List[str]) -> int:
+        removed_bytes = 0
+        for path in paths:
+            try:
+                removed_bytes += os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Already removed, e.g. by the job manager
+            except OSError as e:
+                logger.error(f"Failed to remove {path}: {e}")
+        return removed_bytes
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Janitor sweep failed: {e}")
+
+    def get_stats(self) -> dict:
+        """Get tracked files and removal counts"""
+        return {
+            "files": self.tracked_files,
+            "bytes": self.tracked_bytes,
+            "ttl": self.ttl,
+            "quota_bytes": self.quota_bytes,
+            "sweeps": self.sweeps,
+            "removed": dict(self.removed),
+            "removed_bytes": self.removed_bytes,
+        }
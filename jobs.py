@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from inference import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    id: str
+    filename: str
+    status: str = "queued"  # queued, processing, done, failed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    result_path: Optional[Path] = None
+    result_size: Optional[int] = None
+    upload_path: Optional[Path] = None
+    params: dict = field(default_factory=dict)
+    result_suffix: str = ".png"
+
+    def to_dict(self) -> dict:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "filename": self.filename,
+            "created_at": self.created_at,
+            **self.params,
+        }
+        if self.started_at is not None:
+            data["queue_time"] = round(self.started_at - self.created_at, 4)
+        if self.finished_at is not None and self.started_at is not None:
+            data["processing_time"] = round(self.finished_at - self.started_at, 4)
+        if self.error:
+            data["error"] = self.error
+        if self.result_size is not None:
+            data["result_size"] = self.result_size
+        return data
+
+
+class JobManager:
+    """In-process job queue that decouples request intake from inference
+
+    Uploads wait on disk in ``result_dir`` rather than in memory, a fixed
+    number of workers process them with ``process(content, **params)``, and
+    results are written next to them where the temp file janitor removes them
+    after ``ttl`` seconds. ``on_file(path, size)`` is called for each upload
+    and result file written. A job turned away by a full inference queue
+    waits ``retry_after`` and tries again instead of failing.
+    """
+
+    def __init__(
+        self,
+        result_dir: str,
+        process: Callable[..., Awaitable[bytes]],
+        workers: int = 2,
+        max_queue: int = 100,
+        ttl: float = 3600,
+        on_file: Optional[Callable[[Path, int], None]] = None
+    ):
+        self.result_dir = Path(result_dir)
+        self.process = process
+        self.workers = workers
+        self.max_queue = max_queue
+        self.ttl = ttl
+        self.on_file = on_file
+
+        self._jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Submissions still writing their upload, counted against max_queue
+        self._submitting = 0
+
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.retries = 0
+
+    async def start(self):
+        """Start the job workers"""
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the job workers"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(
+        self,
+        content: bytes,
+        filename: str,
+        params: Optional[dict] = None,
+        result_suffix: str = ".png"
+    ) -> Job:
+        """Queue an upload for processing with optional processing parameters"""
+        if self._queue is None:
+            raise RuntimeError("Job workers not started")
+
+        self._expire()
+        queued = self._queue.qsize() + self._submitting
+        if queued >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(retry_after=max(1, queued // max(self.workers, 1)))
+
+        job = Job(
+            id=uuid.uuid4().hex,
+            filename=filename,
+            params=params or {},
+            result_suffix=result_suffix
+        )
+        upload_path = self.result_dir / f"job_{job.id}.upload"
+        self._submitting += 1
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, upload_path.write_bytes, content)
+        finally:
+            self._submitting -= 1
+        job.upload_path = upload_path
+        if self.on_file:
+            self.on_file(upload_path, len(content))
+
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job that has not expired"""
+        self._expire()
+        return self._jobs.get(job_id)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            job = self._jobs.pop(job_id)
+            if job.result_path:
+                job.result_path.unlink(missing_ok=True)
+
+    async def _worker(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            job = await self._queue.get()
+            job.status = "processing"
+            job.started_at = time.time()
+            try:
+                try:
+                    content = await loop.run_in_executor(None, job.upload_path.read_bytes)
+                except FileNotFoundError:
+                    raise ValueError("Upload expired before processing")
+                result_bytes = await self._process(job, content)
+                result_path = self.result_dir / f"job_{job.id}{job.result_suffix}"
+                await loop.run_in_executor(None, result_path.write_bytes, result_bytes)
+                job.result_path = result_path
+                job.result_size = len(result_bytes)
+                if self.on_file:
+                    self.on_file(result_path, len(result_bytes))
+                job.status = "done"
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except ValueError as e:
+                job.status = "failed"
+                job.error = str(e)
+                self.failed += 1
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {e}")
+                job.status = "failed"
+                job.error = "Failed to process image"
+                self.failed += 1
+            finally:
+                # Drop the upload as soon as it is no longer needed
+                job.upload_path.unlink(missing_ok=True)
+                job.upload_path = None
+                job.finished_at = time.time()
+
+    async def _process(self, job: Job, content: bytes) -> bytes:
+        while True:
+            try:
+                return await self.process(content, **job.params)
+            except QueueFullError as e:
+                # Queued work waits for an inference slot like batch items do
+                self.retries += 1
+                await asyncio.sleep(e.retry_after)
+
+    def get_stats(self) -> dict:
+        """Get job queue statistics"""
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "tracked": len(self._jobs),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "retries": self.retries,
+        }
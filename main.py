@@ -1,23 +1,39 @@
+import time
+IMPORT_START = time.perf_counter()
+
 from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Form, Response
 from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import os
 import asyncio
-from typing import Optional
+from typing import Awaitable, Callable, List, Optional
 import magic
 from PIL import Image
 import io
 import logging
 from pathlib import Path
+import base64
 import hashlib
-import time
-from urllib.parse import urlparse
-import aiohttp
+import json
+import struct
+import zipfile
+from collections import OrderedDict
 from contextlib import asynccontextmanager
 from datetime import datetime
 
+from animation import frame_count, is_animated, iter_frames, remove_animation_background
+from batch import BatchItem, ZipStream, is_zip_upload, iter_zip_items, unique_name
 from bg_remover import BackgroundRemover
+from encoders import OUTPUT_FORMATS, OutputFormat, encode_image, resolve_output
+from fetcher import ContentTooLargeError, URLFetcher
+from inference import DeadlineExceededError, QueueFullError
+from janitor import TempJanitor
+from jobs import JobManager
+from metrics import MetricsMiddleware, MetricsRegistry, process_rss_bytes
+from models import AVAILABLE_MODELS
+from cache import ResultCache
+from singleflight import SingleFlight
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,28 +41,268 @@ logger = logging.getLogger(__name__)
 
 # Configuration
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 10 * 1024 * 1024))  # 10MB
-ALLOWED_EXTENSIONS = os.getenv("ALLOWED_EXTENSIONS", "jpg,jpeg,png,webp").split(",")
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", 50_000_000))  # 50 megapixels
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAGIC_HEADER_BYTES = 2048
+ALLOWED_EXTENSIONS = os.getenv("ALLOWED_EXTENSIONS", "jpg,jpeg,png,webp,gif").split(",")
 TEMP_DIR = os.getenv("TEMP_DIR", "/tmp/clearcut")
+TEMP_FILE_TTL = int(os.getenv("TEMP_FILE_TTL", 3600))  # 1 hour
+TEMP_DIR_MAX_BYTES = int(os.getenv("TEMP_DIR_MAX_BYTES", 1024 * 1024 * 1024))  # 1GB, 0 disables
+TEMP_CLEANUP_INTERVAL = float(os.getenv("TEMP_CLEANUP_INTERVAL", 60))
+RESULT_CACHE_MEMORY_BYTES = int(os.getenv("RESULT_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))  # 64MB
+RESULT_CACHE_DISK_BYTES = int(os.getenv("RESULT_CACHE_DISK_BYTES", 512 * 1024 * 1024))  # 512MB, 0 disables
+DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "u2net")
+MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", 600))
+UPSAMPLE_MODE = os.getenv("UPSAMPLE_MODE", "guided")  # guided or lanczos
+REFINE_MODE = os.getenv("REFINE_MODE", "smooth")  # smooth, enhance or none
+MAX_PROCESSING_SIZE = int(os.getenv("MAX_PROCESSING_SIZE", 2048))
+LARGE_IMAGE_MODE = os.getenv("LARGE_IMAGE_MODE", "resize")  # resize or tiled
+TILE_SIZE = int(os.getenv("TILE_SIZE", 1024))
+TILE_MEMORY_MB = int(os.getenv("TILE_MEMORY_MB", 256))
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(TEMP_DIR, "models"))  # Empty disables
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "png")  # png, webp, webp-lossless or mask
+MASK_INDEX_BYTES = int(os.getenv("MASK_INDEX_BYTES", 32 * 1024 * 1024))  # 32MB, 0 disables
+MASK_REUSE_DISTANCE = int(os.getenv("MASK_REUSE_DISTANCE", 8))  # Of 256 hash bits
+ANIMATION_MAX_FRAMES = int(os.getenv("ANIMATION_MAX_FRAMES", 300))
+ANIMATION_REUSE_THRESHOLD = float(os.getenv("ANIMATION_REUSE_THRESHOLD", 0.01))  # 0 runs inference on every frame
+PREVIEW_SIZE = (800, 600)
+PREVIEW_OUTPUTS = ("json", "binary", "url")
+PREVIEW_URL_TTL = int(os.getenv("PREVIEW_URL_TTL", 300))  # 5 minutes
+INFERENCE_CONCURRENCY = int(os.getenv("INFERENCE_CONCURRENCY", 2))
+# Batches hold at most INFERENCE_CONCURRENCY images; 1 disables micro-batching
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", INFERENCE_CONCURRENCY))
+INFERENCE_BATCH_WAIT_MS = float(os.getenv("INFERENCE_BATCH_WAIT_MS", 5))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", 8))
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "thread")  # thread or process
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 0))  # 0 sizes from available CPUs
+INFERENCE_THREADS_PER_WORKER = int(os.getenv("INFERENCE_THREADS_PER_WORKER", 0))  # 0 sizes from available CPUs
+ORT_GRAPH_OPTIMIZATION = os.getenv("ORT_GRAPH_OPTIMIZATION", "all")  # disable, basic, extended or all
+ORT_EXECUTION_MODE = os.getenv("ORT_EXECUTION_MODE", "sequential")  # sequential or parallel
+INFERENCE_PRECISION = os.getenv("INFERENCE_PRECISION", "fp32")  # fp32 or int8
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", 0))  # 0 disables
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", 100))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", INFERENCE_CONCURRENCY))
+BATCH_RETRIES = 3
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", INFERENCE_CONCURRENCY))
+JOB_MAX_QUEUE = int(os.getenv("JOB_MAX_QUEUE", 100))
+URL_FETCH_LIMIT = int(os.getenv("URL_FETCH_LIMIT", 32))
+URL_FETCH_LIMIT_PER_HOST = int(os.getenv("URL_FETCH_LIMIT_PER_HOST", 4))
+URL_CACHE_BYTES = int(os.getenv("URL_CACHE_BYTES", 32 * 1024 * 1024))  # 32MB, 0 disables
+
+# Bump when a change to the processing pipeline or the cached value layout
+# changes, so cached results from earlier versions are not served
+PIPELINE_VERSION = 2
 
 # Global background remover instance
 bg_remover = None
 
+# Startup phase durations in seconds; the model loads and warms up in the
+# background so the server answers health checks meanwhile
+startup = {"ready": False, "error": None, "timings": {}}
+warmup_task: Optional[asyncio.Task] = None
+
+# Cache of encoded results keyed by input bytes + processing parameters
+result_cache = ResultCache(
+    memory_bytes=RESULT_CACHE_MEMORY_BYTES,
+    disk_dir=os.path.join(TEMP_DIR, "cache"),
+    disk_bytes=RESULT_CACHE_DISK_BYTES
+)
+
+# Identical requests in progress, keyed like the result cache, share one computation
+in_flight = SingleFlight()
+
+# Pooled client for image URLs, revalidating repeated downloads
+url_fetcher = URLFetcher(
+    max_size=MAX_FILE_SIZE,
+    limit=URL_FETCH_LIMIT,
+    limit_per_host=URL_FETCH_LIMIT_PER_HOST,
+    cache_bytes=URL_CACHE_BYTES
+)
+
+# Cached previews fetchable by URL: cache key -> (monotonic expiry, output format)
+preview_links: "OrderedDict[str, tuple[float, OutputFormat]]" = OrderedDict()
+
+# Prometheus metrics served on /metrics
+START_TIME = time.time()
+INSTRUMENTED_ENDPOINTS = ("/remove-bg", "/remove-bg/batch", "/remove-bg/frames", "/remove-bg-preview", "/jobs")
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    "clearcut_stage_duration_seconds",
+    "Time spent in each processing stage",
+    ("stage",)
+)
+request_seconds = metrics.histogram(
+    "clearcut_request_duration_seconds",
+    "Time from request start to the end of the response",
+    ("endpoint",)
+)
+requests_total = metrics.counter("clearcut_requests_total", "Requests by endpoint and status", ("endpoint", "status"))
+errors_total = metrics.counter("clearcut_request_errors_total", "Requests that failed with a 5xx status", ("endpoint",))
+bytes_in_total = metrics.counter("clearcut_request_bytes_total", "Request body bytes received", ("endpoint",))
+bytes_out_total = metrics.counter("clearcut_response_bytes_total", "Response body bytes sent", ("endpoint",))
+animation_frames_total = metrics.counter(
+    "clearcut_animation_frames_total",
+    "Animation frames by whether inference ran or the last mask was reused",
+    ("result",)
+)
+metrics.callback(
+    "clearcut_cache_lookups_total",
+    "Result cache lookups by outcome",
+    lambda: {
+        ("memory_hit",): result_cache.memory_hits,
+        ("disk_hit",): result_cache.disk_hits,
+        ("miss",): result_cache.misses,
+    },
+    metric_type="counter",
+    labelnames=("result",)
+)
+metrics.callback(
+    "clearcut_coalesced_requests_total",
+    "Requests that waited on an identical request already in progress",
+    lambda: in_flight.coalesced,
+    metric_type="counter"
+)
+metrics.callback(
+    "clearcut_inference_queue_depth",
+    "Requests waiting for an inference slot",
+    lambda: bg_remover.executor.queued if bg_remover else None
+)
+metrics.callback(
+    "clearcut_inference_running",
+    "Requests holding an inference slot",
+    lambda: bg_remover.executor.running if bg_remover else None
+)
+metrics.callback(
+    "clearcut_temp_files_removed_total",
+    "Temp files removed by the janitor, by reason",
+    lambda: {(reason,): count for reason, count in janitor.removed.items()},
+    metric_type="counter",
+    labelnames=("reason",)
+)
+metrics.callback("clearcut_temp_removed_bytes_total", "Bytes freed by the temp file janitor", lambda: janitor.removed_bytes, metric_type="counter")
+metrics.callback("clearcut_temp_files", "Files tracked in TEMP_DIR", lambda: janitor.tracked_files)
+metrics.callback("clearcut_temp_bytes", "Bytes tracked in TEMP_DIR", lambda: janitor.tracked_bytes)
+metrics.callback(
+    "clearcut_mask_index_lookups_total",
+    "Perceptual-hash mask index lookups by outcome",
+    lambda: {("hit",): bg_remover.mask_index.hits, ("miss",): bg_remover.mask_index.misses}
+    if bg_remover and bg_remover.mask_index else None,
+    metric_type="counter",
+    labelnames=("result",)
+)
+metrics.callback("clearcut_jobs_queued", "Asynchronous jobs waiting for a worker", lambda: job_manager.get_stats()["queued"])
+metrics.callback("clearcut_process_resident_memory_bytes", "Resident set size of the API process", process_rss_bytes)
+metrics.callback("clearcut_uptime_seconds", "Seconds since the process started", lambda: time.time() - START_TIME)
+metrics.callback("clearcut_ready", "1 once the model is loaded and warmed up", lambda: int(startup["ready"]))
+metrics.callback(
+    "clearcut_startup_seconds",
+    "Time spent in each startup phase",
+    lambda: {(phase,): duration for phase, duration in startup["timings"].items()} or None,
+    labelnames=("phase",)
+)
+
+async def _process_job(
+    content: bytes,
+    model: Optional[str] = None,
+    format: str = OUTPUT_FORMAT,
+    quality: Optional[int] = None
+) -> bytes:
+    fmt, quality = resolve_output(format, quality)
+    timings = {}
+    result_bytes, _ = await process_image(content, timings, model=model, fmt=fmt, quality=quality)
+    record_stage_metrics(timings)
+    return result_bytes
+
+# Removes files in TEMP_DIR after TEMP_FILE_TTL or when over TEMP_DIR_MAX_BYTES
+janitor = TempJanitor(
+    directory=TEMP_DIR,
+    ttl=TEMP_FILE_TTL,
+    quota_bytes=TEMP_DIR_MAX_BYTES,
+    interval=TEMP_CLEANUP_INTERVAL
+)
+
+# Asynchronous jobs, with results stored in TEMP_DIR until cleanup
+job_manager = JobManager(
+    result_dir=TEMP_DIR,
+    process=_process_job,
+    workers=JOB_WORKERS,
+    max_queue=JOB_MAX_QUEUE,
+    ttl=TEMP_FILE_TTL,
+    on_file=janitor.track
+)
+
+async def load_model():
+    """Load and warm up the model, then mark the service ready"""
+    try:
+        phase_start = time.perf_counter()
+        await bg_remover.initialize()
+        startup["timings"]["model_load"] = time.perf_counter() - phase_start
+
+        if WARMUP_ON_STARTUP:
+            phase_start = time.perf_counter()
+            await bg_remover.warmup()
+            startup["timings"]["warmup"] = time.perf_counter() - phase_start
+
+        startup["timings"]["total"] = time.perf_counter() - IMPORT_START
+        startup["ready"] = True
+        phases = ", ".join(f"{phase} {duration:.2f}s" for phase, duration in startup["timings"].items())
+        logger.info(f"ClearCut is ready ({phases})")
+    except Exception as e:
+        startup["error"] = str(e)
+        logger.error(f"Startup failed: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global bg_remover
+    global bg_remover, warmup_task
     # Startup
+    startup["timings"]["import"] = time.perf_counter() - IMPORT_START
     logger.info("Initializing ClearCut Background Remover...")
-    bg_remover = BackgroundRemover()
-    await bg_remover.initialize()
+    bg_remover = BackgroundRemover(
+        batch_size=INFERENCE_BATCH_SIZE,
+        batch_wait_ms=INFERENCE_BATCH_WAIT_MS,
+        concurrency=INFERENCE_CONCURRENCY,
+        max_queue_depth=INFERENCE_MAX_QUEUE,
+        inference_mode=INFERENCE_MODE,
+        workers=INFERENCE_WORKERS,
+        threads_per_worker=INFERENCE_THREADS_PER_WORKER,
+        model_name=DEFAULT_MODEL,
+        model_memory_budget_mb=MODEL_MEMORY_BUDGET_MB,
+        upsample_mode=UPSAMPLE_MODE,
+        refine_mode=REFINE_MODE,
+        max_processing_size=MAX_PROCESSING_SIZE,
+        large_image_mode=LARGE_IMAGE_MODE,
+        tile_size=TILE_SIZE,
+        tile_memory_mb=TILE_MEMORY_MB,
+        model_cache_dir=MODEL_CACHE_DIR or None,
+        graph_optimization=ORT_GRAPH_OPTIMIZATION,
+        execution_mode=ORT_EXECUTION_MODE,
+        precision=INFERENCE_PRECISION,
+        mask_index_bytes=MASK_INDEX_BYTES,
+        mask_reuse_distance=MASK_REUSE_DISTANCE
+    )
 
     # Ensure temp directory exists
     Path(TEMP_DIR).mkdir(parents=True, exist_ok=True)
+    await result_cache.initialize()
+    await janitor.start()
+    await url_fetcher.start()
+    await job_manager.start()
 
-    logger.info("ClearCut is ready!")
+    warmup_task = asyncio.create_task(load_model())
     yield
 
     # Shutdown
     logger.info("Shutting down ClearCut...")
+    if not warmup_task.done():
+        warmup_task.cancel()
+        try:
+            await warmup_task
+        except asyncio.CancelledError:
+            pass
+    await job_manager.stop()
+    await janitor.stop()
+    await url_fetcher.stop()
     if bg_remover:
         await bg_remover.cleanup()
 
@@ -57,75 +313,335 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+app.add_middleware(
+    MetricsMiddleware,
+    requests=requests_total,
+    errors=errors_total,
+    bytes_in=bytes_in_total,
+    bytes_out=bytes_out_total,
+    duration=request_seconds,
+    endpoints=INSTRUMENTED_ENDPOINTS
+)
+
 # Templates
 templates = Jinja2Templates(directory="templates")
 
 # Static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-def validate_image_file(file_content: bytes, filename: str) -> bool:
-    """Validate if file is a valid image"""
+class ImageTooLargeError(ValueError):
+    """Upload exceeds the file size or pixel count limit"""
+
+def open_image(file_content: bytes, filename: str) -> Image.Image:
+    """Validate an image from its header and open it without decoding the pixels"""
+    # Check file size
+    if len(file_content) > MAX_FILE_SIZE:
+        raise ImageTooLargeError(f"File too large (max {MAX_FILE_SIZE} bytes)")
+
+    # Check extension
+    ext = filename.lower().split('.')[-1]
+    if ext not in ALLOWED_EXTENSIONS:
+        raise ValueError("Invalid image file")
+
+    # Check magic bytes; libmagic only needs the header
+    mime = magic.from_buffer(file_content[:MAGIC_HEADER_BYTES], mime=True)
+    if not mime.startswith('image/'):
+        raise ValueError("Invalid image file")
+
+    # Pillow parses format and dimensions here and defers decoding until load()
     try:
-        # Check file size
-        if len(file_content) > MAX_FILE_SIZE:
-            return False
-
-        # Check extension
-        ext = filename.lower().split('.')[-1]
-        if ext not in ALLOWED_EXTENSIONS:
-            return False
-
-        # Check magic bytes
-        mime = magic.from_buffer(file_content, mime=True)
-        if not mime.startswith('image/'):
-            return False
-
-        # Try to open with PIL
-        Image.open(io.BytesIO(file_content))
-        return True
+        image = Image.open(io.BytesIO(file_content))
+    except Image.DecompressionBombError:
+        raise ImageTooLargeError(f"Image too large (max {MAX_IMAGE_PIXELS} pixels)")
     except Exception:
-        return False
+        raise ValueError("Invalid image file")
+
+    # Reject decompression bombs before any pixel memory is allocated
+    if image.width * image.height > MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(
+            f"Image too large ({image.width}x{image.height}, max {MAX_IMAGE_PIXELS} pixels)"
+        )
+    return image
+
+async def read_upload(file: UploadFile) -> bytes:
+    """Read an upload in chunks, failing with 413 as soon as it exceeds MAX_FILE_SIZE"""
+    too_large = HTTPException(status_code=413, detail=f"File too large (max {MAX_FILE_SIZE} bytes)")
+    if file.size is not None and file.size > MAX_FILE_SIZE:
+        raise too_large
+
+    chunks = []
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > MAX_FILE_SIZE:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
 
 async def download_image_from_url(url: str) -> tuple[bytes, str]:
     """Download image from URL"""
     try:
-        parsed = urlparse(url)
-        if not parsed.scheme or not parsed.netloc:
-            raise ValueError("Invalid URL")
+        return await url_fetcher.fetch(url)
+    except ContentTooLargeError as e:
+        raise ImageTooLargeError(str(e))
+    except Exception as e:
+        raise ValueError(f"Failed to download image: {str(e)}")
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                if response.status != 200:
-                    raise ValueError(f"Failed to download: HTTP {response.status}")
+def pipeline_config() -> tuple:
+    """Server settings that change the output for the same request"""
+    return (
+        PIPELINE_VERSION, REFINE_MODE, UPSAMPLE_MODE, LARGE_IMAGE_MODE,
+        MAX_PROCESSING_SIZE, TILE_SIZE, INFERENCE_PRECISION,
+    )
 
-                content = await response.read()
+def generate_cache_key(content: bytes, *params) -> str:
+    """Generate cache key from file content, processing parameters and the pipeline config"""
+    hasher = hashlib.sha256(content)
+    for param in pipeline_config() + params:
+        hasher.update(b"\0" + str(param).encode())
+    return hasher.hexdigest()[:32]
 
-                # Get filename from URL or use default
-                filename = parsed.path.split('/')[-1] or 'image.jpg'
-                if '.' not in filename:
-                    filename += '.jpg'
+def require_ready():
+    """Reject processing requests until the model is loaded and warmed up"""
+    if warmup_task is None or startup["ready"]:
+        return
+    if startup["error"]:
+        raise HTTPException(status_code=503, detail="Service failed to start")
+    raise HTTPException(status_code=503, detail="Service is starting", headers={"Retry-After": "5"})
 
-                return content, filename
-    except Exception as e:
-        raise ValueError(f"Failed to download image: {str(e)}")
+def get_request_deadline(request: Request) -> Optional[float]:
+    """Get the monotonic deadline for a request from X-Request-Timeout or the default"""
+    timeout = REQUEST_DEADLINE_SECONDS
+    header = request.headers.get("X-Request-Timeout")
+    if header:
+        try:
+            timeout = float(header)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid X-Request-Timeout header")
+    return time.monotonic() + timeout if timeout > 0 else None
+
+def format_server_timing(timings: dict) -> str:
+    """Format per-stage durations in seconds as a Server-Timing header value"""
+    return ", ".join(f"{stage};dur={duration * 1000:.1f}" for stage, duration in timings.items())
+
+def record_stage_metrics(timings: dict):
+    """Add per-stage durations in seconds to the stage histograms"""
+    for stage, duration in timings.items():
+        stage_seconds.observe(duration, stage=stage)
+
+async def read_image_input(
+    file: Optional[UploadFile],
+    url: Optional[str],
+    timings: Optional[dict] = None
+) -> tuple[bytes, str, Image.Image]:
+    """Read and validate an uploaded file or image URL
+
+    Returns the raw bytes, the filename and the opened, not yet decoded image.
+    """
+    if timings is None:
+        timings = {}
+    stage_start = time.perf_counter()
 
-def generate_cache_key(content: bytes) -> str:
-    """Generate cache key from file content"""
-    return hashlib.md5(content).hexdigest()[:16]
+    # Get image content
+    if file:
+        if not file.filename:
+            raise HTTPException(status_code=400, detail="No filename provided")
 
-async def cleanup_temp_files():
-    """Cleanup old temp files"""
+        content = await read_upload(file)
+        filename = file.filename
+    elif url:
+        try:
+            content, filename = await download_image_from_url(url)
+        except ImageTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+    else:
+        raise HTTPException(status_code=400, detail="No image provided: upload a file or pass a URL")
+    timings["read"] = time.perf_counter() - stage_start
+    stage_start = time.perf_counter()
+
+    # Validate image
     try:
-        temp_path = Path(TEMP_DIR)
-        current_time = time.time()
-
-        for file_path in temp_path.glob("*"):
-            if file_path.is_file():
-                # Remove files older than 1 hour
-                if current_time - file_path.stat().st_mtime > 3600:
-                    file_path.unlink()
-    except Exception as e:
-        logger.error(f"Cleanup error: {e}")
+        image = open_image(content, filename)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    timings["validate"] = time.perf_counter() - stage_start
+
+    return content, filename, image
+
+def resolve_model(model: Optional[str]) -> str:
+    """Resolve the requested model name, defaulting to the server's model"""
+    model = model or bg_remover.model_name
+    if model not in AVAILABLE_MODELS:
+        raise ValueError(f"Unknown model '{model}'. Available: {', '.join(AVAILABLE_MODELS)}")
+    return model
+
+def resolve_output_format(output_format: Optional[str], quality: Optional[int]) -> tuple[OutputFormat, int]:
+    """Resolve the requested output format and quality, defaulting to the server's format"""
+    return resolve_output(output_format, quality, default_format=OUTPUT_FORMAT)
+
+def result_filename(filename: str, fmt: OutputFormat) -> str:
+    return f"clearcut_{Path(filename).stem}.{fmt.extension}"
+
+# Cached results start with the hash distance of the reused mask they were
+# made with, or NO_MASK_MATCH, so cache hits report it too
+CACHED_RESULT_HEADER = struct.Struct(">H")
+NO_MASK_MATCH = 0xFFFF
+
+def pack_cached_result(result_bytes: bytes, mask_match: dict) -> bytes:
+    return CACHED_RESULT_HEADER.pack(mask_match.get("distance", NO_MASK_MATCH)) + result_bytes
+
+def unpack_cached_result(data: bytes) -> tuple[bytes, dict]:
+    (distance,) = CACHED_RESULT_HEADER.unpack_from(data)
+    mask_match = {} if distance == NO_MASK_MATCH else {"distance": distance}
+    return data[CACHED_RESULT_HEADER.size:], mask_match
+
+async def get_cached_result(cache_key: str) -> Optional[tuple[bytes, dict]]:
+    """Look up a cached result with the ``mask_match`` it was produced with"""
+    data = await result_cache.get(cache_key)
+    return None if data is None else unpack_cached_result(data)
+
+async def put_cached_result(cache_key: str, result_bytes: bytes, mask_match: dict):
+    """Cache a result together with its ``mask_match``"""
+    await result_cache.put(cache_key, pack_cached_result(result_bytes, mask_match))
+
+async def run_coalesced(cache_key: str, compute: Callable[[], Awaitable], deadline: Optional[float]) -> tuple:
+    """Run ``compute`` or join the identical computation in progress, returning its result and whether it was shared
+
+    The shared work runs under the deadline of the request that started it and
+    is not cancelled while anyone still waits for it. When that deadline ends
+    it, a waiter with time left runs it again under its own deadline instead
+    of failing too.
+    """
+    while True:
+        try:
+            return await in_flight.run(cache_key, compute)
+        except DeadlineExceededError:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise
+
+async def process_image(
+    content: bytes,
+    timings: dict,
+    deadline: Optional[float] = None,
+    model: Optional[str] = None,
+    fmt: Optional[OutputFormat] = None,
+    quality: Optional[int] = None,
+    image: Optional[Image.Image] = None,
+    exact: bool = False,
+    mask_match: Optional[dict] = None
+) -> tuple[bytes, str]:
+    """Remove background and encode the result, reusing a cached result for repeated uploads
+
+    ``image`` is ``content`` already opened by ``open_image``, so it is only decoded once.
+    Animated images are processed frame by frame into an animation. ``exact``
+    always runs inference rather than reusing the mask of a near-duplicate
+    image; when one is reused, ``mask_match`` gets its hash distance.
+    A request identical to one already in progress waits for its result
+    instead of processing the image again (see ``run_coalesced``).
+    """
+    model = resolve_model(model)
+    if fmt is None:
+        fmt, quality = resolve_output_format(None, quality)
+    cache_key = generate_cache_key(content, "remove-bg", model, fmt.name, quality, exact)
+    cached = await get_cached_result(cache_key)
+    if cached is not None:
+        result_bytes, match = cached
+        if mask_match is not None:
+            mask_match.update(match)
+        return result_bytes, "HIT"
+
+    async def compute():
+        match = {}
+        result_bytes = await render_result(content, timings, deadline, model, fmt, quality, image, exact, match)
+        await put_cached_result(cache_key, result_bytes, match)
+        return result_bytes, match
+
+    wait_start = time.perf_counter()
+    (result_bytes, match), shared = await run_coalesced(cache_key, compute, deadline)
+    if mask_match is not None:
+        mask_match.update(match)
+    if shared:
+        timings["coalesced"] = time.perf_counter() - wait_start
+        return result_bytes, "COALESCED"
+    return result_bytes, "MISS"
+
+async def render_result(
+    content: bytes,
+    timings: dict,
+    deadline: Optional[float],
+    model: str,
+    fmt: OutputFormat,
+    quality: int,
+    image: Optional[Image.Image],
+    exact: bool,
+    mask_match: dict
+) -> bytes:
+    """Remove background and encode the result, bypassing the cache"""
+    if image is None:
+        image = Image.open(io.BytesIO(content))
+    if is_animated(image):
+        return await process_animation(
+            iter_frames(image), frame_count(image), timings, deadline, model, fmt, quality, image.info.get("loop", 0)
+        )
+
+    result_image = await bg_remover.remove_background(
+        image,
+        timings=timings,
+        deadline=deadline,
+        model=model,
+        reuse_masks=not exact,
+        mask_match=mask_match
+    )
+
+    # Encode off the event loop; this can rival inference on large images
+    encode_start = time.perf_counter()
+    loop = asyncio.get_event_loop()
+    result_bytes = await loop.run_in_executor(None, encode_image, result_image, fmt, quality)
+    timings["encode"] = time.perf_counter() - encode_start
+    return result_bytes
+
+async def process_animation(
+    frames,
+    count: int,
+    timings: dict,
+    deadline: Optional[float],
+    model: str,
+    fmt: OutputFormat,
+    quality: int,
+    loop: int = 0
+) -> bytes:
+    """Remove background from each frame of an animation, streaming them into the encoder
+
+    Animations come back as APNG for png and mask output and animated WebP otherwise.
+    """
+    if count > ANIMATION_MAX_FRAMES:
+        raise ValueError(f"Too many frames ({count}, max {ANIMATION_MAX_FRAMES})")
+
+    result_bytes, stats = await remove_animation_background(
+        bg_remover, frames, fmt, quality, timings, deadline, model, ANIMATION_REUSE_THRESHOLD, loop
+    )
+    animation_frames_total.inc(stats["inferred"], result="inferred")
+    animation_frames_total.inc(stats["reused"], result="reused")
+    logger.info(f"Processed {stats['frames']} frames, {stats['reused']} reusing the previous mask")
+    return result_bytes
+
+def iter_sequence_frames(items: List[BatchItem], duration: float):
+    """Read, validate and decode frame sequence images one at a time, sized like the first"""
+    size = None
+    for item in items:
+        if item.error:
+            raise ValueError(f"{item.name}: {item.error}")
+        try:
+            frame = open_image(item.read(), item.name).convert("RGB")
+        except ValueError as e:
+            raise type(e)(f"{item.name}: {e}")
+        if size is None:
+            size = frame.size
+        elif frame.size != size:
+            frame = frame.resize(size, Image.Resampling.LANCZOS)
+        yield frame, duration
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
@@ -133,130 +649,526 @@ async def index(request: Request):
 
 @app.get("/health")
 async def health_check():
+    """Liveness: the process serves requests, even while the model is still loading"""
+    if startup["error"]:
+        return JSONResponse(status_code=503, content={"status": "unhealthy", "service": "ClearCut", "error": startup["error"]})
     return {"status": "healthy", "service": "ClearCut"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: the model is loaded and warmed up, with startup phase durations"""
+    timings = {phase: round(duration, 3) for phase, duration in startup["timings"].items()}
+    if startup["ready"]:
+        return {"status": "ready", "startup": timings}
+    status = "failed" if startup["error"] else "starting"
+    return JSONResponse(status_code=503, content={"status": status, "startup": timings, "error": startup["error"]})
+
 @app.post("/remove-bg")
 async def remove_background(
     request: Request,
     file: Optional[UploadFile] = File(None),
-    url: Optional[str] = Form(None)
+    url: Optional[str] = Form(None),
+    model: Optional[str] = Form(None),
+    output_format: Optional[str] = Form(None, alias="format"),
+    quality: Optional[int] = Form(None),
+    exact: bool = Form(False)
 ):
-    """Remove background from uploaded file or URL"""
-    try:
-        # Cleanup old files
-        asyncio.create_task(cleanup_temp_files())
-
-        # Get image content
-        if file:
-            if not file.filename:
-                raise HTTPException(status_code=400, detail="No filename provided")
+    """Remove background from uploaded file or URL
 
-            content = await file.read()
-            filename = file.filename
-        elif url:
-            content, filename = await download_image_from_url(url)
-        else:
-            raise HTTPException(status_code=400, detail="No file or URL provided")
+    ``exact`` always runs inference instead of reusing the mask of a near-duplicate image.
+    """
+    require_ready()
+    try:
+        deadline = get_request_deadline(request)
+        fmt, quality = resolve_output_format(output_format, quality)
 
-        # Validate image
-        if not validate_image_file(content, filename):
-            raise HTTPException(status_code=400, detail="Invalid image file")
+        timings = {}
+        content, filename, image = await read_image_input(file, url, timings)
 
         # Process image
         start_time = time.time()
-        result_image = await bg_remover.remove_background(content)
+        mask_match = {}
+        result_bytes, cache_status = await process_image(
+            content, timings, deadline, model, fmt, quality, image, exact, mask_match
+        )
         processing_time = time.time() - start_time
+        record_stage_metrics(timings)
 
-        # Convert to bytes
-        img_byte_arr = io.BytesIO()
-        result_image.save(img_byte_arr, format='PNG', optimize=True)
-        result_bytes = img_byte_arr.getvalue()
+        logger.info(f"Processed {filename} in {processing_time:.2f}s (cache {cache_status.lower()})")
+        logger.debug(f"Stage timings for {filename}: {format_server_timing(timings)}")
 
-        logger.info(f"Processed {filename} in {processing_time:.2f}s")
+        headers = {
+            "Content-Disposition": f"attachment; filename={result_filename(filename, fmt)}",
+            "X-Processing-Time": str(processing_time),
+            "X-Encoding-Time": str(timings.get("encode", 0.0)),
+            "X-Cache": cache_status,
+            "Server-Timing": format_server_timing(timings),
+            "Cache-Control": "no-cache, no-store, must-revalidate"
+        }
+        if "distance" in mask_match:
+            headers["X-Mask-Match-Distance"] = str(mask_match["distance"])
 
         # Return image
+        return StreamingResponse(io.BytesIO(result_bytes), media_type=fmt.media_type, headers=headers)
+
+    except HTTPException:
+        raise
+    except (QueueFullError, DeadlineExceededError) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Processing error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to process image")
+
+@app.post("/remove-bg/frames")
+async def remove_background_frames(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    fps: float = Form(10),
+    model: Optional[str] = Form(None),
+    output_format: Optional[str] = Form(None, alias="format"),
+    quality: Optional[int] = Form(None)
+):
+    """Remove background from a frame sequence and return it as one animation
+
+    Frames are the uploaded files in order, or the images of a ZIP archive sorted by name.
+    """
+    require_ready()
+    try:
+        deadline = get_request_deadline(request)
+        model = resolve_model(model)
+        fmt, quality = resolve_output_format(output_format, quality)
+        if not 0 < fps <= 100:
+            raise ValueError("fps must be between 0 and 100")
+
+        items: List[BatchItem] = []
+        for upload in files:
+            filename = upload.filename or "frame"
+            if is_zip_upload(filename, upload.content_type):
+                try:
+                    items.extend(sorted(iter_zip_items(upload.file, MAX_FILE_SIZE), key=lambda item: item.name))
+                except zipfile.BadZipFile:
+                    raise ValueError(f"{filename}: Invalid ZIP archive")
+            else:
+                items.append(BatchItem(name=filename, read=_upload_reader(upload)))
+        if not items:
+            raise ValueError("No frames provided")
+
+        timings = {}
+        start_time = time.time()
+        result_bytes = await process_animation(
+            iter_sequence_frames(items, 1000 / fps), len(items), timings, deadline, model, fmt, quality
+        )
+        processing_time = time.time() - start_time
+        record_stage_metrics(timings)
+
         return StreamingResponse(
             io.BytesIO(result_bytes),
-            media_type="image/png",
+            media_type=fmt.media_type,
             headers={
-                "Content-Disposition": f"attachment; filename=clearcut_{filename.split('.')[0]}.png",
+                "Content-Disposition": f"attachment; filename=clearcut_frames.{fmt.extension}",
                 "X-Processing-Time": str(processing_time),
+                "Server-Timing": format_server_timing(timings),
                 "Cache-Control": "no-cache, no-store, must-revalidate"
             }
         )
 
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (QueueFullError, DeadlineExceededError) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Processing error: {e}")
-        raise HTTPException(status_code=500, detail="Failed to process image")
+        logger.error(f"Frame sequence error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to process frames")
+
+@app.post("/remove-bg/batch")
+async def remove_background_batch(
+    files: List[UploadFile] = File(...),
+    model: Optional[str] = Form(None),
+    output_format: Optional[str] = Form(None, alias="format"),
+    quality: Optional[int] = Form(None)
+):
+    """Remove background from many files or ZIP archives, streaming a ZIP of results"""
+    require_ready()
+    try:
+        model = resolve_model(model)
+        fmt, quality = resolve_output_format(output_format, quality)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    items: List[BatchItem] = []
+    for upload in files:
+        filename = upload.filename or "image"
+        if is_zip_upload(filename, upload.content_type):
+            try:
+                items.extend(iter_zip_items(upload.file, MAX_FILE_SIZE))
+            except zipfile.BadZipFile:
+                items.append(BatchItem(name=filename, error="Invalid ZIP archive"))
+        else:
+            items.append(BatchItem(name=filename, read=_upload_reader(upload)))
+
+    if not items:
+        raise HTTPException(status_code=400, detail="No files provided")
+    if len(items) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files (max {BATCH_MAX_FILES})")
+
+    return StreamingResponse(
+        _stream_batch(items, model, fmt, quality),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": "attachment; filename=clearcut_batch.zip",
+            "Cache-Control": "no-cache, no-store, must-revalidate"
+        }
+    )
+
+def _upload_reader(upload: UploadFile):
+    def read() -> bytes:
+        upload.file.seek(0)
+        return upload.file.read(MAX_FILE_SIZE + 1)
+    return read
+
+async def _process_batch_item(
+    item: BatchItem,
+    model: str,
+    fmt: OutputFormat,
+    quality: int
+) -> tuple[dict, Optional[bytes]]:
+    entry = {"file": item.name, "status": "error"}
+    if item.error:
+        entry["error"] = item.error
+        return entry, None
+
+    start_time = time.time()
+    try:
+        timings = {}
+        # ZIP members are decompressed and spooled uploads read here, so keep it off the event loop
+        loop = asyncio.get_event_loop()
+        stage_start = time.perf_counter()
+        content = await loop.run_in_executor(None, item.read)
+        timings["read"] = time.perf_counter() - stage_start
+        stage_start = time.perf_counter()
+        image = await loop.run_in_executor(None, open_image, content, item.name)
+        timings["validate"] = time.perf_counter() - stage_start
+
+        for attempt in range(BATCH_RETRIES + 1):
+            try:
+                result_bytes, cache_status = await process_image(
+                    content, timings, model=model, fmt=fmt, quality=quality, image=image
+                )
+                break
+            except QueueFullError as e:
+                # Let interactive traffic through before retrying
+                if attempt == BATCH_RETRIES:
+                    raise
+                await asyncio.sleep(e.retry_after)
+        record_stage_metrics(timings)
+
+        entry.update({
+            "status": "ok",
+            "cache": cache_status,
+            "original_size": len(content),
+            "result_size": len(result_bytes),
+            "timings": {stage: round(duration, 4) for stage, duration in timings.items()}
+        })
+        return entry, result_bytes
+    except (ValueError, QueueFullError) as e:
+        entry["error"] = str(e)
+        return entry, None
+    except Exception as e:
+        logger.error(f"Batch item error: {e}")
+        entry["error"] = "Failed to process image"
+        return entry, None
+    finally:
+        entry["processing_time"] = round(time.time() - start_time, 4)
+
+async def _stream_batch(items: List[BatchItem], model: str, fmt: OutputFormat, quality: int):
+    """Yield ZIP bytes as each item finishes, ending with a manifest"""
+    stream = ZipStream()
+    archive = zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_STORED)
+    # A small results queue keeps workers from racing ahead of a slow client
+    results = asyncio.Queue(maxsize=BATCH_CONCURRENCY)
+    pending = iter(items)
+
+    async def worker():
+        for item in pending:
+            await results.put(await _process_batch_item(item, model, fmt, quality))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(BATCH_CONCURRENCY, len(items)))]
+    manifest = []
+    used_names = set()
+    start_time = time.time()
+
+    try:
+        for _ in range(len(items)):
+            entry, result_bytes = await results.get()
+            if result_bytes is not None:
+                entry["output"] = unique_name(result_filename(entry["file"], fmt), used_names)
+                # Encoded images are already compressed, so entries are stored as-is
+                archive.writestr(entry["output"], result_bytes)
+                yield stream.drain()
+            manifest.append(entry)
+
+        archive.writestr("manifest.json", json.dumps({
+            "model": model,
+            "format": fmt.name,
+            "quality": quality,
+            "total": len(manifest),
+            "succeeded": sum(1 for entry in manifest if entry["status"] == "ok"),
+            "processing_time": round(time.time() - start_time, 4),
+            "items": manifest
+        }, indent=2))
+        archive.close()
+        yield stream.drain()
+    finally:
+        for task in workers:
+            task.cancel()
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    file: Optional[UploadFile] = File(None),
+    url: Optional[str] = Form(None),
+    model: Optional[str] = Form(None),
+    output_format: Optional[str] = Form(None, alias="format"),
+    quality: Optional[int] = Form(None)
+):
+    """Queue background removal and return a job id immediately"""
+    require_ready()
+    try:
+        model = resolve_model(model)
+        fmt, quality = resolve_output_format(output_format, quality)
+        content, filename, _ = await read_image_input(file, url)
+        job = await job_manager.submit(
+            content,
+            filename,
+            {"model": model, "format": fmt.name, "quality": quality},
+            result_suffix=f".{fmt.extension}"
+        )
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail="Job queue is full", headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        **job.to_dict(),
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/jobs/{job.id}/result"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get job status"""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Download a finished job's result"""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "failed":
+        raise HTTPException(status_code=422, detail=job.error)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}", headers={"Retry-After": "1"})
+    if not job.result_path.exists():
+        raise HTTPException(status_code=410, detail="Job result expired")
+
+    fmt = OUTPUT_FORMATS[job.params.get("format", "png")]
+    return FileResponse(
+        job.result_path,
+        media_type=fmt.media_type,
+        filename=result_filename(job.filename, fmt),
+        headers={"Cache-Control": "no-cache, no-store, must-revalidate"}
+    )
 
 @app.post("/remove-bg-preview")
 async def remove_background_preview(
     request: Request,
     file: Optional[UploadFile] = File(None),
-    url: Optional[str] = Form(None)
+    url: Optional[str] = Form(None),
+    model: Optional[str] = Form(None),
+    output: str = Form("json"),
+    output_format: Optional[str] = Form(None, alias="format"),
+    quality: Optional[int] = Form(None),
+    exact: bool = Form(False)
 ):
-    """Remove background and return base64 preview"""
+    """Remove background at preview resolution
+
+    ``output`` selects the response: ``json`` (base64 data URL, the legacy
+    default), ``binary`` (the encoded image) or ``url`` (JSON with a
+    short-lived ``preview_url``). ``exact`` is as for ``/remove-bg``.
+    """
+    require_ready()
     try:
-        # Get image content (same as above)
-        if file:
-            if not file.filename:
-                raise HTTPException(status_code=400, detail="No filename provided")
-
-            content = await file.read()
-            filename = file.filename
-        elif url:
-            content, filename = await download_image_from_url(url)
-        else:
-            raise HTTPException(status_code=400, detail="No file or URL provided")
+        deadline = get_request_deadline(request)
+        if output not in PREVIEW_OUTPUTS:
+            raise ValueError(f"Unknown output '{output}'. Available: {', '.join(PREVIEW_OUTPUTS)}")
+        fmt, quality = resolve_output_format(output_format, quality)
 
-        # Validate image
-        if not validate_image_file(content, filename):
-            raise HTTPException(status_code=400, detail="Invalid image file")
+        timings = {}
+        content, filename, image = await read_image_input(file, url, timings)
 
-        # Process image
+        # Process image, reusing a cached preview for repeated uploads
         start_time = time.time()
-        result_image = await bg_remover.remove_background(content)
-        processing_time = time.time() - start_time
+        model = resolve_model(model)
+        cache_key = generate_cache_key(content, "remove-bg-preview", model, PREVIEW_SIZE, fmt.name, quality, exact)
+        cached = await get_cached_result(cache_key)
+        cache_hit = cached is not None
+        cache_status = "HIT" if cache_hit else "MISS"
+        preview_bytes, mask_match = cached if cache_hit else (None, {})
+
+        async def compute():
+            # Decode, infer and post-process at preview size instead of thumbnailing afterwards
+            match = {}
+            result_image = await bg_remover.remove_background(
+                image,
+                timings=timings,
+                deadline=deadline,
+                model=model,
+                fit_size=PREVIEW_SIZE,
+                reuse_masks=not exact,
+                mask_match=match
+            )
 
-        # Create thumbnail for preview
-        result_image.thumbnail((800, 600), Image.Resampling.LANCZOS)
+            encode_start = time.perf_counter()
+            loop = asyncio.get_event_loop()
+            preview_bytes = await loop.run_in_executor(None, encode_image, result_image, fmt, quality)
+            timings["encode"] = time.perf_counter() - encode_start
+            await put_cached_result(cache_key, preview_bytes, match)
+            return preview_bytes, match
 
-        # Convert to base64
-        img_byte_arr = io.BytesIO()
-        result_image.save(img_byte_arr, format='PNG', optimize=True)
-        img_byte_arr.seek(0)
+        if preview_bytes is None:
+            # Identical previews in progress share one computation
+            wait_start = time.perf_counter()
+            (preview_bytes, match), shared = await run_coalesced(cache_key, compute, deadline)
+            mask_match.update(match)
+            if shared:
+                timings["coalesced"] = time.perf_counter() - wait_start
+                cache_status = "COALESCED"
+
+        processing_time = time.time() - start_time
+        record_stage_metrics(timings)
+        headers = {
+            "X-Processing-Time": str(processing_time),
+            "X-Encoding-Time": str(timings.get("encode", 0.0)),
+            "X-Cache": cache_status,
+            "Server-Timing": format_server_timing(timings)
+        }
+        if "distance" in mask_match:
+            headers["X-Mask-Match-Distance"] = str(mask_match["distance"])
 
-        import base64
-        img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode()
+        if output == "binary":
+            return Response(
+                content=preview_bytes,
+                media_type=fmt.media_type,
+                headers={
+                    **headers,
+                    "X-Original-Size": str(len(content)),
+                    "Cache-Control": "no-cache, no-store, must-revalidate"
+                }
+            )
 
-        return JSONResponse({
+        body = {
             "success": True,
-            "preview": f"data:image/png;base64,{img_base64}",
             "processing_time": processing_time,
             "original_size": len(content),
-            "result_size": len(img_byte_arr.getvalue())
-        })
+            "result_size": len(preview_bytes),
+            "cached": cache_hit,
+            "timings": {stage: round(duration, 4) for stage, duration in timings.items()}
+        }
+        if output == "url":
+            body["preview_url"] = f"/previews/{issue_preview_link(cache_key, fmt)}"
+            body["expires_in"] = PREVIEW_URL_TTL
+        else:
+            img_base64 = base64.b64encode(preview_bytes).decode()
+            body["preview"] = f"data:{fmt.media_type};base64,{img_base64}"
+        return JSONResponse(body, headers=headers)
 
+    except HTTPException as e:
+        return JSONResponse({"success": False, "error": e.detail}, status_code=e.status_code)
+    except (QueueFullError, DeadlineExceededError) as e:
+        return JSONResponse(
+            {"success": False, "error": str(e)},
+            status_code=503,
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except ValueError as e:
         return JSONResponse({"success": False, "error": str(e)}, status_code=400)
     except Exception as e:
         logger.error(f"Preview error: {e}")
         return JSONResponse({"success": False, "error": "Failed to process image"}, status_code=500)
 
+def issue_preview_link(cache_key: str, fmt: OutputFormat) -> str:
+    """Make a cached preview fetchable for PREVIEW_URL_TTL seconds"""
+    now = time.monotonic()
+    # Links share one TTL, so the oldest are always at the front
+    while preview_links and next(iter(preview_links.values()))[0] <= now:
+        preview_links.popitem(last=False)
+
+    preview_links[cache_key] = (now + PREVIEW_URL_TTL, fmt)
+    preview_links.move_to_end(cache_key)
+    return cache_key
+
+@app.get("/previews/{token}")
+async def get_preview(token: str):
+    """Serve a preview issued by /remove-bg-preview with output=url"""
+    link = preview_links.get(token)
+    if not link or link[0] <= time.monotonic():
+        raise HTTPException(status_code=404, detail="Preview not found or expired")
+
+    expires_at, fmt = link
+    cached = await get_cached_result(token)
+    if cached is None:
+        raise HTTPException(status_code=410, detail="Preview expired")
+    preview_bytes, _ = cached
+
+    return Response(
+        content=preview_bytes,
+        media_type=fmt.media_type,
+        headers={"Cache-Control": f"private, max-age={int(expires_at - time.monotonic())}"}
+    )
+
 @app.get("/api/stats")
 async def get_stats():
     """Get service statistics"""
     return {
         "service": "ClearCut",
         "version": "1.0.0",
-        "model": "u2net",
+        "uptime": round(time.time() - START_TIME, 1),
+        "ready": startup["ready"],
+        "startup": {phase: round(duration, 3) for phase, duration in startup["timings"].items()},
+        "model": bg_remover.model_name if bg_remover else DEFAULT_MODEL,
+        "models": bg_remover.get_model_info()["available_models"] if bg_remover else list(AVAILABLE_MODELS),
+        "model_registry": bg_remover.registry.get_stats() if bg_remover and not bg_remover.worker_pool else None,
         "max_file_size": MAX_FILE_SIZE,
         "supported_formats": ALLOWED_EXTENSIONS,
-        "privacy": "No data stored - processed in memory only"
+        "output_formats": list(OUTPUT_FORMATS),
+        "default_output_format": OUTPUT_FORMAT,
+        "privacy": "Uploads processed in memory only - results cached temporarily",
+        "cache": result_cache.get_stats(),
+        "coalescing": in_flight.get_stats(),
+        "batching": bg_remover.get_model_info()["batching"] if bg_remover else None,
+        "runtime": bg_remover.get_model_info()["runtime"] if bg_remover else None,
+        "queue": bg_remover.executor.get_stats() if bg_remover else None,
+        "mask_index": bg_remover.mask_index.get_stats() if bg_remover and bg_remover.mask_index else None,
+        "workers": bg_remover.worker_pool.get_stats() if bg_remover and bg_remover.worker_pool else None,
+        "jobs": job_manager.get_stats(),
+        "temp_files": janitor.get_stats(),
+        "url_fetch": url_fetcher.get_stats()
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Serve metrics in the Prometheus text format"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/favicon.ico", include_in_schema=False)
 async def favicon():
     """Serve favicon"""
@@ -305,6 +1217,9 @@ Allow: /
 Disallow: /api/
 Disallow: /remove-bg
 Disallow: /remove-bg-preview
+Disallow: /previews/
+Disallow: /jobs
+Disallow: /metrics
 
 Sitemap: https://clearcut.hasanh.dev/sitemap.xml
 """
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# dHash thumbnail rows; hashes have HASH_SIZE * HASH_SIZE bits
+HASH_SIZE = 16
+# Relative aspect ratio difference still considered the same image
+ASPECT_TOLERANCE = 0.01
+
+
+def dhash(image: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash: whether each pixel of a small grayscale thumbnail is brighter than its right neighbour
+
+    Re-encoding, resizing and metadata changes leave it nearly unchanged.
+    """
+    # The last averaging step runs in float: rounding the thumbnail to 8 bits
+    # would let re-encoding noise flip the bits of flat regions
+    detail = image.resize(((hash_size + 1) * 8, hash_size * 8), Image.Resampling.BOX)
+    thumbnail = detail.convert("F").resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = np.asarray(thumbnail)
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big")
+
+
+def downscale_mask(mask: Image.Image, input_size: Tuple[int, int]) -> Image.Image:
+    """Shrink a mask for the index to fit the model's ``input_size``
+
+    The model never sees more detail than that, so the stored mask loses nothing.
+    """
+    small = mask.copy()
+    small.thumbnail(input_size, Image.Resampling.BOX)
+    return small
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class MaskIndex:
+    """Low-resolution masks of recent inputs, found again by perceptual hash
+
+    Entries are per model and evicted least-recently-used first once their
+    total size exceeds ``max_bytes``. A lookup returns the closest mask of an
+    image with the same aspect ratio whose hash is within ``max_distance``
+    bits.
+    """
+
+    def __init__(self, max_bytes: int, max_distance: int):
+        self.max_bytes = max_bytes
+        self.max_distance = max_distance
+
+        # (model, hash) -> (aspect ratio, mask)
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, Image.Image]]" = OrderedDict()
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, model: str, signature: int, size: Tuple[int, int]) -> Optional[Tuple[Image.Image, int]]:
+        """Find the closest stored mask for an image, with its Hamming distance"""
+        aspect = size[0] / size[1]
+        best_key, best_distance = None, self.max_distance + 1
+        for key, (entry_aspect, _) in self._entries.items():
+            if key[0] != model or abs(entry_aspect / aspect - 1) > ASPECT_TOLERANCE:
+                continue
+            distance = hamming_distance(key[1], signature)
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+
+        if best_key is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(best_key)
+        self.hits += 1
+        return self._entries[best_key][1], best_distance
+
+    def add(self, model: str, signature: int, size: Tuple[int, int], mask: Image.Image):
+        """Store the mask predicted for an image of ``size``, already passed through ``downscale_mask``"""
+        key = (model, signature)
+        if key in self._entries:
+            self._size -= self._mask_bytes(self._entries.pop(key)[1])
+
+        self._entries[key] = (size[0] / size[1], mask)
+        self._size += self._mask_bytes(mask)
+        while self._size > self.max_bytes and self._entries:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._size -= self._mask_bytes(evicted)
+
+    @staticmethod
+    def _mask_bytes(mask: Image.Image) -> int:
+        return mask.width * mask.height
+
+    def get_stats(self) -> dict:
+        """Get mask index statistics"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "max_distance": self.max_distance,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
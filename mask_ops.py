@@ -0,0 +1,316 @@
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Output rows processed at a time when working at full resolution
+STRIP_ROWS = 256
+
+
+def _box(image: np.ndarray, radius: int) -> np.ndarray:
+    return cv2.boxFilter(image, -1, (2 * radius + 1, 2 * radius + 1), borderType=cv2.BORDER_REFLECT)
+
+
+def _guided_coefficients(
+    mask: Image.Image,
+    guide_small: Image.Image,
+    radius: int,
+    eps: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Solve the smoothed guided filter coefficients at mask resolution"""
+    guide = np.asarray(guide_small.convert("L"), dtype=np.float32) / 255.0
+    alpha = np.asarray(mask, dtype=np.float32) / 255.0
+
+    mean_guide = _box(guide, radius)
+    mean_alpha = _box(alpha, radius)
+    cov = _box(guide * alpha, radius) - mean_guide * mean_alpha
+    var = _box(guide * guide, radius) - mean_guide * mean_guide
+
+    a = cov / (var + eps)
+    b = mean_alpha - a * mean_guide
+    return _box(a, radius), _box(b, radius)
+
+
+def _upsample_rows(planes: np.ndarray, full_size: Tuple[int, int], top: int, bottom: int) -> np.ndarray:
+    """Bilinearly upsample rows ``top:bottom`` of stacked low-resolution float planes"""
+    full_width, full_height = full_size
+    small_height, small_width = planes.shape[:2]
+
+    # Pixel-centre aligned source coordinates, matching cv2.resize INTER_LINEAR
+    map_x = ((np.arange(full_width, dtype=np.float32) + 0.5) * (small_width / full_width) - 0.5)
+    map_y = (np.arange(top, bottom, dtype=np.float32) + 0.5) * (small_height / full_height) - 0.5
+    grid_x, grid_y = np.meshgrid(map_x, map_y)
+    # One multi-channel remap shares the coordinate work between planes
+    return cv2.remap(planes, grid_x, grid_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def _apply_guided(strip_a: np.ndarray, strip_b: np.ndarray, gray: np.ndarray) -> np.ndarray:
+    """Evaluate ``a * I + b`` on full-resolution rows, clipped to 0-255 floats"""
+    strip = strip_a * (gray.astype(np.float32) * (1.0 / 255.0))
+    strip += strip_b
+    strip *= 255.0
+    np.clip(strip, 0, 255, out=strip)
+    return strip
+
+
+def guided_upsample_mask(
+    mask: Image.Image,
+    guide_small: Image.Image,
+    guide_full: Image.Image,
+    radius: int = 4,
+    eps: float = 1e-3
+) -> Image.Image:
+    """Upsample a low-resolution alpha mask using the full-resolution image as guide
+
+    Fast guided filter (He & Sun, 2015): the local linear coefficients are
+    solved at mask resolution against ``guide_small`` and only their bilinear
+    upsampling and one multiply-add run at full resolution, strip by strip,
+    so edges snap to the original image without full-frame float buffers.
+    """
+    planes = cv2.merge(_guided_coefficients(mask, guide_small, radius, eps))
+
+    full_width, full_height = guide_full.size
+    full_gray = np.asarray(guide_full.convert("L"))
+    result = np.empty((full_height, full_width), dtype=np.uint8)
+
+    for top in range(0, full_height, STRIP_ROWS):
+        bottom = min(top + STRIP_ROWS, full_height)
+        strip = _upsample_rows(planes, guide_full.size, top, bottom)
+        result[top:bottom] = _apply_guided(strip[..., 0], strip[..., 1], full_gray[top:bottom]).astype(np.uint8)
+
+    return Image.fromarray(result, "L")
+
+
+# Large images: a coarse mask is refined by tile masks predicted on
+# full-resolution crops, but only this many mask-resolution pixels either
+# side of its edges, so a tile that sees part of the subject cannot invent
+# edges elsewhere
+TILE_BAND = 16
+# Below the model input size extra tiles add inferences without adding detail
+MIN_TILE = 320
+
+
+def plan_tiles(width: int, tile_size: int, memory_bytes: int) -> Tuple[int, int]:
+    """Pick a tile size and assembly chunk height for a working-memory budget
+
+    A row of tiles holds its RGB crops and masks plus the previous row's
+    masks, about 6 bytes per pixel; assembly chunks hold about 40 bytes of
+    float planes per pixel. Three quarters of the budget go to tiles.
+    """
+    tile = max(MIN_TILE, min(tile_size, memory_bytes * 3 // 4 // (6 * width)))
+    rows = max(16, min(STRIP_ROWS, memory_bytes // 4 // (40 * width)))
+    return tile, rows
+
+
+def _tile_origins(length: int, tile: int, overlap: int) -> List[int]:
+    return list(range(0, max(length - overlap, 1), tile - overlap))
+
+
+def _ramp(start: int, end: int, length: int, overlap: int) -> np.ndarray:
+    """Blend weights along one tile axis; neighbouring ramps sum to one"""
+    weights = np.ones(end - start, dtype=np.float32)
+    fade = (np.arange(overlap, dtype=np.float32) + 0.5) / overlap
+    if start > 0:
+        weights[:overlap] = fade
+    if end < length:
+        weights[-overlap:] = np.minimum(weights[-overlap:], fade[::-1])
+    return weights
+
+
+class TiledMask:
+    """Full-resolution alpha from a coarse mask and per-tile masks, row by row
+
+    The coarse mask is upsampled with the guided filter as in
+    ``guided_upsample_mask``; within ``TILE_BAND`` of its edges it is
+    replaced by tile masks, feathered with linear ramps across the tile
+    overlaps. Tiles away from any edge are never predicted, and output is
+    produced in row ranges so nothing full-frame is held beyond the result.
+    """
+
+    def __init__(
+        self,
+        coarse_mask: Image.Image,
+        guide_small: Image.Image,
+        full_size: Tuple[int, int],
+        tile: int,
+        overlap: int,
+        radius: int = 4,
+        eps: float = 1e-3
+    ):
+        self.full_size = full_size
+        self.tile = tile
+        self.overlap = overlap
+        mean_a, mean_b = _guided_coefficients(coarse_mask, guide_small, radius, eps)
+        self.band = self._edge_band(np.asarray(coarse_mask))
+        self.planes = cv2.merge((mean_a, mean_b, self.band))
+
+        width, height = full_size
+        self.lefts = _tile_origins(width, tile, overlap)
+        self.tops = _tile_origins(height, tile, overlap)
+
+    @staticmethod
+    def _edge_band(mask: np.ndarray) -> np.ndarray:
+        # Around hard transitions and wherever the coarse mask is undecided
+        foreground = (mask > 127).astype(np.uint8)
+        kernel = np.ones((2 * TILE_BAND + 1, 2 * TILE_BAND + 1), np.uint8)
+        band = cv2.dilate(foreground, kernel) != cv2.erode(foreground, kernel)
+        band |= (mask > 8) & (mask < 247)
+        return cv2.blur(band.astype(np.float32), (TILE_BAND + 1, TILE_BAND + 1))
+
+    def tile_boxes(self, index: int) -> List[Tuple[int, int, int, int]]:
+        """(left, top, right, bottom) boxes in tile row ``index`` that need a tile mask"""
+        width, height = self.full_size
+        small_height, small_width = self.band.shape
+        top = self.tops[index]
+        bottom = min(top + self.tile, height)
+
+        boxes = []
+        for left in self.lefts:
+            right = min(left + self.tile, width)
+            band = self.band[
+                top * small_height // height:-(-bottom * small_height // height),
+                left * small_width // width:-(-right * small_width // width)
+            ]
+            if band.any():
+                boxes.append((left, top, right, bottom))
+        return boxes
+
+    def row_range(self, index: int) -> Tuple[int, int]:
+        """Output rows that are final once tile rows up to ``index`` are known"""
+        bottom = self.tops[index + 1] if index + 1 < len(self.tops) else self.full_size[1]
+        return self.tops[index], bottom
+
+    def alpha_rows(
+        self,
+        top: int,
+        bottom: int,
+        gray: np.ndarray,
+        tiles: List[Tuple[Tuple[int, int, int, int], np.ndarray]]
+    ) -> np.ndarray:
+        """Alpha for rows ``top:bottom`` given their grayscale pixels and nearby tile masks"""
+        width, height = self.full_size
+        strip = _upsample_rows(self.planes, self.full_size, top, bottom)
+        alpha = _apply_guided(strip[..., 0], strip[..., 1], gray)
+        band = strip[..., 2]
+
+        refined = np.zeros_like(alpha)
+        weight = np.zeros_like(alpha)
+        for (left, tile_top, right, tile_bottom), tile_mask in tiles:
+            start, end = max(top, tile_top), min(bottom, tile_bottom)
+            if start >= end:
+                continue
+            rows = _ramp(tile_top, tile_bottom, height, self.overlap)[start - tile_top:end - tile_top]
+            tile_weight = np.outer(rows, _ramp(left, right, width, self.overlap))
+            tile_weight *= band[start - top:end - top, left:right]
+            weight[start - top:end - top, left:right] += tile_weight
+            tile_weight *= tile_mask[start - tile_top:end - tile_top]
+            refined[start - top:end - top, left:right] += tile_weight
+
+        alpha *= 1.0 - weight
+        alpha += refined
+        np.clip(alpha, 0, 255, out=alpha)
+        return alpha.astype(np.uint8)
+
+
+# Alpha refinement modes applied after compositing
+REFINE_MODES = ("smooth", "enhance", "none")
+
+# Refinement works on tiles that contain alpha transitions; the margin covers
+# the reach of every filter below so results match a full-frame pass
+REFINE_TILE = 64
+REFINE_MARGIN = 16
+EDGE_BAND = 8
+
+_REFINE_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+
+
+def _tile_reduce(array: np.ndarray, tile: int, reducer) -> np.ndarray:
+    """Reduce each band of ``tile`` rows to one row, including a partial last band"""
+    full_rows = array.shape[0] // tile
+    parts = []
+    if full_rows:
+        parts.append(reducer(array[:full_rows * tile].reshape(full_rows, tile, -1), axis=1))
+    if array.shape[0] % tile:
+        parts.append(reducer(array[full_rows * tile:], axis=0, keepdims=True))
+    return np.concatenate(parts)
+
+
+def _edge_windows(alpha: np.ndarray, tile: int = REFINE_TILE) -> List[Tuple[int, int, int, int]]:
+    """Find (top, bottom, left, right) runs of tiles near alpha transitions"""
+    height, width = alpha.shape
+    tile_min = _tile_reduce(_tile_reduce(alpha, tile, np.min).T, tile, np.min).T
+    tile_max = _tile_reduce(_tile_reduce(alpha, tile, np.max).T, tile, np.max).T
+
+    # A tile needs work if it or any neighbour differs, which also catches
+    # transitions that fall exactly on a tile boundary
+    tile_min = cv2.erode(tile_min, np.ones((3, 3), np.uint8), borderType=cv2.BORDER_REPLICATE)
+    tile_max = cv2.dilate(tile_max, np.ones((3, 3), np.uint8), borderType=cv2.BORDER_REPLICATE)
+    active = tile_min != tile_max
+    rows, cols = active.shape
+
+    windows = []
+    for row in range(rows):
+        col = 0
+        while col < cols:
+            if not active[row, col]:
+                col += 1
+                continue
+            start = col
+            while col < cols and active[row, col]:
+                col += 1
+            windows.append((row * tile, min((row + 1) * tile, height), start * tile, min(col * tile, width)))
+    return windows
+
+
+def _smooth(window: np.ndarray) -> np.ndarray:
+    # Close and open remove specks and pinholes, the blur softens stair-stepping
+    window = cv2.morphologyEx(window, cv2.MORPH_CLOSE, _REFINE_KERNEL)
+    window = cv2.morphologyEx(window, cv2.MORPH_OPEN, _REFINE_KERNEL)
+    return cv2.GaussianBlur(window, (3, 3), 0.5)
+
+
+def _enhance(window: np.ndarray) -> np.ndarray:
+    # Sigmoid falloff on the distance into the foreground, within EDGE_BAND pixels of the edge
+    foreground = np.where(window > 127, np.uint8(255), np.uint8(0))
+    inside = cv2.distanceTransform(foreground, cv2.DIST_L2, 5)
+    outside = cv2.distanceTransform(cv2.bitwise_not(foreground), cv2.DIST_L2, 5)
+
+    falloff = np.minimum(inside, EDGE_BAND)
+    falloff *= 1.0 / EDGE_BAND
+    falloff -= 0.1
+    falloff *= -10.0
+    np.exp(falloff, out=falloff)
+    falloff += 1.0
+    np.divide(0.3 * 255.0, falloff, out=falloff)
+
+    near_edge = (inside <= EDGE_BAND) & (outside <= EDGE_BAND)
+    boosted = np.maximum(window, falloff.astype(np.uint8))
+    return np.where(near_edge, boosted, window)
+
+
+def refine_alpha(alpha: np.ndarray, mode: str = "smooth") -> List[Tuple[Tuple[int, int, int, int], np.ndarray]]:
+    """Refine an alpha plane around its transitions
+
+    Only windows of tiles near edges are filtered, each padded by
+    ``REFINE_MARGIN``, so solid regions are never touched and every
+    temporary is window-sized. Returns ``((left, top, right, bottom), patch)``
+    pairs to write back; ``alpha`` itself is not modified.
+    """
+    if mode not in REFINE_MODES:
+        raise ValueError(f"Unknown refinement mode: {mode}")
+    if mode == "none":
+        return []
+
+    height, width = alpha.shape
+    patches = []
+    for top, bottom, left, right in _edge_windows(alpha):
+        outer_top, outer_left = max(top - REFINE_MARGIN, 0), max(left - REFINE_MARGIN, 0)
+        outer_bottom, outer_right = min(bottom + REFINE_MARGIN, height), min(right + REFINE_MARGIN, width)
+
+        window = _smooth(alpha[outer_top:outer_bottom, outer_left:outer_right])
+        if mode == "enhance":
+            window = _enhance(window)
+        patch = window[top - outer_top:bottom - outer_top, left - outer_left:right - outer_left]
+        patches.append(((left, top, right, bottom), patch))
+    return patches
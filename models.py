@@ -0,0 +1,100 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# Supported rembg models with a rough resident size of a loaded session
+AVAILABLE_MODELS = {
+    "u2net": {
+        "description": "U²-Net model for high-quality background removal",
+        "memory_mb": 260,
+    },
+    "u2netp": {
+        "description": "Lightweight U²-Net for fast drafts and thumbnails",
+        "memory_mb": 15,
+    },
+    "u2net_human_seg": {
+        "description": "U²-Net trained for human segmentation",
+        "memory_mb": 260,
+    },
+    "silueta": {
+        "description": "Compact U²-Net variant with near u2net quality",
+        "memory_mb": 70,
+    },
+    "isnet-general-use": {
+        "description": "IS-Net general purpose model with sharper edges",
+        "memory_mb": 270,
+    },
+}
+
+
+class SessionRegistry:
+    """Lazily loaded model sessions, evicted LRU-first under a memory budget
+
+    The most recently used session is always kept, even if it alone exceeds
+    the budget. Evicted sessions are freed once in-flight runs release them.
+    """
+
+    def __init__(self, session_factory: Callable, memory_budget_mb: int, **factory_kwargs):
+        self.session_factory = session_factory
+        self.memory_budget_mb = memory_budget_mb
+        self.factory_kwargs = factory_kwargs
+
+        self._sessions: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, model_name: str):
+        """Get a session, loading it on first use (blocking)"""
+        if model_name not in AVAILABLE_MODELS:
+            raise ValueError(f"Unknown model: {model_name}")
+
+        session = self._sessions.get(model_name)
+        if session is not None:
+            try:
+                self._sessions.move_to_end(model_name)
+            except KeyError:
+                pass  # Evicted concurrently; the caller still holds a usable session
+            return session
+
+        with self._lock:
+            session = self._sessions.get(model_name)
+            if session is not None:
+                return session
+
+            logger.info(f"Loading {model_name} model...")
+            session = self.session_factory(model_name, **self.factory_kwargs)
+            self._sessions[model_name] = session
+            self.loads += 1
+            self._evict()
+            return session
+
+    def is_loaded(self, model_name: str) -> bool:
+        return model_name in self._sessions
+
+    def _evict(self):
+        while len(self._sessions) > 1 and self.memory_used_mb() > self.memory_budget_mb:
+            model_name, _ = self._sessions.popitem(last=False)
+            self.evictions += 1
+            logger.info(f"Evicted {model_name} model to stay within {self.memory_budget_mb}MB")
+
+    def memory_used_mb(self) -> int:
+        return sum(AVAILABLE_MODELS[name]["memory_mb"] for name in self._sessions)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def get_stats(self) -> dict:
+        """Get registry statistics"""
+        return {
+            "loaded": list(self._sessions),
+            "memory_used_mb": self.memory_used_mb(),
+            "memory_budget_mb": self.memory_budget_mb,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
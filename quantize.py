@@ -0,0 +1,163 @@
+"""Generate INT8 variants of the rembg models and check them against FP32
+
+Examples::
+
+    python -m quantize --models u2net,silueta --samples ./samples
+    python -m quantize --models u2netp --min-iou 0.97 --output report.json
+
+Dynamic quantization stores weights as 8-bit integers and quantizes
+activations on the fly, so no calibration set is needed. Each quantized
+model is compared with its FP32 original by mask IoU on the sample images
+and is only kept when the mean reaches ``--min-iou``. Kept models are
+written to ``MODEL_CACHE_DIR`` and served with ``INFERENCE_PRECISION=int8``.
+Requires the ``onnx`` package.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List, Optional
+
+import numpy as np
+from PIL import Image
+
+from bg_remover import quantized_model_path
+from inference import predict_mask
+from models import AVAILABLE_MODELS
+from worker_pool import available_cpus
+
+SAMPLE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def mask_iou(reference: Image.Image, candidate: Image.Image, threshold: int = 128) -> float:
+    """Intersection over union of two L masks binarized at ``threshold``"""
+    reference = np.asarray(reference) >= threshold
+    candidate = np.asarray(candidate) >= threshold
+    union = np.logical_or(reference, candidate).sum()
+    if not union:
+        return 1.0
+    return float(np.logical_and(reference, candidate).sum() / union)
+
+
+def load_samples(directory: Optional[str], count: int) -> List[Image.Image]:
+    """Sample images from a directory, or synthetic ones as a smoke test"""
+    if not directory:
+        from benchmarks.images import synthetic_image
+        return [synthetic_image(640, seed) for seed in range(count)]
+
+    paths = sorted(path for path in Path(directory).iterdir() if path.suffix.lower() in SAMPLE_EXTENSIONS)
+    if not paths:
+        raise ValueError(f"No sample images in {directory}")
+    return [Image.open(path).convert("RGB") for path in paths[:count]]
+
+
+def compare_models(reference, candidate, model_name: str, images: List[Image.Image]) -> dict:
+    """Mask IoU and latency of the ``candidate`` session against the ``reference`` one"""
+    ious = []
+    latencies = {"reference": [], "candidate": []}
+    for image in images:
+        start = time.perf_counter()
+        expected = predict_mask(reference, model_name, image)
+        latencies["reference"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        actual = predict_mask(candidate, model_name, image)
+        latencies["candidate"].append(time.perf_counter() - start)
+        ious.append(mask_iou(expected, actual))
+
+    return {
+        "samples": len(images),
+        "mean_iou": round(statistics.fmean(ious), 4),
+        "min_iou": round(min(ious), 4),
+        "fp32_ms": round(statistics.fmean(latencies["reference"]) * 1000, 1),
+        "int8_ms": round(statistics.fmean(latencies["candidate"]) * 1000, 1),
+    }
+
+
+def load_session(path: str, threads: int):
+    """Plain ONNX Runtime session in the shape ``predict_mask`` expects"""
+    import onnxruntime as ort
+
+    sess_opts = ort.SessionOptions()
+    sess_opts.intra_op_num_threads = threads
+    return SimpleNamespace(inner_session=ort.InferenceSession(path, sess_opts, providers=["CPUExecutionProvider"]))
+
+
+def quantize(model_name: str, output_dir: str, images: List[Image.Image], min_iou: float, threads: int) -> dict:
+    """Quantize one model, compare it with FP32 and keep it if accurate enough"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from rembg.sessions import sessions_class
+
+    session_class = next(sc for sc in sessions_class if sc.name() == model_name)
+    fp32_path = session_class.download_models()
+
+    os.makedirs(output_dir, exist_ok=True)
+    int8_path = quantized_model_path(output_dir, model_name)
+    partial_path = f"{int8_path}.{os.getpid()}.tmp"
+    quantize_dynamic(fp32_path, partial_path, weight_type=QuantType.QUInt8)
+
+    try:
+        result = compare_models(load_session(fp32_path, threads), load_session(partial_path, threads), model_name, images)
+        result.update({
+            "model": model_name,
+            "fp32_bytes": os.path.getsize(fp32_path),
+            "int8_bytes": os.path.getsize(partial_path),
+            "kept": result["mean_iou"] >= min_iou,
+        })
+        if result["kept"]:
+            os.replace(partial_path, int8_path)
+            result["path"] = int8_path
+        return result
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+def log(message: str):
+    print(message, file=sys.stderr)
+
+
+def parse_args(argv=None):
+    default_dir = os.getenv("MODEL_CACHE_DIR") or os.path.join(os.getenv("TEMP_DIR", "/tmp/clearcut"), "models")
+
+    parser = argparse.ArgumentParser(description="Quantize rembg models to INT8 and check their accuracy")
+    parser.add_argument("--models", default=os.getenv("DEFAULT_MODEL", "u2net"), help="Comma-separated model names")
+    parser.add_argument("--samples", help="Directory of sample images (synthetic images when omitted)")
+    parser.add_argument("--sample-count", type=int, default=16, help="Sample images to compare on")
+    parser.add_argument("--min-iou", type=float, default=0.95, help="Mean mask IoU against FP32 needed to keep a model")
+    parser.add_argument("--output-dir", default=default_dir, help="Where INT8 models are written (MODEL_CACHE_DIR)")
+    parser.add_argument("--threads", type=int, default=available_cpus())
+    parser.add_argument("--output", help="Also write the JSON report here")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    models = [name for name in args.models.split(",") if name]
+    unknown = [name for name in models if name not in AVAILABLE_MODELS]
+    if unknown:
+        log(f"Unknown models: {', '.join(unknown)}")
+        return 2
+
+    images = load_samples(args.samples, args.sample_count)
+    results = []
+    for model_name in models:
+        result = quantize(model_name, args.output_dir, images, args.min_iou, args.threads)
+        results.append(result)
+        verdict = "kept" if result["kept"] else f"discarded (below {args.min_iou})"
+        log(f"{model_name}: IoU {result['mean_iou']} (min {result['min_iou']}), "
+            f"{result['fp32_ms']}ms -> {result['int8_ms']}ms, {verdict}")
+
+    report = json.dumps({"min_iou": args.min_iou, "results": results}, indent=2)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+    print(report)
+    return 0 if all(result["kept"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one computation
+
+    The first caller for a key starts ``func()`` as a task; callers arriving
+    while it runs await that same task instead of starting their own. A
+    caller that is cancelled stops waiting without affecting the others, and
+    the computation is only cancelled once nobody is waiting for it. Errors
+    reach every waiter. Nothing is kept once the computation finishes.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Any, _Flight] = {}
+        self.coalesced = 0
+
+    async def run(self, key, func: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """Return the result of ``func()`` for ``key`` and whether it was shared with an earlier caller"""
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            flight = self._flights[key] = _Flight(asyncio.create_task(func()))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+
+        flight.waiters += 1
+        try:
+            # Shielded so one waiter's cancellation does not cancel the shared task
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def get_stats(self) -> dict:
+        """Get in-flight and coalesced counts"""
+        return {
+            "in_flight": len(self._flights),
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,42 @@
+import time
+import numpy as np
+import pytest
+from types import SimpleNamespace
+
+class FakeInnerSession:
+    """Stand-in for an ONNX Runtime session that records batch sizes"""
+
+    def __init__(self, batch_dim="batch_size"):
+        self.batch_dim = batch_dim
+        self.batch_sizes = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input.1", shape=[self.batch_dim, 3, 320, 320])]
+
+    def run(self, output_names, feed):
+        batch = feed["input.1"]
+        self.batch_sizes.append(batch.shape[0])
+        # Foreground on the left half of every image
+        pred = np.zeros((batch.shape[0], 1, 320, 320), dtype=np.float32)
+        pred[:, :, :, :160] = 1.0
+        return [pred]
+
+@pytest.fixture
+def fake_session():
+    """rembg-style session wrapping a fake ONNX Runtime session"""
+    return SimpleNamespace(inner_session=FakeInnerSession())
+
+def fake_session_factory(model_name, intra_op_threads=None):
+    """Session factory for worker processes, importable by name"""
+    return SimpleNamespace(inner_session=FakeInnerSession())
+
+class SlowInnerSession(FakeInnerSession):
+    """Fake session that takes a while per batch"""
+
+    def run(self, output_names, feed):
+        time.sleep(0.5)
+        return super().run(output_names, feed)
+
+def slow_session_factory(model_name, intra_op_threads=None):
+    """Like ``fake_session_factory``, with slow predictions"""
+    return SimpleNamespace(inner_session=SlowInnerSession())
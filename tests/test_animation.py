@@ -0,0 +1,120 @@
+import io
+import pytest
+from pathlib import Path
+from PIL import Image
+import sys
+import threading
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import animation
+from animation import frame_difference, frame_signature, is_animated, iter_frames, remove_animation_background
+from bg_remover import BackgroundRemover
+from conftest import fake_session_factory
+from encoders import OUTPUT_FORMATS, webp_animation_supported
+
+class CountingRemover:
+    """Remover stand-in that makes the left half opaque and counts inferences"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def remove_background(self, image_data, timings=None, deadline=None, model=None, reuse_masks=True):
+        self.calls += 1
+        result = image_data.convert("RGBA")
+        alpha = Image.new("L", result.size, 0)
+        alpha.paste(255, (0, 0, result.width // 2, result.height))
+        result.putalpha(alpha)
+        return result
+
+def make_gif(colors, size=(32, 24)) -> Image.Image:
+    frames = [Image.new("RGB", size, color) for color in colors]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:], duration=70, loop=0)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+def test_iter_frames_decodes_each_frame():
+    """Test animated images are read frame by frame with their durations"""
+    image = make_gif(["red", "blue"])
+    assert is_animated(image)
+    frames = list(iter_frames(image))
+    assert [frame.getpixel((0, 0)) for frame, _ in frames] == [(255, 0, 0), (0, 0, 255)]
+    assert [duration for _, duration in frames] == [70, 70]
+    assert not is_animated(Image.new("RGB", (8, 8)))
+
+def test_frame_difference():
+    """Test signatures of identical frames match and different frames do not"""
+    red = frame_signature(Image.new("RGB", (300, 200), "red"))
+    assert frame_difference(red, frame_signature(Image.new("RGB", (300, 200), "red"))) == 0
+    assert frame_difference(red, frame_signature(Image.new("RGB", (300, 200), "blue"))) > 0.1
+
+@pytest.mark.asyncio
+async def test_near_identical_frames_reuse_the_mask():
+    """Test inference only runs on frames that differ from the last inferred frame"""
+    remover = CountingRemover()
+    frames = iter([
+        (Image.new("RGB", (32, 24), (200, 0, 0)), 50),
+        (Image.new("RGB", (32, 24), (201, 0, 0)), 50),
+        (Image.new("RGB", (32, 24), (0, 0, 200)), 50),
+    ])
+    timings = {}
+    result_bytes, stats = await remove_animation_background(
+        remover, frames, OUTPUT_FORMATS["png"], 10, timings, reuse_threshold=0.01
+    )
+
+    assert stats == {"frames": 3, "inferred": 2, "reused": 1}
+    assert remover.calls == 2
+    assert {"decode", "encode"} <= set(timings)
+
+    result = Image.open(io.BytesIO(result_bytes))
+    assert result.n_frames == 3
+    result.seek(1)
+    result.load()
+    assert result.getpixel((0, 0)) == (201, 0, 0, 255)  # Reused mask on the new frame's pixels
+    assert result.getpixel((31, 0))[3] == 0
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not webp_animation_supported(), reason="Pillow built without animated WebP")
+async def test_zero_threshold_infers_every_frame():
+    """Test a zero reuse threshold runs inference on every frame of an animated WebP"""
+    remover = CountingRemover()
+    frames = iter([(Image.new("RGB", (32, 24), "red"), 50)] * 3)
+    result_bytes, stats = await remove_animation_background(
+        remover, frames, OUTPUT_FORMATS["webp"], 90, {}, reuse_threshold=0
+    )
+    assert stats["inferred"] == remover.calls == 3
+    assert Image.open(io.BytesIO(result_bytes)).format == "WEBP"
+
+@pytest.mark.asyncio
+async def test_frames_bypass_the_mask_index():
+    """Test inferred frames neither reuse nor fill the near-duplicate mask index"""
+    remover = BackgroundRemover(session_factory=fake_session_factory, mask_index_bytes=1024 * 1024)
+    frames = iter([(Image.new("RGB", (32, 24), (40 * i, 0, 0)), 50) for i in range(6)])
+    _, stats = await remove_animation_background(remover, frames, OUTPUT_FORMATS["png"], 90, {}, reuse_threshold=0)
+
+    assert stats == {"frames": 6, "inferred": 6, "reused": 0}
+    assert len(remover.registry.get("u2net").inner_session.batch_sizes) == 6
+    index = remover.mask_index.get_stats()
+    assert index["entries"] == index["hits"] == index["misses"] == 0
+    await remover.cleanup()
+
+@pytest.mark.asyncio
+async def test_per_frame_work_runs_off_the_event_loop(monkeypatch):
+    """Test frame signatures and reused-mask compositing run in worker threads"""
+    threads = set()
+    frame_signature, apply_mask = animation.frame_signature, animation._apply_mask
+
+    def recording(func):
+        def run(*args):
+            threads.add(threading.current_thread())
+            return func(*args)
+        return run
+
+    monkeypatch.setattr(animation, "frame_signature", recording(frame_signature))
+    monkeypatch.setattr(animation, "_apply_mask", recording(apply_mask))
+    frames = iter([(Image.new("RGB", (32, 24), "red"), 50)] * 3)
+    _, stats = await remove_animation_background(CountingRemover(), frames, OUTPUT_FORMATS["png"], 90, {})
+
+    assert stats["reused"] == 2
+    assert threads and threading.current_thread() not in threads
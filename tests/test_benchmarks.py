@@ -0,0 +1,25 @@
+import json
+from pathlib import Path
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks import run
+
+def test_stub_benchmark_writes_json(tmp_path):
+    """Test the offline benchmark produces per-case results with stage timings"""
+    output = tmp_path / "results.json"
+    run.main([
+        "--stub", "--sizes", "256", "--formats", "jpeg",
+        "--concurrency", "1,2", "--iterations", "2", "--output", str(output)
+    ])
+
+    report = json.loads(output.read_text())
+    assert report["meta"]["stub"] is True
+    assert [case["concurrency"] for case in report["remover"]] == [1, 2]
+    case = report["remover"][0]
+    assert case["succeeded"] == 2
+    assert {"decode", "inference", "post_process"} <= set(case["stages"])
+    assert case["memory"]["peak_bytes"] > 0
+    assert report["http"] == []
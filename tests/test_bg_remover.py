@@ -0,0 +1,258 @@
+import asyncio
+import io
+import cv2
+import numpy as np
+import pytest
+from pathlib import Path
+from PIL import Image
+import threading
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import bg_remover
+from bg_remover import BackgroundRemover
+from mask_ops import refine_alpha
+from conftest import fake_session_factory
+
+@pytest.fixture
+def remover():
+    return BackgroundRemover(session_factory=fake_session_factory)
+
+@pytest.mark.asyncio
+async def test_remove_background_in_memory(remover):
+    """Test the mask is attached as alpha and stages are timed"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (200, 100), (10, 200, 30)).save(buffer, format="JPEG")
+
+    timings = {}
+    result = await remover.remove_background(buffer.getvalue(), timings=timings)
+
+    assert result.mode == "RGBA"
+    assert result.size == (200, 100)
+    assert result.getpixel((20, 50))[3] == 255
+    assert result.getpixel((180, 50))[3] == 0
+    assert {"decode", "resize", "inference", "composite", "post_process"} <= set(timings)
+
+@pytest.mark.asyncio
+async def test_remove_background_keeps_caller_image(remover):
+    """Test a PIL input is not modified in place"""
+    image = Image.new("RGB", (64, 64), "white")
+    await remover.remove_background(image)
+    assert image.mode == "RGB"
+
+@pytest.mark.asyncio
+async def test_models_load_lazily_and_evict():
+    """Test extra models load on first use and the LRU one is evicted over budget"""
+    remover = BackgroundRemover(session_factory=fake_session_factory, model_memory_budget_mb=300)
+    await remover.initialize()
+    assert remover.registry.get_stats()["loaded"] == ["u2net"]
+
+    await remover.remove_background(Image.new("RGB", (32, 32)), model="u2netp")
+    await remover.remove_background(Image.new("RGB", (32, 32)), model="silueta")
+
+    stats = remover.registry.get_stats()
+    assert stats["loaded"] == ["u2netp", "silueta"]
+    assert stats["evictions"] == 1
+    await remover.cleanup()
+
+@pytest.mark.asyncio
+async def test_unknown_model_rejected(remover):
+    """Test unsupported model names raise ValueError"""
+    with pytest.raises(ValueError):
+        await remover.remove_background(Image.new("RGB", (8, 8)), model="not-a-model")
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("upsample_mode", ["guided", "lanczos"])
+async def test_large_image_mask_upsampled(upsample_mode):
+    """Test images above the processing size come back full size with their mask"""
+    remover = BackgroundRemover(session_factory=fake_session_factory, upsample_mode=upsample_mode)
+    image = Image.new("RGB", (3000, 1500), (10, 200, 30))
+
+    timings = {}
+    result = await remover.remove_background(image, timings=timings)
+
+    assert result.size == (3000, 1500)
+    assert result.getpixel((300, 750)) == (10, 200, 30, 255)
+    assert result.getpixel((2700, 750))[3] == 0
+    assert "upscale" in timings
+    await remover.cleanup()
+
+@pytest.mark.asyncio
+async def test_fit_size_processes_at_preview_resolution(remover):
+    """Test fit_size decodes and processes at reduced size"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (3200, 1600), (10, 200, 30)).save(buffer, format="JPEG")
+
+    result = await remover.remove_background(buffer.getvalue(), fit_size=(800, 600))
+
+    assert result.size == (800, 400)
+    assert result.getpixel((100, 200))[3] == 255
+    assert result.getpixel((700, 200))[3] == 0
+
+@pytest.mark.asyncio
+async def test_tiled_mode_refines_only_edge_tiles():
+    """Test tiled mode keeps full size and predicts tiles only along the mask edge"""
+    remover = BackgroundRemover(session_factory=fake_session_factory, large_image_mode="tiled", tile_size=512)
+    image = Image.new("RGB", (3000, 1500), (10, 200, 30))
+    image.paste((200, 30, 10), (1500, 0, 3000, 1500))
+
+    timings = {}
+    result = await remover.remove_background(image, timings=timings)
+
+    assert result.size == (3000, 1500)
+    assert result.getpixel((300, 750)) == (10, 200, 30, 255)
+    assert result.getpixel((2700, 750))[3] == 0
+    # One coarse pass plus one column of tiles out of a 7x4 grid
+    assert len(remover.registry.get("u2net").inner_session.batch_sizes) == 1 + 4
+    assert {"inference", "upscale", "composite"} <= set(timings)
+    await remover.cleanup()
+
+def test_post_process_in_bands_matches_full_frame(remover, monkeypatch):
+    """Test banded post-processing gives the same alpha as refining the whole plane"""
+    monkeypatch.setattr(bg_remover, "POST_PROCESS_ROWS", 64)
+    alpha = np.zeros((300, 500), dtype=np.uint8)
+    cv2.circle(alpha, (200, 150), 90, 255, -1)
+    alpha[62:70, 400:450] = 255  # Bar straddling a band boundary
+    image = Image.new("RGB", (500, 300))
+    image.putalpha(Image.fromarray(alpha, "L"))
+
+    expected = alpha.copy()
+    for (left, top, right, bottom), patch in refine_alpha(alpha, "smooth"):
+        expected[top:bottom, left:right] = patch
+
+    result = remover._post_process_image(image)
+    assert (np.asarray(result.getchannel("A")) == expected).all()
+
+class FakeRembgSession:
+    """rembg session class stand-in recording which model file each session loads"""
+    loaded = []
+
+    def __init__(self, model_name, sess_opts, providers=None):
+        self.sess_opts = sess_opts
+        self.loaded.append(type(self).download_models())
+        if sess_opts.optimized_model_filepath:
+            Path(sess_opts.optimized_model_filepath).write_bytes(b"optimized")
+
+    @classmethod
+    def download_models(cls, *args, **kwargs):
+        return "downloaded.onnx"
+
+    @classmethod
+    def name(cls, *args, **kwargs):
+        return "u2net"
+
+@pytest.fixture
+def rembg_sessions(monkeypatch):
+    import rembg.sessions
+    monkeypatch.setattr(rembg.sessions, "sessions_class", [FakeRembgSession])
+    FakeRembgSession.loaded = []
+    return FakeRembgSession.loaded
+
+def test_create_session_reuses_optimized_model(tmp_path, rembg_sessions):
+    """Test the optimized graph is saved on first load and loaded directly afterwards"""
+    from bg_remover import create_session
+
+    create_session("u2net", cache_dir=str(tmp_path))
+    cached = [str(path) for path in tmp_path.glob("u2net-fp32-extended-ort*.onnx")]
+    assert len(cached) == 1
+    assert rembg_sessions == ["downloaded.onnx", cached[0]]
+
+    rembg_sessions.clear()
+    create_session("u2net", cache_dir=str(tmp_path))
+    assert rembg_sessions == [cached[0]]
+
+def test_create_session_options_and_int8(tmp_path, rembg_sessions):
+    """Test tuning options reach ONNX Runtime and INT8 models load when generated"""
+    import onnxruntime as ort
+    from bg_remover import create_session, quantized_model_path
+
+    session = create_session("u2net", 3, graph_optimization="basic", execution_mode="parallel", precision="int8")
+    assert rembg_sessions == ["downloaded.onnx"]  # Nothing quantized yet: FP32
+    assert session.sess_opts.intra_op_num_threads == 3
+    assert session.sess_opts.graph_optimization_level == ort.GraphOptimizationLevel.ORT_ENABLE_BASIC
+    assert session.sess_opts.execution_mode == ort.ExecutionMode.ORT_PARALLEL
+
+    quantized = quantized_model_path(str(tmp_path), "u2net")
+    Path(quantized).write_bytes(b"int8")
+    rembg_sessions.clear()
+    create_session("u2net", cache_dir=str(tmp_path), graph_optimization="disable", precision="int8")
+    assert rembg_sessions == [quantized]
+
+@pytest.mark.asyncio
+async def test_warmup_loads_and_runs_the_model():
+    """Test warmup runs one inference through the default model"""
+    remover = BackgroundRemover(session_factory=fake_session_factory)
+    await remover.initialize()
+    await remover.warmup()
+    assert remover.registry.get("u2net").inner_session.batch_sizes == [1]
+    await remover.cleanup()
+
+@pytest.mark.asyncio
+async def test_near_duplicate_reuses_indexed_mask():
+    """Test a re-encoded, resized copy reuses the mask unless exact processing is asked for"""
+    from benchmarks.images import synthetic_image
+
+    remover = BackgroundRemover(session_factory=fake_session_factory, mask_index_bytes=1024 * 1024)
+    image = synthetic_image(800)
+    await remover.remove_background(image)
+
+    buffer = io.BytesIO()
+    image.resize((600, 400), Image.Resampling.LANCZOS).save(buffer, format="JPEG", quality=60)
+    timings, mask_match = {}, {}
+    result = await remover.remove_background(buffer.getvalue(), timings=timings, mask_match=mask_match)
+
+    assert "mask_reuse" in timings and "inference" not in timings
+    assert mask_match["distance"] <= remover.mask_index.max_distance
+    assert result.size == (600, 400)
+    assert result.getpixel((100, 200))[3] == 255 and result.getpixel((500, 200))[3] == 0
+
+    timings, mask_match = {}, {}
+    await remover.remove_background(buffer.getvalue(), timings=timings, reuse_masks=False, mask_match=mask_match)
+    assert "inference" in timings and mask_match == {}
+    assert remover.get_model_info()["mask_index"]["hits"] == 1
+    await remover.cleanup()
+
+@pytest.mark.asyncio
+async def test_batch_size_is_capped_by_concurrency():
+    """Test batches never hold more images than there are inference slots"""
+    remover = BackgroundRemover(session_factory=fake_session_factory, batch_size=8, batch_wait_ms=50, concurrency=2)
+    assert remover.effective_batch_size == 2
+
+    images = [Image.new("RGB", (64, 48), "red") for _ in range(4)]
+    await asyncio.gather(*(remover.remove_background(image, reuse_masks=False) for image in images))
+
+    assert max(remover.registry.get("u2net").inner_session.batch_sizes) <= 2
+    assert remover.get_model_info()["batching"]["u2net"]["max_batch_size"] == 2
+    await remover.cleanup()
+
+@pytest.mark.asyncio
+async def test_cpu_stages_run_off_the_event_loop(remover, monkeypatch):
+    """Test decoding and post-processing run on the inference threads"""
+    threads = {}
+    decode_image, post_process_image = remover._decode_image, remover._post_process_image
+
+    def recording(stage, func):
+        def run(*args):
+            threads[stage] = threading.current_thread()
+            return func(*args)
+        return run
+
+    monkeypatch.setattr(remover, "_decode_image", recording("decode", decode_image))
+    monkeypatch.setattr(remover, "_post_process_image", recording("post_process", post_process_image))
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), "red").save(buffer, format="PNG")
+    await remover.remove_background(buffer.getvalue())
+
+    assert threads.keys() == {"decode", "post_process"}
+    assert threading.current_thread() not in threads.values()
+
+def test_thread_mode_splits_cpus_between_sessions(monkeypatch):
+    """Test concurrent sessions share the CPU quota instead of each taking all of it"""
+    monkeypatch.setattr(bg_remover, "available_cpus", lambda: 4)
+    assert BackgroundRemover(session_factory=fake_session_factory, concurrency=2).intra_op_threads == 2
+    assert BackgroundRemover(session_factory=fake_session_factory, concurrency=8).intra_op_threads == 1
+    assert BackgroundRemover(
+        session_factory=fake_session_factory, concurrency=2, threads_per_worker=3
+    ).intra_op_threads == 3
@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from pathlib import Path
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from cache import ResultCache
+import main
+from main import generate_cache_key, pack_cached_result, unpack_cached_result
+
+@pytest.mark.asyncio
+async def test_memory_lru_eviction():
+    """Test memory tier evicts least recently used entries"""
+    cache = ResultCache(memory_bytes=10)
+    await cache.put("a", b"12345")
+    await cache.put("b", b"12345")
+    assert await cache.get("a") == b"12345"
+
+    await cache.put("c", b"12345")
+    assert await cache.get("b") is None
+    assert await cache.get("a") == b"12345"
+    assert cache.get_stats()["memory_bytes"] == 10
+
+@pytest.mark.asyncio
+async def test_disk_tier_survives_restart(tmp_path):
+    """Test disk entries are reloaded and served after a restart"""
+    cache = ResultCache(memory_bytes=1024, disk_dir=str(tmp_path), disk_bytes=1024)
+    await cache.initialize()
+    await cache.put("key", b"result")
+
+    restarted = ResultCache(memory_bytes=1024, disk_dir=str(tmp_path), disk_bytes=1024)
+    await restarted.initialize()
+    assert await restarted.get("key") == b"result"
+    assert restarted.get_stats()["disk_hits"] == 1
+
+@pytest.mark.asyncio
+async def test_disk_quota_eviction(tmp_path):
+    """Test disk tier stays within its byte quota"""
+    cache = ResultCache(memory_bytes=0, disk_dir=str(tmp_path), disk_bytes=10)
+    await cache.initialize()
+    await cache.put("a", b"123456")
+    await cache.put("b", b"123456")
+
+    assert not (tmp_path / "a.bin").exists()
+    assert (tmp_path / "b.bin").exists()
+    assert await cache.get("a") is None
+    assert cache.get_stats()["disk_bytes"] == 6
+
+@pytest.mark.asyncio
+async def test_concurrent_puts_count_once(tmp_path):
+    """Test concurrent puts of the same key write and count the entry once"""
+    cache = ResultCache(memory_bytes=1024, disk_dir=str(tmp_path), disk_bytes=1024)
+    await cache.initialize()
+    await asyncio.gather(*(cache.put("key", b"result") for _ in range(3)))
+
+    stats = cache.get_stats()
+    assert stats["disk_entries"] == 1
+    assert stats["disk_bytes"] == len(b"result")
+
+def test_cache_key_includes_params():
+    """Test cache key depends on processing parameters"""
+    assert generate_cache_key(b"img", "remove-bg") == generate_cache_key(b"img", "remove-bg")
+    assert generate_cache_key(b"img", "remove-bg") != generate_cache_key(b"img", "remove-bg-preview")
+
+def test_cache_key_includes_pipeline_config(monkeypatch):
+    """Test cache key changes with server settings that change the output"""
+    key = generate_cache_key(b"img", "remove-bg")
+    for setting, value in [("REFINE_MODE", "none"), ("UPSAMPLE_MODE", "lanczos"),
+                           ("LARGE_IMAGE_MODE", "tiled"), ("INFERENCE_PRECISION", "int8"),
+                           ("PIPELINE_VERSION", 0)]:
+        with monkeypatch.context() as m:
+            m.setattr(main, setting, value)
+            assert generate_cache_key(b"img", "remove-bg") != key
+    assert generate_cache_key(b"img", "remove-bg") == key
+
+def test_cached_result_keeps_mask_match():
+    """Test the mask match distance round-trips with a cached result"""
+    assert unpack_cached_result(pack_cached_result(b"result", {"distance": 3})) == (b"result", {"distance": 3})
+    assert unpack_cached_result(pack_cached_result(b"result", {})) == (b"result", {})
@@ -0,0 +1,70 @@
+import io
+import pytest
+from pathlib import Path
+from PIL import Image
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from encoders import OUTPUT_FORMATS, animation_encoder, encode_image, resolve_output, webp_animation_supported
+
+requires_webp_animation = pytest.mark.skipif(
+    not webp_animation_supported(), reason="Pillow built without animated WebP"
+)
+
+@pytest.fixture
+def result_image():
+    image = Image.new("RGBA", (64, 32), (200, 40, 40, 255))
+    image.paste((0, 0, 0, 0), (32, 0, 64, 32))
+    return image
+
+@pytest.mark.parametrize("name, expected_format, expected_mode", [
+    ("png", "PNG", "RGBA"),
+    ("webp", "WEBP", "RGBA"),
+    ("webp-lossless", "WEBP", "RGBA"),
+    ("mask", "PNG", "L"),
+])
+def test_encode_formats(result_image, name, expected_format, expected_mode):
+    """Test every output format round-trips with its alpha information"""
+    fmt, quality = resolve_output(name, None)
+    decoded = Image.open(io.BytesIO(encode_image(result_image, fmt, quality)))
+
+    assert decoded.format == expected_format
+    assert decoded.mode == expected_mode
+    alpha = decoded if expected_mode == "L" else decoded.getchannel("A")
+    assert alpha.getpixel((10, 10)) == 255
+    assert alpha.getpixel((50, 10)) == 0
+
+def test_resolve_output_defaults_and_validation():
+    """Test server defaults apply and bad formats or qualities are rejected"""
+    assert resolve_output(None, None, default_format="webp") == (OUTPUT_FORMATS["webp"], 90)
+    with pytest.raises(ValueError):
+        resolve_output("gif", None)
+    with pytest.raises(ValueError):
+        resolve_output("png", 101)
+
+@pytest.mark.parametrize("name, expected_format, expected_mode", [
+    ("png", "PNG", "RGBA"),
+    pytest.param("webp", "WEBP", "RGBA", marks=requires_webp_animation),
+    ("mask", "PNG", "L"),
+])
+def test_animation_encoder_streams_frames(name, expected_format, expected_mode):
+    """Test animations encoded frame by frame keep their frames, alpha and timing"""
+    fmt, quality = resolve_output(name, None)
+    encoder = animation_encoder(fmt, quality)
+    for alpha in (0, 128, 255):
+        encoder.add(Image.new("RGBA", (24, 16), (200, 40, 40, alpha)), 80)
+    decoded = Image.open(io.BytesIO(encoder.finish()))
+
+    assert decoded.format == expected_format
+    assert decoded.n_frames == 3
+    decoded.seek(1)
+    decoded.load()
+    assert decoded.mode == expected_mode
+    assert decoded.info["duration"] == 80
+    alpha = decoded.getchannel("A") if expected_mode == "RGBA" else decoded
+    assert abs(alpha.getpixel((0, 0)) - 128) <= 1
+
+    with pytest.raises(ValueError):
+        animation_encoder(fmt, quality).finish()
@@ -0,0 +1,67 @@
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from pathlib import Path
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from fetcher import ContentTooLargeError, URLFetcher
+
+IMAGE = b"\x89PNG fake image bytes" * 100
+
+@pytest_asyncio.fixture
+async def server():
+    """Local stand-in for an image CDN that honours If-None-Match"""
+    requests = []
+
+    async def image(request):
+        requests.append(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(body=IMAGE, headers={"ETag": '"v1"'}, content_type="image/png")
+
+    async def huge(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for _ in range(100):
+            await response.write(b"x" * 1024)
+        return response
+
+    app = web.Application()
+    app.router.add_get("/cat.png", image)
+    app.router.add_get("/huge", huge)
+    server = TestServer(app)
+    await server.start_server()
+    server.requests = requests
+    yield server
+    await server.close()
+
+@pytest_asyncio.fixture
+async def fetcher():
+    fetcher = URLFetcher(max_size=10 * 1024)
+    await fetcher.start()
+    yield fetcher
+    await fetcher.stop()
+
+@pytest.mark.asyncio
+async def test_fetch_revalidates_with_etag(server, fetcher):
+    """Test a repeated URL is revalidated and served from the cache on 304"""
+    url = str(server.make_url("/cat.png"))
+
+    assert await fetcher.fetch(url) == (IMAGE, "cat.png")
+    assert await fetcher.fetch(url) == (IMAGE, "cat.png")
+
+    assert server.requests[1].headers["If-None-Match"] == '"v1"'
+    stats = fetcher.get_stats()
+    assert stats["downloads"] == 1
+    assert stats["revalidated"] == 1
+
+@pytest.mark.asyncio
+async def test_fetch_aborts_over_size_limit(server, fetcher):
+    """Test a streamed body is abandoned once it crosses the size limit"""
+    with pytest.raises(ContentTooLargeError):
+        await fetcher.fetch(str(server.make_url("/huge")))
+    assert fetcher.get_stats()["too_large"] == 1
@@ -0,0 +1,101 @@
+import asyncio
+import time
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+from PIL import Image
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from inference import (
+    BatchScheduler,
+    DeadlineExceededError,
+    InferenceExecutor,
+    QueueFullError,
+    run_session,
+)
+from conftest import FakeInnerSession
+
+def test_run_session_masks_match_input_sizes(fake_session):
+    """Test masks are scaled back to each input size"""
+    images = [Image.new("RGB", (64, 48), "red"), Image.new("RGB", (100, 30), "blue")]
+
+    masks = run_session(fake_session, "u2net", images)
+
+    assert [mask.size for mask in masks] == [(64, 48), (100, 30)]
+    assert masks[0].getpixel((5, 10)) == 255
+    assert masks[0].getpixel((60, 10)) == 0
+    assert fake_session.inner_session.batch_sizes == [2]
+
+def test_run_session_fixed_batch_dimension():
+    """Test models with a fixed batch dimension run one image at a time"""
+    session = SimpleNamespace(inner_session=FakeInnerSession(batch_dim=1))
+    images = [Image.new("RGB", (32, 32)) for _ in range(3)]
+
+    run_session(session, "u2net", images)
+
+    assert session.inner_session.batch_sizes == [1, 1, 1]
+
+@pytest.mark.asyncio
+async def test_scheduler_batches_concurrent_requests(fake_session):
+    """Test concurrent predictions share one forward pass"""
+    scheduler = BatchScheduler(lambda: fake_session, "u2net", max_batch_size=4, max_wait_ms=50)
+    await scheduler.start()
+    try:
+        images = [Image.new("RGB", (40, 40)) for _ in range(4)]
+        masks = await asyncio.gather(*(scheduler.predict(image) for image in images))
+    finally:
+        await scheduler.stop()
+
+    assert len(masks) == 4
+    assert fake_session.inner_session.batch_sizes == [4]
+    assert scheduler.get_stats()["avg_batch_size"] == 4.0
+
+@pytest.mark.asyncio
+async def test_executor_rejects_when_queue_full():
+    """Test requests beyond concurrency plus queue depth are rejected"""
+    executor = InferenceExecutor(concurrency=1, max_queue_depth=1)
+    release = asyncio.Event()
+
+    async def hold_slot():
+        async with executor.slot():
+            await release.wait()
+
+    running = asyncio.create_task(hold_slot())
+    queued = asyncio.create_task(hold_slot())
+    await asyncio.sleep(0)
+    assert executor.get_stats()["queue_depth"] == 1
+
+    with pytest.raises(QueueFullError) as exc_info:
+        async with executor.slot():
+            pass
+    assert exc_info.value.retry_after >= 1
+
+    release.set()
+    await asyncio.gather(running, queued)
+    executor.shutdown()
+    assert executor.get_stats()["rejected"] == 1
+
+@pytest.mark.asyncio
+async def test_executor_drops_expired_work():
+    """Test queued work whose deadline passes never starts"""
+    executor = InferenceExecutor(concurrency=1, max_queue_depth=4)
+    release = asyncio.Event()
+
+    async def hold_slot():
+        async with executor.slot():
+            await release.wait()
+
+    running = asyncio.create_task(hold_slot())
+    await asyncio.sleep(0)
+
+    with pytest.raises(DeadlineExceededError):
+        async with executor.slot(deadline=time.monotonic() + 0.01):
+            pytest.fail("expired work should not run")
+
+    release.set()
+    await running
+    executor.shutdown()
+    assert executor.get_stats()["expired"] == 1
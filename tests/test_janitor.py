@@ -0,0 +1,54 @@
+import asyncio
+import os
+import time
+import pytest
+from pathlib import Path
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from janitor import TempJanitor
+
+def write_file(path: Path, size: int, age: float = 0) -> Path:
+    path.write_bytes(b"x" * size)
+    if age:
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    return path
+
+@pytest.mark.asyncio
+async def test_janitor_indexes_and_expires_existing_files(tmp_path):
+    """Test files left from a previous run are indexed and removed after the TTL"""
+    old = write_file(tmp_path / "job_old.png", 10, age=7200)
+    fresh = write_file(tmp_path / "job_fresh.png", 10)
+    (tmp_path / "models").mkdir()
+    model = write_file(tmp_path / "models" / "u2net-int8.onnx", 10, age=7200)
+
+    janitor = TempJanitor(str(tmp_path), ttl=3600)
+    await janitor.start()
+    await janitor.stop()
+
+    assert not old.exists()
+    assert fresh.exists() and model.exists()  # Subdirectories are left alone
+    assert janitor.get_stats()["removed"] == {"expired": 1, "quota": 0}
+    assert janitor.tracked_files == 1 and janitor.removed_bytes == 10
+
+@pytest.mark.asyncio
+async def test_janitor_enforces_quota_oldest_first(tmp_path):
+    """Test tracked files over the byte quota are evicted oldest first"""
+    janitor = TempJanitor(str(tmp_path), ttl=3600, quota_bytes=250, interval=3600)
+    await janitor.start()
+    try:
+        paths = []
+        for index in range(3):
+            paths.append(write_file(tmp_path / f"job_{index}.png", 100))
+            janitor.track(paths[-1], 100)
+            await asyncio.sleep(0.01)
+        await janitor.sweep()
+    finally:
+        await janitor.stop()
+
+    assert [path.exists() for path in paths] == [False, True, True]
+    assert janitor.removed["quota"] == 1
+    assert janitor.tracked_bytes == 200
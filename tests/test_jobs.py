@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from pathlib import Path
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from inference import QueueFullError
+from jobs import JobManager
+
+async def wait_for_job(manager, job_id):
+    for _ in range(100):
+        job = manager.get(job_id)
+        if job.status in ("done", "failed"):
+            return job
+        await asyncio.sleep(0.01)
+    pytest.fail("job did not finish")
+
+@pytest.mark.asyncio
+async def test_job_result_written_to_temp_dir(tmp_path):
+    """Test a finished job's result is stored in the result directory"""
+    async def process(content):
+        return content[::-1]
+
+    manager = JobManager(str(tmp_path), process, workers=1)
+    await manager.start()
+    try:
+        job = await manager.submit(b"abc", "photo.jpg")
+        job = await wait_for_job(manager, job.id)
+    finally:
+        await manager.stop()
+
+    assert job.status == "done"
+    assert job.result_path == tmp_path / f"job_{job.id}.png"
+    assert job.result_path.read_bytes() == b"cba"
+    assert job.upload_path is None
+    assert not list(tmp_path.glob("*.upload"))
+
+@pytest.mark.asyncio
+async def test_job_failure_is_reported(tmp_path):
+    """Test processing errors mark the job as failed"""
+    async def process(content):
+        raise ValueError("Invalid image file")
+
+    manager = JobManager(str(tmp_path), process, workers=1)
+    await manager.start()
+    try:
+        job = await wait_for_job(manager, (await manager.submit(b"abc", "photo.jpg")).id)
+    finally:
+        await manager.stop()
+
+    assert job.status == "failed"
+    assert job.to_dict()["error"] == "Invalid image file"
+
+@pytest.mark.asyncio
+async def test_job_waits_for_inference_slot(tmp_path):
+    """Test a job turned away by a full inference queue is retried instead of failed"""
+    attempts = []
+
+    async def process(content):
+        attempts.append(content)
+        if len(attempts) < 3:
+            raise QueueFullError(retry_after=0)
+        return content
+
+    manager = JobManager(str(tmp_path), process, workers=1)
+    await manager.start()
+    try:
+        job = await wait_for_job(manager, (await manager.submit(b"abc", "photo.jpg")).id)
+    finally:
+        await manager.stop()
+
+    assert job.status == "done"
+    assert len(attempts) == 3
+    assert manager.get_stats()["retries"] == 2
+
+@pytest.mark.asyncio
+async def test_job_queue_full(tmp_path):
+    """Test submissions beyond the queue limit are rejected"""
+    async def process(content):
+        return content
+
+    manager = JobManager(str(tmp_path), process, workers=0, max_queue=1)
+    await manager.start()
+    await manager.submit(b"a", "a.png")
+    with pytest.raises(QueueFullError):
+        await manager.submit(b"b", "b.png")
+    await manager.stop()
+
+@pytest.mark.asyncio
+async def test_queued_upload_waits_on_disk(tmp_path):
+    """Test queued uploads are kept in the result directory rather than in memory"""
+    async def process(content):
+        return content
+
+    written = []
+    manager = JobManager(str(tmp_path), process, workers=0, on_file=lambda path, size: written.append((path, size)))
+    await manager.start()
+    job = await manager.submit(b"queued", "queued.png")
+    await manager.stop()
+
+    assert job.upload_path.parent == tmp_path
+    assert job.upload_path.read_bytes() == b"queued"
+    assert written == [(job.upload_path, 6)]
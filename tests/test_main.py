@@ -1,12 +1,25 @@
+import asyncio
+import functools
+import io
+import json
+import threading
+import time
+import zipfile
+from types import SimpleNamespace
 import pytest
 from fastapi.testclient import TestClient
 from pathlib import Path
+from PIL import Image
 import sys
 
 # Add parent directory to path  
 sys.path.append(str(Path(__file__).parent.parent))
 
+import main
 from main import app
+from cache import ResultCache
+from encoders import webp_animation_supported
+from inference import DeadlineExceededError, QueueFullError
 
 client = TestClient(app)
 
@@ -51,4 +64,367 @@ def test_api_stats():
     """Test API stats endpoint"""
     response = client.get("/api/stats")
     assert response.status_code == 200
-    assert "uptime" in response.json()
\ No newline at end of file
+    assert "uptime" in response.json()
+
+def test_remove_bg_queue_full(monkeypatch):
+    """Test overloaded inference queue returns 503 with Retry-After"""
+    class OverloadedRemover:
+        model_name = "u2net"
+
+        async def remove_background(self, *args, **kwargs):
+            raise QueueFullError(retry_after=3)
+
+    monkeypatch.setattr(main, "bg_remover", OverloadedRemover())
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "white").save(buffer, format="PNG")
+
+    response = client.post("/remove-bg", files={"file": ("queue-full.png", buffer.getvalue(), "image/png")})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+
+class FakeRemover:
+    """Background remover stand-in that returns a transparent copy"""
+    model_name = "u2net"
+    executor = SimpleNamespace(queued=0, running=0)
+    mask_index = None
+
+    async def remove_background(self, image_data, timings=None, deadline=None, model=None, fit_size=None, **kwargs):
+        if isinstance(image_data, bytes):
+            image_data = Image.open(io.BytesIO(image_data))
+        image = image_data.convert("RGBA")
+        if fit_size:
+            image.thumbnail(fit_size)
+        image.putalpha(128)
+        return image
+
+def make_png(color, size=(16, 16)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def test_remove_bg_batch_zip(monkeypatch):
+    """Test batch endpoint streams a ZIP of results with a manifest"""
+    monkeypatch.setattr(main, "bg_remover", FakeRemover())
+
+    archive_bytes = io.BytesIO()
+    with zipfile.ZipFile(archive_bytes, "w") as archive:
+        archive.writestr("nested/blue.png", make_png("blue"))
+        archive.writestr("notes.txt", b"not an image")
+
+    response = client.post("/remove-bg/batch", files=[
+        ("files", ("red.png", make_png("red"), "image/png")),
+        ("files", ("images.zip", archive_bytes.getvalue(), "application/zip")),
+    ], data={"model": "u2netp"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+
+    with zipfile.ZipFile(io.BytesIO(response.content)) as result:
+        manifest = json.loads(result.read("manifest.json"))
+        assert manifest["model"] == "u2netp"
+        assert manifest["total"] == 3
+        assert manifest["succeeded"] == 2
+        assert sorted(name for name in result.namelist() if name.endswith(".png")) == [
+            "clearcut_blue.png", "clearcut_red.png"
+        ]
+        errors = [item for item in manifest["items"] if item["status"] == "error"]
+        assert errors[0]["file"] == "notes.txt"
+
+def test_batch_items_open_off_the_event_loop(monkeypatch):
+    """Test batch items are read and validated in a worker thread rather than on the event loop"""
+    threads = {}
+
+    class ThreadRecordingRemover(FakeRemover):
+        async def remove_background(self, image_data, **kwargs):
+            threads["loop"] = threading.current_thread()
+            return await super().remove_background(image_data, **kwargs)
+
+    open_image = main.open_image
+
+    def recording_open(*args):
+        threads["validate"] = threading.current_thread()
+        return open_image(*args)
+
+    monkeypatch.setattr(main, "bg_remover", ThreadRecordingRemover())
+    monkeypatch.setattr(main, "open_image", recording_open)
+    response = client.post("/remove-bg/batch", files=[
+        ("files", ("thread.png", make_png("green", size=(24, 18)), "image/png")),
+    ])
+    assert response.status_code == 200
+    assert threads["validate"] is not threads["loop"]
+
+def test_unknown_job():
+    """Test unknown job ids return 404"""
+    response = client.get("/jobs/does-not-exist")
+    assert response.status_code == 404
+
+def test_remove_bg_unknown_model(monkeypatch):
+    """Test unknown model names are rejected with 400"""
+    monkeypatch.setattr(main, "bg_remover", FakeRemover())
+    response = client.post(
+        "/remove-bg",
+        files={"file": ("model.png", make_png("green"), "image/png")},
+        data={"model": "not-a-model"}
+    )
+    assert response.status_code == 400
+    assert "Unknown model" in response.json()["detail"]
+
+def test_remove_bg_webp_output(monkeypatch):
+    """Test the format parameter selects the encoder and reports encoding time"""
+    monkeypatch.setattr(main, "bg_remover", FakeRemover())
+    response = client.post(
+        "/remove-bg",
+        files={"file": ("photo.png", make_png("purple"), "image/png")},
+        data={"format": "webp", "quality": "80"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert "clearcut_photo.webp" in response.headers["content-disposition"]
+    assert float(response.headers["x-encoding-time"]) >= 0
+    assert Image.open(io.BytesIO(response.content)).format == "WEBP"
+
+def test_preview_binary_and_url_output(monkeypatch):
+    """Test previews can be returned as an image or a short-lived URL"""
+    monkeypatch.setattr(main, "bg_remover", FakeRemover())
+    upload = {"file": ("wide.png", make_png("orange", size=(1600, 400)), "image/png")}
+
+    binary = client.post("/remove-bg-preview", files=upload, data={"output": "binary"})
+    assert binary.status_code == 200
+    assert binary.headers["content-type"] == "image/png"
+    assert Image.open(io.BytesIO(binary.content)).size == (800, 200)
+
+    response = client.post("/remove-bg-preview", files=upload, data={"output": "url"})
+    body = response.json()
+    assert body["cached"] is True
+    assert "preview" not in body
+
+    preview = client.get(body["preview_url"])
+    assert preview.status_code == 200
+    assert preview.content == binary.content
+    assert client.get("/previews/unknown").status_code == 404
+
+def test_preview_encodes_off_the_event_loop(monkeypatch):
+    """Test preview encoding runs in a worker thread rather than on the event loop"""
+    threads = {}
+
+    class ThreadRecordingRemover(FakeRemover):
+        async def remove_background(self, image_data, **kwargs):
+            threads["loop"] = threading.current_thread()
+            return await super().remove_background(image_data, **kwargs)
+
+    encode_image = main.encode_image
+
+    def recording_encode(*args):
+        threads["encode"] = threading.current_thread()
+        return encode_image(*args)
+
+    monkeypatch.setattr(main, "bg_remover", ThreadRecordingRemover())
+    monkeypatch.setattr(main, "encode_image", recording_encode)
+    upload = {"file": ("thread.png", make_png("purple", size=(40, 30)), "image/png")}
+
+    response = client.post("/remove-bg-preview", files=upload, data={"output": "binary"})
+    assert response.status_code == 200
+    assert threads["encode"] is not threads["loop"]
+
+def test_remove_bg_rejects_oversized_images(monkeypatch):
+    """Test uploads over the byte or pixel limits get 413 before processing"""
+    monkeypatch.setattr(main, "bg_remover", FakeRemover())
+
+    monkeypatch.setattr(main, "MAX_FILE_SIZE", 64)
+    response = client.post("/remove-bg", files={"file": ("big.png", make_png("red", size=(64, 64)), "image/png")})
+    assert response.status_code == 413
+
+    monkeypatch.setattr(main, "MAX_FILE_SIZE", 10 * 1024 * 1024)
+    monkeypatch.setattr(main, "MAX_IMAGE_PIXELS", 100)
+    response = client.post("/remove-bg", files={"file": ("wide.png", make_png("red", size=(64, 64)), "image/png")})
+    assert response.status_code == 413
+    assert "pixels" in response.json()["detail"]
+
+def test_metrics_endpoint(monkeypatch):
+    """Test processed requests show up in Prometheus metrics"""
+    monkeypatch.setattr(main, "bg_remover", FakeRemover())
+    client.post("/remove-bg", files={"file": ("metrics.png", make_png("navy"), "image/png")})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'clearcut_stage_duration_seconds_count{stage="validate"}' in response.text
+    assert 'clearcut_requests_total{endpoint="/remove-bg",status="200"}' in response.text
+    assert "clearcut_process_resident_memory_bytes" in response.text
+
+def test_startup_warms_up_before_ready(monkeypatch, tmp_path):
+    """Test the server answers health checks at once and reports ready after warmup"""
+    from bg_remover import BackgroundRemover
+    from conftest import fake_session_factory
+    from janitor import TempJanitor
+
+    # Keep the disk cache, temp files and model cache of the real startup out of TEMP_DIR
+    monkeypatch.setattr(main, "TEMP_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "MODEL_CACHE_DIR", "")
+    monkeypatch.setattr(main, "result_cache", ResultCache(
+        memory_bytes=1024 * 1024, disk_dir=str(tmp_path / "cache"), disk_bytes=1024 * 1024
+    ))
+    monkeypatch.setattr(main, "janitor", TempJanitor(directory=str(tmp_path), ttl=60))
+    monkeypatch.setattr(main.job_manager, "result_dir", tmp_path)
+    monkeypatch.setattr(main.job_manager, "on_file", main.janitor.track)
+    monkeypatch.setattr(main, "BackgroundRemover", functools.partial(BackgroundRemover, session_factory=fake_session_factory))
+    monkeypatch.setattr(main, "bg_remover", None)
+    monkeypatch.setattr(main, "warmup_task", None)
+    monkeypatch.setattr(main, "startup", {"ready": False, "error": None, "timings": {}})
+
+    with TestClient(app) as started:
+        assert started.get("/health").status_code == 200
+        deadline = time.monotonic() + 10
+        while started.get("/ready").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        body = started.get("/ready").json()
+        assert body["status"] == "ready"
+        assert {"import", "model_load", "warmup", "total"} <= set(body["startup"])
+        assert 'clearcut_startup_seconds{phase="warmup"}' in started.get("/metrics").text
+    assert (tmp_path / "cache").is_dir()
+
+def test_processing_rejected_until_ready(monkeypatch):
+    """Test processing endpoints return 503 while the model is still warming up"""
+    monkeypatch.setattr(main, "bg_remover", FakeRemover())
+    monkeypatch.setattr(main, "warmup_task", object())
+    monkeypatch.setattr(main, "startup", {"ready": False, "error": None, "timings": {}})
+
+    response = client.post("/remove-bg", files={"file": ("early.png", make_png("red"), "image/png")})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert client.get("/ready").json()["status"] == "starting"
+
+def test_remove_bg_animated_gif(monkeypatch):
+    """Test animated uploads come back as an animation with every frame"""
+    monkeypatch.setattr(main, "bg_remover", FakeRemover())
+    frames = [Image.new("RGB", (16, 16), color) for color in ("red", "green", "blue")]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:], duration=40)
+
+    response = client.post("/remove-bg", files={"file": ("spin.gif", buffer.getvalue(), "image/gif")})
+    assert response.status_code == 200
+    result = Image.open(io.BytesIO(response.content))
+    assert result.format == "PNG" and result.n_frames == 3
+
+    monkeypatch.setattr(main, "ANIMATION_MAX_FRAMES", 2)
+    response = client.post("/remove-bg", files={"file": ("spin.gif", buffer.getvalue(), "image/gif")}, data={"format": "webp"})
+    assert response.status_code == 400
+    assert "Too many frames" in response.json()["detail"]
+
+@pytest.mark.skipif(not webp_animation_supported(), reason="Pillow built without animated WebP")
+def test_remove_bg_frame_sequence(monkeypatch):
+    """Test a ZIP of frames becomes one animation in name order"""
+    monkeypatch.setattr(main, "bg_remover", FakeRemover())
+    archive_bytes = io.BytesIO()
+    with zipfile.ZipFile(archive_bytes, "w") as archive:
+        archive.writestr("frame_002.png", make_png("blue"))
+        archive.writestr("frame_001.png", make_png("red"))
+
+    response = client.post(
+        "/remove-bg/frames",
+        files={"files": ("frames.zip", archive_bytes.getvalue(), "application/zip")},
+        data={"fps": "25", "format": "webp-lossless"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    result = Image.open(io.BytesIO(response.content))
+    assert result.n_frames == 2
+    assert result.convert("RGBA").getpixel((0, 0)) == (255, 0, 0, 128)
+    assert result.info["duration"] == 40
+
+    response = client.post("/remove-bg/frames", files={"files": ("notes.txt", b"not an image", "text/plain")})
+    assert response.status_code == 400
+
+def test_remove_bg_reports_mask_match_distance(monkeypatch):
+    """Test a reused mask is reported in a header and exact=true opts out"""
+    class MatchingRemover(FakeRemover):
+        async def remove_background(self, image_data, reuse_masks=True, mask_match=None, **kwargs):
+            if reuse_masks:
+                mask_match["distance"] = 3
+            return await super().remove_background(image_data, **kwargs)
+
+    monkeypatch.setattr(main, "bg_remover", MatchingRemover())
+    upload = {"file": ("shoe.png", make_png("teal"), "image/png")}
+    response = client.post("/remove-bg", files=upload)
+    assert response.headers["x-mask-match-distance"] == "3"
+
+    response = client.post("/remove-bg", files=upload)
+    assert response.headers["x-cache"] == "HIT"
+    assert response.headers["x-mask-match-distance"] == "3"
+
+    response = client.post("/remove-bg", files=upload, data={"exact": "true"})
+    assert response.status_code == 200
+    assert response.headers["x-cache"] == "MISS"
+    assert "x-mask-match-distance" not in response.headers
+
+    response = client.post("/remove-bg", files=upload, data={"exact": "true"})
+    assert response.headers["x-cache"] == "HIT"
+    assert "x-mask-match-distance" not in response.headers
+
+@pytest.mark.asyncio
+async def test_identical_requests_are_coalesced(monkeypatch):
+    """Test concurrent identical requests share one background removal"""
+    class SlowRemover(FakeRemover):
+        calls = 0
+
+        async def remove_background(self, image_data, **kwargs):
+            SlowRemover.calls += 1
+            await asyncio.sleep(0.02)
+            return await super().remove_background(image_data)
+
+    monkeypatch.setattr(main, "bg_remover", SlowRemover())
+    content = make_png("indigo")
+    fmt, quality = main.resolve_output_format("png", None)
+
+    results = await asyncio.gather(*(main.process_image(content, {}, fmt=fmt, quality=quality) for _ in range(3)))
+    assert SlowRemover.calls == 1
+    assert sorted(status for _, status in results) == ["COALESCED", "COALESCED", "MISS"]
+    assert len({result for result, _ in results}) == 1
+
+class DeadlineRemover(FakeRemover):
+    """Remover stand-in that takes a while and drops work past its deadline"""
+    calls = 0
+
+    async def remove_background(self, image_data, deadline=None, **kwargs):
+        DeadlineRemover.calls += 1
+        await asyncio.sleep(0.05)
+        if deadline is not None and time.monotonic() > deadline:
+            raise DeadlineExceededError(retry_after=1)
+        return await super().remove_background(image_data)
+
+@pytest.mark.asyncio
+async def test_coalesced_waiter_keeps_its_own_deadline(monkeypatch):
+    """Test a waiter is not failed by the deadline of the request it joined"""
+    monkeypatch.setattr(main, "bg_remover", DeadlineRemover())
+    monkeypatch.setattr(DeadlineRemover, "calls", 0)
+    content = make_png("olive")
+    fmt, quality = main.resolve_output_format("png", None)
+
+    leader = asyncio.create_task(main.process_image(content, {}, time.monotonic() + 0.01, fmt=fmt, quality=quality))
+    await asyncio.sleep(0)
+    result, status = await main.process_image(content, {}, fmt=fmt, quality=quality)
+
+    with pytest.raises(DeadlineExceededError):
+        await leader
+    assert status == "MISS"
+    assert Image.open(io.BytesIO(result)).mode == "RGBA"
+    assert DeadlineRemover.calls == 2
+
+@pytest.mark.asyncio
+async def test_coalesced_work_survives_leader_cancellation(monkeypatch):
+    """Test cancelling the request that started a computation does not cancel it for waiters"""
+    monkeypatch.setattr(main, "bg_remover", DeadlineRemover())
+    monkeypatch.setattr(DeadlineRemover, "calls", 0)
+    content = make_png("maroon")
+    fmt, quality = main.resolve_output_format("png", None)
+
+    leader = asyncio.create_task(main.process_image(content, {}, fmt=fmt, quality=quality))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(main.process_image(content, {}, fmt=fmt, quality=quality))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    result, status = await waiter
+    assert status == "COALESCED"
+    assert Image.open(io.BytesIO(result)).mode == "RGBA"
+    assert DeadlineRemover.calls == 1
@@ -0,0 +1,46 @@
+import io
+from pathlib import Path
+from PIL import Image, ImageOps
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.images import synthetic_image
+from mask_index import MaskIndex, dhash, downscale_mask, hamming_distance
+
+def reencode(image: Image.Image, size, quality: int) -> Image.Image:
+    buffer = io.BytesIO()
+    image.resize(size, Image.Resampling.LANCZOS).save(buffer, format="JPEG", quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue())).convert("RGB")
+
+def test_dhash_survives_reencoding_and_resizing():
+    """Test near-duplicates hash close together and different images far apart"""
+    image = synthetic_image(800)
+    signature = dhash(image)
+
+    assert hamming_distance(signature, dhash(reencode(image, (400, 267), 40))) <= 4
+    assert hamming_distance(signature, dhash(ImageOps.mirror(image))) > 64
+
+def test_mask_index_lookup_and_eviction():
+    """Test lookups match per model and aspect ratio and old masks are evicted"""
+    index = MaskIndex(max_bytes=2 * 320 * 214, max_distance=8)
+    mask = downscale_mask(Image.new("L", (1200, 800), 255), (320, 320))
+    assert mask.size == (320, 213)
+
+    index.add("u2net", 0b1011, (1200, 800), mask)
+    assert index.lookup("u2net", 0b0011, (600, 400)) == (mask, 1)
+    assert index.lookup("u2netp", 0b1011, (600, 400)) is None
+    assert index.lookup("u2net", 0b1011, (600, 600)) is None
+    assert index.lookup("u2net", 0b1011 ^ 0x1FF, (600, 400)) is None  # 9 bits away
+
+    index.add("u2net", 0xFFF000, (1200, 800), mask)
+    index.add("u2net", 0xFFF000000, (1200, 800), mask)
+    assert index.get_stats()["entries"] == 2
+    assert index.lookup("u2net", 0b1011, (1200, 800)) is None
+
+def test_downscale_mask_keeps_model_resolution():
+    """Test masks keep the resolution of the model that predicted them"""
+    mask = Image.new("L", (2048, 1536), 255)
+    assert downscale_mask(mask, (1024, 1024)).size == (1024, 768)
+    assert downscale_mask(Image.new("L", (200, 100), 255), (320, 320)).size == (200, 100)
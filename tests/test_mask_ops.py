@@ -0,0 +1,88 @@
+import cv2
+import numpy as np
+import pytest
+from pathlib import Path
+from PIL import Image
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from mask_ops import TiledMask, guided_upsample_mask, plan_tiles, refine_alpha
+
+def test_guided_upsample_follows_full_resolution_edges():
+    """Test the upsampled mask snaps to edges of the full-resolution guide"""
+    full = np.zeros((600, 1201, 3), dtype=np.uint8)
+    full[:, :601] = 255  # Edge sits between two low-resolution pixels
+    guide_full = Image.fromarray(full)
+    guide_small = guide_full.resize((300, 150), Image.Resampling.LANCZOS)
+    mask = guide_small.convert("L")
+
+    result = np.asarray(guided_upsample_mask(mask, guide_small, guide_full))
+    blurry = np.asarray(mask.resize(guide_full.size, Image.Resampling.BILINEAR))
+
+    assert result.shape == (600, 1201)
+    assert result[300, 598] > 250 and result[300, 603] < 5
+    # Plain interpolation smears the same edge across several pixels
+    assert blurry[300, 598] < 250 or blurry[300, 603] > 5
+
+def test_refine_alpha_matches_full_frame_filtering():
+    """Test edge-restricted refinement gives the same result as filtering every pixel"""
+    alpha = np.zeros((300, 500), dtype=np.uint8)
+    cv2.circle(alpha, (200, 150), 90, 255, -1)
+    alpha[:, 448:] = 255  # Edge on a tile boundary
+    alpha[20, 20] = 255  # Isolated speck
+
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    expected = cv2.morphologyEx(alpha, cv2.MORPH_CLOSE, kernel)
+    expected = cv2.morphologyEx(expected, cv2.MORPH_OPEN, kernel)
+    expected = cv2.GaussianBlur(expected, (3, 3), 0.5)
+
+    for (left, top, right, bottom), patch in refine_alpha(alpha, "smooth"):
+        alpha[top:bottom, left:right] = patch
+    assert (alpha == expected).all()
+
+def test_refine_alpha_modes():
+    """Test solid planes are skipped and enhance only touches the edge band"""
+    solid = np.full((128, 128), 255, dtype=np.uint8)
+    assert refine_alpha(solid, "smooth") == []
+
+    alpha = np.zeros((256, 256), dtype=np.uint8)
+    alpha[:, :128] = 255
+    for (left, top, right, bottom), patch in refine_alpha(alpha, "enhance"):
+        alpha[top:bottom, left:right] = patch
+    assert 0 < alpha[100, 130] < 128  # Soft falloff just outside the edge
+    assert alpha[100, 200] == 0
+
+    with pytest.raises(ValueError):
+        refine_alpha(alpha, "sharpen")
+
+def test_tiled_mask_blends_tiles_near_edges():
+    """Test tiles replace the coarse mask only near its edges, seamlessly across overlaps"""
+    full = np.zeros((1200, 2400, 3), dtype=np.uint8)
+    full[:, :1200] = 255
+    guide_full = Image.fromarray(full)
+    guide_small = guide_full.resize((600, 300), Image.Resampling.LANCZOS)
+    mask = guide_small.convert("L")
+    tiled = TiledMask(mask, guide_small, guide_full.size, tile=512, overlap=64)
+
+    gray = np.asarray(guide_full.convert("L"))
+    untouched = tiled.alpha_rows(0, 1200, gray, [])
+    assert (untouched == np.asarray(guided_upsample_mask(mask, guide_small, guide_full))).all()
+
+    # Only the column of tiles around x=1200 is worth predicting
+    boxes = [box for index in range(len(tiled.tops)) for box in tiled.tile_boxes(index)]
+    assert {left for left, _, _, _ in boxes} == {896}
+    assert len(boxes) == len(tiled.tops)
+
+    tiles = [(box, np.full((box[3] - box[1], box[2] - box[0]), 128, np.uint8)) for box in boxes]
+    blended = tiled.alpha_rows(0, 1200, gray, tiles)
+    assert (blended[:, 1200] == 128).all()  # Overlapping tile rows sum to full weight
+    assert blended[600, 200] == 255 and blended[600, 2200] == 0
+
+def test_plan_tiles_fits_budget():
+    """Test wide images get smaller tiles and chunks within the memory budget"""
+    assert plan_tiles(4000, 1024, 256 * 1024 * 1024) == (1024, 256)
+    tile, rows = plan_tiles(20000, 1024, 64 * 1024 * 1024)
+    assert tile < 1024 and rows < 256
+    assert 6 * 20000 * tile <= 64 * 1024 * 1024
@@ -0,0 +1,29 @@
+from pathlib import Path
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from metrics import MetricsRegistry
+
+def test_render_prometheus_text():
+    """Test counters, histograms and callbacks render in the text exposition format"""
+    registry = MetricsRegistry()
+    requests = registry.counter("app_requests_total", "Requests", ("status",))
+    latency = registry.histogram("app_latency_seconds", "Latency", buckets=(0.1, 1.0))
+    registry.callback("app_queue_depth", "Queue depth", lambda: 3)
+
+    requests.inc(status=200)
+    requests.inc(2, status=200)
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE app_requests_total counter" in lines
+    assert 'app_requests_total{status="200"} 3' in lines
+    assert 'app_latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'app_latency_seconds_bucket{le="1.0"} 2' in lines
+    assert 'app_latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "app_latency_seconds_count 3" in lines
+    assert "app_queue_depth 3" in lines
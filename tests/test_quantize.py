@@ -0,0 +1,32 @@
+import numpy as np
+from pathlib import Path
+from PIL import Image
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from conftest import fake_session_factory
+from quantize import compare_models, load_samples, mask_iou
+
+def test_mask_iou():
+    """Test IoU of binarized masks, including two empty masks"""
+    left = np.zeros((10, 10), dtype=np.uint8)
+    left[:, :5] = 255
+    wider = np.zeros((10, 10), dtype=np.uint8)
+    wider[:, :10] = 200
+
+    assert mask_iou(Image.fromarray(left), Image.fromarray(left)) == 1.0
+    assert mask_iou(Image.fromarray(left), Image.fromarray(wider)) == 0.5
+    assert mask_iou(Image.new("L", (4, 4)), Image.new("L", (4, 4))) == 1.0
+
+def test_compare_models_reports_iou_and_latency(tmp_path):
+    """Test identical sessions compare at IoU 1 on a sample directory"""
+    for index in range(3):
+        Image.new("RGB", (64, 48), (index * 80, 100, 50)).save(tmp_path / f"sample{index}.png")
+    images = load_samples(str(tmp_path), count=2)
+
+    result = compare_models(fake_session_factory("u2net"), fake_session_factory("u2net"), "u2net", images)
+    assert result["samples"] == 2
+    assert result["mean_iou"] == result["min_iou"] == 1.0
+    assert result["fp32_ms"] >= 0 and result["int8_ms"] >= 0
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from pathlib import Path
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from singleflight import SingleFlight
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_computation():
+    """Test identical calls in flight run once and nothing is kept afterwards"""
+    flight = SingleFlight()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*(flight.run("key", compute) for _ in range(5)))
+    assert results == [("result", False)] + [("result", True)] * 4
+    assert calls == 1
+    assert flight.get_stats() == {"in_flight": 0, "coalesced": 4}
+
+    await flight.run("key", compute)
+    assert calls == 2
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter():
+    """Test a failed computation raises in all waiters"""
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("Invalid image file")
+
+    results = await asyncio.gather(*(flight.run("key", fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.get_stats()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_cancelled_waiters_leave_the_computation_running():
+    """Test cancelling one waiter keeps the work for others, and cancelling all stops it"""
+    flight = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def compute():
+        started.set()
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "result"
+
+    first = asyncio.create_task(flight.run("key", compute))
+    await started.wait()
+    second = asyncio.create_task(flight.run("key", compute))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == ("result", True)
+    assert first.cancelled() and not cancelled.is_set()
+
+    started.clear()
+    only = asyncio.create_task(flight.run("key", compute))
+    await started.wait()
+    only.cancel()
+    await asyncio.gather(only, return_exceptions=True)
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert flight.get_stats()["in_flight"] == 0
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from pathlib import Path
+from PIL import Image
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from worker_pool import InferenceWorkerPool, auto_size_pool, cgroup_cpu_quota
+from conftest import fake_session_factory, slow_session_factory
+
+def test_auto_size_pool():
+    """Test worker and thread counts follow the available CPUs"""
+    assert auto_size_pool(2) == (1, 2)
+    assert auto_size_pool(8) == (4, 2)
+    assert auto_size_pool(8, workers=2) == (2, 4)
+    assert auto_size_pool(8, workers=3, threads_per_worker=1) == (3, 1)
+
+def test_cgroup_cpu_quota(tmp_path):
+    """Test CPU quotas are read from cgroup v2 and v1 files"""
+    assert cgroup_cpu_quota(str(tmp_path)) is None
+
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    assert cgroup_cpu_quota(str(tmp_path)) is None
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("250000\n")
+    assert cgroup_cpu_quota(str(tmp_path)) == 2.5
+
+    (tmp_path / "cpu.max").write_text("180000 100000\n")
+    assert cgroup_cpu_quota(str(tmp_path)) == 1.8
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert cgroup_cpu_quota(str(tmp_path)) is None
+
+@pytest.mark.asyncio
+async def test_worker_pool_predicts_and_restarts_crashed_worker():
+    """Test masks come back through shared memory and dead workers are replaced"""
+    pool = InferenceWorkerPool("u2net", fake_session_factory, workers=1, threads_per_worker=1)
+    await pool.start()
+    try:
+        image = Image.new("RGB", (120, 80), "white")
+        mask = await pool.predict(image)
+        assert mask.size == (120, 80)
+        assert mask.getpixel((10, 40)) == 255
+        assert mask.getpixel((110, 40)) == 0
+
+        pool._workers[0].process.kill()
+        pool._workers[0].process.join()
+
+        mask = await pool.predict(image)
+        assert mask.size == (120, 80)
+        assert pool.get_stats()["restarts"] == 1
+    finally:
+        await pool.stop()
+
+@pytest.mark.asyncio
+async def test_cancelled_request_keeps_worker_until_reply():
+    """Test a worker stays busy after its request is cancelled, so the next request gets its own mask"""
+    pool = InferenceWorkerPool("u2net", slow_session_factory, workers=1, threads_per_worker=1)
+    await pool.start()
+    try:
+        cancelled = asyncio.create_task(pool.predict(Image.new("RGB", (120, 80), "white")))
+        await asyncio.sleep(0.1)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        assert pool.get_stats()["idle"] == 0
+
+        mask = await pool.predict(Image.new("RGB", (60, 90), "white"))
+        assert mask.size == (60, 90)
+        assert mask.getpixel((5, 45)) == 255 and mask.getpixel((55, 45)) == 0
+        assert pool.get_stats()["idle"] == 1
+    finally:
+        await pool.stop()
@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Optional
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+def cgroup_cpu_quota(root: str = "/sys/fs/cgroup") -> Optional[float]:
+    """CPU quota of the container's cgroup in CPUs (e.g. 1.8), or None if unlimited"""
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open(os.path.join(root, "cpu.max")) as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1: a quota of -1 means unlimited
+        with open(os.path.join(root, "cpu", "cpu.cfs_quota_us")) as f:
+            quota = int(f.read())
+        with open(os.path.join(root, "cpu", "cpu.cfs_period_us")) as f:
+            period = int(f.read())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> int:
+    """Number of CPUs this process may use: its affinity, capped by a cgroup CPU quota
+
+    Both ``os.cpu_count()`` and the affinity mask report the host's cores
+    inside containers; a fractional quota rounds up (``cpus: 1.8`` gives 2).
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    if quota:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return cpus
+
+
+def auto_size_pool(cpus: int, workers: int = 0, threads_per_worker: int = 0) -> tuple[int, int]:
+    """Pick worker and thread counts that use the CPUs without oversubscribing
+
+    Zero means auto: small hosts get a single worker using every core, larger
+    hosts get one worker per two cores so several images run side by side.
+    """
+    if workers <= 0:
+        workers = 1 if cpus < 4 else cpus // 2
+    if threads_per_worker <= 0:
+        threads_per_worker = max(1, cpus // workers)
+    return workers, threads_per_worker
+
+
+def _worker_main(conn, model_name: str, threads: int, session_factory: Callable, memory_budget_mb: int):
+    """Inference worker process: load sessions and serve mask requests"""
+    from inference import predict_mask
+    from models import SessionRegistry
+
+    registry = SessionRegistry(session_factory, memory_budget_mb, intra_op_threads=threads)
+    try:
+        registry.get(model_name)
+    except Exception as e:
+        conn.send(("error", f"Failed to load {model_name}: {e}"))
+        return
+    conn.send(("ready", os.getpid()))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+
+        shm_name, width, height, request_model = message
+        shm = None
+        try:
+            # Spawned children share the parent's resource tracker, and the
+            # parent unlinks the segment once the mask has been read back
+            shm = SharedMemory(name=shm_name)
+            pixels = np.ndarray((height, width, 3), dtype=np.uint8, buffer=shm.buf)
+            mask_out = np.ndarray((height, width), dtype=np.uint8, buffer=shm.buf, offset=pixels.nbytes)
+
+            image = Image.fromarray(pixels, "RGB")
+            mask = predict_mask(registry.get(request_model), request_model, image)
+            mask_out[:] = np.asarray(mask, dtype=np.uint8)
+            del pixels, mask_out
+            conn.send(("ok", None))
+        except Exception as e:
+            conn.send(("error", str(e)))
+        finally:
+            if shm is not None:
+                shm.close()
+
+
+class _Worker:
+    """Handle to one inference process"""
+
+    def __init__(
+        self,
+        index: int,
+        context,
+        model_name: str,
+        threads: int,
+        session_factory: Callable,
+        memory_budget_mb: int
+    ):
+        self.index = index
+        self.context = context
+        self.model_name = model_name
+        self.threads = threads
+        self.session_factory = session_factory
+        self.memory_budget_mb = memory_budget_mb
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+
+    def start(self):
+        parent_conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=_worker_main,
+            args=(child_conn, self.model_name, self.threads, self.session_factory, self.memory_budget_mb),
+            name=f"clearcut-inference-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+        status, detail = self._receive()
+        if status != "ready":
+            raise RuntimeError(detail)
+        logger.info(f"Inference worker {self.index} ready (pid {detail})")
+
+    def _receive(self):
+        ready = wait([self.conn, self.process.sentinel])
+        if self.conn in ready:
+            try:
+                return self.conn.recv()
+            except EOFError:
+                pass
+        return "crashed", f"Inference worker {self.index} exited with code {self.process.exitcode}"
+
+    def restart(self):
+        self.stop()
+        self.restarts += 1
+        logger.warning(f"Restarting inference worker {self.index}")
+        self.start()
+
+    def stop(self):
+        if self.conn is not None:
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            self.conn.close()
+            self.conn = None
+        if self.process is not None:
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+            self.process = None
+
+    def predict(self, image: Image.Image, model_name: str) -> Image.Image:
+        """Send one image through shared memory and wait for its mask"""
+        if self.process is None or not self.process.is_alive():
+            self.restart()
+
+        pixels = np.asarray(image.convert("RGB"), dtype=np.uint8)
+        height, width = pixels.shape[:2]
+
+        shm = SharedMemory(create=True, size=pixels.nbytes + height * width)
+        try:
+            np.ndarray(pixels.shape, dtype=np.uint8, buffer=shm.buf)[:] = pixels
+            self.conn.send((shm.name, width, height, model_name))
+
+            status, detail = self._receive()
+            if status == "crashed":
+                self.restart()
+                raise RuntimeError(detail)
+            if status != "ok":
+                raise RuntimeError(detail)
+
+            mask_view = np.ndarray((height, width), dtype=np.uint8, buffer=shm.buf, offset=pixels.nbytes)
+            mask = Image.fromarray(mask_view.copy(), "L")
+            del mask_view
+            return mask
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+class InferenceWorkerPool:
+    """Dispatches mask predictions to inference worker processes
+
+    Each worker holds its own ONNX Runtime session. Pixels and masks move
+    through shared memory, and a worker that dies is restarted in place.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        session_factory: Callable,
+        workers: int = 0,
+        threads_per_worker: int = 0,
+        model_memory_budget_mb: int = 600
+    ):
+        """``session_factory(model_name, intra_op_threads=n)`` runs in each
+        worker and must be importable by name (a module-level function).
+        ``model_name`` is loaded at startup; other models load on first use."""
+        self.model_name = model_name
+        self.workers, self.threads_per_worker = auto_size_pool(available_cpus(), workers, threads_per_worker)
+
+        # Spawn so workers never inherit the API process's threads or event loop
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = [
+            _Worker(index, self._context, model_name, self.threads_per_worker, session_factory, model_memory_budget_mb)
+            for index in range(self.workers)
+        ]
+        self._idle: Optional[asyncio.Queue] = None
+        self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference-dispatch")
+
+        self.completed = 0
+        self.failed = 0
+
+    async def start(self):
+        """Start every worker and wait until their models are loaded"""
+        loop = asyncio.get_event_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._threads, worker.start) for worker in self._workers))
+
+        self._idle = asyncio.Queue()
+        for worker in self._workers:
+            self._idle.put_nowait(worker)
+        logger.info(f"Started {self.workers} inference workers x {self.threads_per_worker} threads")
+
+    async def predict(self, image: Image.Image, model_name: Optional[str] = None) -> Image.Image:
+        """Predict a mask on the next idle worker"""
+        worker = await self._idle.get()
+        loop = asyncio.get_event_loop()
+        dispatch = loop.run_in_executor(self._threads, worker.predict, image, model_name or self.model_name)
+        # The worker is free only once its reply has been read, even if this request is cancelled
+        dispatch.add_done_callback(lambda _: self._idle.put_nowait(worker))
+        try:
+            mask = await asyncio.shield(dispatch)
+            self.completed += 1
+            return mask
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+
+    async def stop(self):
+        """Stop all workers"""
+        loop = asyncio.get_event_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._threads, worker.stop) for worker in self._workers))
+        self._threads.shutdown(wait=False)
+
+    def get_stats(self) -> dict:
+        """Get worker pool statistics"""
+        return {
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "idle": self._idle.qsize() if self._idle else 0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "restarts": sum(worker.restarts for worker in self._workers),
+        }